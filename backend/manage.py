@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the inventory database
+Uses the same MONGO_URL / DB_NAME settings (backend/.env) as the server.
+
+Usage:
+    python manage.py backfill-detail-snapshots [--batch-size 1000] [--dry-run]
+    python manage.py reconcile-holdings [--dry-run]
+    python manage.py seed-stock-ledger [--dry-run]
+    python manage.py reconcile-stock [--fix] [--batch-size 500] [--concurrency 4]
+    python manage.py place-goods-by-location [--dry-run]
+    python manage.py backfill-assignment-refs [--batch-size 1000] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+
+from pymongo import DeleteOne, UpdateOne
+
+from server import backfill_assignment_refs, bump_data_versions, client, create_stock_checkpoint, db, good_snapshot, reconcile_stock, stock_movement
+
+
+async def backfill_detail_snapshots(batch_size: int, dry_run: bool) -> int:
+    """Copy good name, description and category name into old assignment_details"""
+    goods = await db.goods.find({}, {"_id": 0, "id": 1, "name": 1, "description": 1, "category_id": 1}).to_list(None)
+    categories = await db.categories.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    goods_by_id = {g["id"]: g for g in goods}
+    category_names = {c["id"]: c["name"] for c in categories}
+
+    pending = db.assignment_details.find({"good_name": {"$exists": False}}, {"_id": 0, "id": 1, "good_id": 1})
+    updated = 0
+    missing = 0
+    operations = []
+    async for detail in pending:
+        good = goods_by_id.get(detail["good_id"])
+        if good:
+            snapshot = good_snapshot(good, category_names)
+        else:
+            # The good was deleted before snapshots existed; its name is lost
+            missing += 1
+            snapshot = {"good_name": "N/A", "good_description": "", "category_name": "N/A"}
+        operations.append(UpdateOne({"id": detail["id"]}, {"$set": snapshot}))
+        if len(operations) >= batch_size:
+            updated += await flush(db.assignment_details, operations, dry_run)
+    updated += await flush(db.assignment_details, operations, dry_run)
+    if updated and not dry_run:
+        await bump_data_versions("assignments")
+
+    action = "Would update" if dry_run else "Updated"
+    print(f"{action} {updated} assignment details ({missing} with deleted goods)")
+    return 0
+
+
+async def flush(collection, operations: list, dry_run: bool) -> int:
+    count = len(operations)
+    if operations and not dry_run:
+        await collection.bulk_write(operations, ordered=False)
+    operations.clear()
+    return count
+
+
+async def reconcile_holdings(dry_run: bool) -> int:
+    """Rebuild instructor_holdings from open assignments, fixing any drift"""
+    open_assignments = await db.assignments.find(
+        {"status": {"$in": ["Pendiente", "Entregado"]}, "instructor_id": {"$ne": None}},
+        {"_id": 0, "id": 1, "instructor_id": 1, "instructor_name": 1, "status": 1}
+    ).to_list(None)
+    by_id = {a["id"]: a for a in open_assignments}
+
+    expected = {}
+    details = db.assignment_details.find({"assignment_id": {"$in": list(by_id)}}, {"_id": 0})
+    async for detail in details:
+        assignment = by_id[detail["assignment_id"]]
+        key = (assignment["instructor_id"], detail["good_id"])
+        holding = expected.setdefault(key, {
+            "instructor_name": assignment["instructor_name"],
+            "quantity": 0,
+            "quantity_confirmed": 0,
+            "good_name": detail.get("good_name", "N/A"),
+            "category_name": detail.get("category_name", "N/A")
+        })
+        holding["quantity"] += detail["quantity_assigned"]
+        if assignment["status"] == "Entregado":
+            holding["quantity_confirmed"] += detail["quantity_assigned"]
+
+    now = datetime.now(timezone.utc).isoformat()
+    operations = []
+    changed = 0
+    removed = 0
+    async for holding in db.instructor_holdings.find({}, {"_id": 0}):
+        key = (holding.get("instructor_id"), holding["good_id"])
+        wanted = expected.pop(key, None)
+        if wanted is None:
+            removed += 1
+            operations.append(DeleteOne({"instructor_id": key[0], "good_id": key[1]}))
+        elif any(holding.get(field) != value for field, value in wanted.items()):
+            changed += 1
+            operations.append(UpdateOne({"instructor_id": key[0], "good_id": key[1]}, {"$set": {**wanted, "updated_at": now}}))
+    for (instructor_id, good_id), wanted in expected.items():
+        operations.append(UpdateOne(
+            {"instructor_id": instructor_id, "good_id": good_id},
+            {"$set": {**wanted, "updated_at": now}},
+            upsert=True
+        ))
+    await flush(db.instructor_holdings, operations, dry_run)
+
+    action = "Would fix" if dry_run else "Fixed"
+    print(f"{action} holdings: {len(expected)} missing, {changed} wrong, {removed} stale")
+    return 0
+
+
+async def seed_stock_ledger(dry_run: bool) -> int:
+    """Opening ledger entries for goods that predate stock_movements, then a first checkpoint.
+
+    A good may already have movements from assignments or returns made
+    before this ran, so its opening is the current stock minus what those
+    movements recorded, dated just before the first of them.
+    """
+    recorded = {}
+    async for row in db.stock_movements.aggregate([{"$group": {
+        "_id": "$good_id",
+        "quantity": {"$sum": "$quantity_delta"},
+        "available_quantity": {"$sum": "$available_delta"},
+        "first_at": {"$min": "$created_at"},
+        "opened": {"$max": {"$in": ["$type", ["alta", "apertura"]]}}
+    }}]):
+        recorded[row["_id"]] = row
+
+    movements = []
+    async for good in db.goods.find({}, {"_id": 0, "id": 1, "name": 1, "quantity": 1, "available_quantity": 1, "created_at": 1}):
+        previous = recorded.get(good["id"], {"quantity": 0, "available_quantity": 0, "first_at": None, "opened": False})
+        if previous["opened"]:
+            continue
+        movement = stock_movement(
+            good, "apertura",
+            good["quantity"] - previous["quantity"],
+            good["available_quantity"] - previous["available_quantity"],
+            "manage.py"
+        )
+        candidates = [good.get("created_at")]
+        if previous["first_at"]:
+            first_at = datetime.fromisoformat(previous["first_at"])
+            candidates.append((first_at - timedelta(milliseconds=1)).isoformat())
+        movement["created_at"] = min((c for c in candidates if c), default=movement["created_at"])
+        movements.append(movement)
+
+    if dry_run:
+        print(f"Would write {len(movements)} opening movements")
+        return 0
+
+    for start in range(0, len(movements), 1000):
+        await db.stock_movements.insert_many(movements[start:start + 1000], ordered=False)
+    # Checkpoints taken after the earliest opening do not include it
+    if movements:
+        earliest = min(m["created_at"] for m in movements)
+        stale = [c["id"] async for c in db.stock_checkpoints.find({"taken_at": {"$gte": earliest}}, {"_id": 0, "id": 1})]
+        await db.stock_checkpoints.delete_many({"id": {"$in": stale}})
+        await db.stock_checkpoint_items.delete_many({"checkpoint_id": {"$in": stale}})
+    # The checkpoint must come after the opening entries, so skip the usual lag
+    checkpoint = await create_stock_checkpoint(datetime.now(timezone.utc))
+    print(f"Wrote {len(movements)} opening movements, checkpoint at {checkpoint['taken_at']} with {checkpoint['goods_count']} goods")
+    return 0
+
+
+async def reconcile_stock_command(fix: bool, batch_size: int, concurrency: int) -> int:
+    result = await reconcile_stock(fix, "manage.py", batch_size, concurrency)
+    for d in result["differences"]:
+        note = "" if d["fixable"] else "  (more units out than in stock, not fixed)"
+        print(f"{d['good_name']:<40} available {d['available_quantity']:>6}  expected {d['expected_available']:>6}{note}")
+    print(f"Checked {result['checked']} goods in {result['batches']} batches: "
+          f"{len(result['differences'])} differences, {result['fixed']} fixed")
+    if result["skipped"]:
+        print(f"{result['skipped']} goods were left alone because their stock changed during or just before the check; run again later to recheck them")
+    return 1 if result["differences"] and not fix else 0
+
+
+async def place_goods_by_location(dry_run: bool) -> int:
+    """Stock unplaced goods in the warehouse whose name matches their free-text location"""
+    warehouses = await db.warehouses.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    by_name = {w["name"].strip().lower(): w["id"] for w in warehouses}
+    placed_goods = set(await db.warehouse_stock.distinct("good_id"))
+
+    now = datetime.now(timezone.utc).isoformat()
+    operations = []
+    unmatched = 0
+    async for good in db.goods.find({}, {"_id": 0, "id": 1, "location": 1, "quantity": 1}):
+        if good["id"] in placed_goods:
+            continue
+        warehouse_id = by_name.get((good.get("location") or "").strip().lower())
+        if not warehouse_id:
+            unmatched += 1
+            continue
+        operations.append(UpdateOne(
+            {"warehouse_id": warehouse_id, "good_id": good["id"]},
+            {"$set": {"quantity": good["quantity"], "updated_at": now}},
+            upsert=True
+        ))
+    placed = await flush(db.warehouse_stock, operations, dry_run)
+
+    action = "Would place" if dry_run else "Placed"
+    print(f"{action} {placed} goods; {unmatched} have a location that matches no warehouse name")
+    return 0
+
+
+async def backfill_assignment_refs_command(batch_size: int, dry_run: bool) -> int:
+    """Set instructor_id and sport_id on assignments that only have the names"""
+    result = await backfill_assignment_refs(batch_size, dry_run)
+    action = "Would update" if dry_run else "Updated"
+    print(f"{action} {result['updated']} assignments")
+    if result["unmatched_instructors"]:
+        print(f"Instructors not found by name: {', '.join(result['unmatched_instructors'])}")
+    if result["unmatched_sports"]:
+        print(f"Sports not found by name: {', '.join(result['unmatched_sports'])}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inventory maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-detail-snapshots", help="Store good and category names on old assignment details")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    backfill.add_argument("--dry-run", action="store_true")
+
+    reconcile = commands.add_parser("reconcile-holdings", help="Rebuild instructor_holdings from open assignments")
+    reconcile.add_argument("--dry-run", action="store_true")
+
+    ledger = commands.add_parser("seed-stock-ledger", help="Write opening stock movements for goods created before the ledger")
+    ledger.add_argument("--dry-run", action="store_true")
+
+    stock = commands.add_parser("reconcile-stock", help="Recompute available_quantity from open assignments")
+    stock.add_argument("--fix", action="store_true", help="Correct the differences instead of only reporting them")
+    stock.add_argument("--batch-size", type=int, default=500)
+    stock.add_argument("--concurrency", type=int, default=4)
+
+    place = commands.add_parser("place-goods-by-location", help="Stock goods in the warehouse named in their location field")
+    place.add_argument("--dry-run", action="store_true")
+
+    refs = commands.add_parser("backfill-assignment-refs", help="Set instructor_id and sport_id on old assignments")
+    refs.add_argument("--batch-size", type=int, default=1000)
+    refs.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            if args.command == "backfill-detail-snapshots":
+                return await backfill_detail_snapshots(args.batch_size, args.dry_run)
+            if args.command == "reconcile-holdings":
+                return await reconcile_holdings(args.dry_run)
+            if args.command == "seed-stock-ledger":
+                return await seed_stock_ledger(args.dry_run)
+            if args.command == "reconcile-stock":
+                return await reconcile_stock_command(args.fix, args.batch_size, args.concurrency)
+            if args.command == "place-goods-by-location":
+                return await place_goods_by_location(args.dry_run)
+            if args.command == "backfill-assignment-refs":
+                return await backfill_assignment_refs_command(args.batch_size, args.dry_run)
+        finally:
+            client.close()
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
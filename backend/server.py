@@ -1,33 +1,446 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Form
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
+from python_multipart.multipart import MultipartParser, parse_options_header
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
 from passlib.context import CryptContext
 import jwt
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.units import inch
 import io
+import asyncio
+import hashlib
+import tempfile
+import zipfile
+import threading
+import time
+import json
+import collections
+import contextvars
+import csv
+import gzip
+import random
+import re
 import shutil
+import socket
+import sys
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# ============================================
+# METRICS
+# ============================================
+# Minimal in-process metrics exposed in the Prometheus text format at
+# /metrics. Values are per worker process: with several uvicorn workers each
+# one keeps its own counters.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+METRICS_REGISTRY = []
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = []
+    for name, value in zip(labelnames, values):
+        escaped = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        METRICS_REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        """Sum over every label combination"""
+        with self._lock:
+            return sum(self._values.values())
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, dict(state, buckets=list(state["buckets"]))) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["buckets"]):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {state['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in METRICS_REGISTRY) + "\n"
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served", ("method", "route"))
+MONGO_COMMANDS = Counter("mongo_commands_total", "MongoDB commands by collection", ("collection", "command", "outcome"))
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection", ("collection", "command"), MONGO_BUCKETS
+)
+ACTA_RENDER_DURATION = Histogram("acta_pdf_render_seconds", "Time to render an acta PDF document")
+ACTA_RENDER_PAGES = Counter("acta_pdf_actas_rendered_total", "Actas rendered into PDF documents")
+EMAIL_SEND_DURATION = Histogram("email_send_seconds", "Time to send an email notification", ("outcome",))
+EVENT_SUBSCRIBERS = Gauge("live_event_subscribers", "Clients connected to the live event stream")
+EVENTS_PUBLISHED = Counter("live_events_published_total", "Live events published by type", ("type",))
+MONGO_POOL_CONNECTIONS = Gauge("mongo_pool_connections", "Open MongoDB connections by server", ("address",))
+MONGO_POOL_CHECKED_OUT = Gauge("mongo_pool_checked_out", "MongoDB connections in use by server", ("address",))
+MONGO_POOL_WAITING = Gauge("mongo_pool_waiting", "Operations waiting for a MongoDB connection by server", ("address",))
+WORK_IN_FLIGHT = Gauge("work_in_flight", "PDF renders, email sends, audit log writes and demand forecasts in progress", ("kind",))
+IDEMPOTENT_REQUESTS = Counter("idempotent_requests_total", "Requests sent with an Idempotency-Key by outcome", ("outcome",))
+REPORT_CACHE_REQUESTS = Counter("report_cache_requests_total", "GET /reports answered from the cache (hit) or built (miss)", ("outcome",))
+REPORT_CACHE_BYTES = Gauge("report_cache_bytes", "Size of the cached report bodies in this worker")
+SINGLEFLIGHT_REQUESTS = Counter(
+    "singleflight_requests_total", "Coalesced reads that ran the work (executed) or joined a call in flight (shared)", ("route", "outcome")
+)
+SINGLEFLIGHT_SAVED_SECONDS = Counter("singleflight_saved_seconds_total", "Work time not repeated thanks to shared calls", ("route",))
+STARTUP_PHASE_DURATION = Gauge("startup_phase_seconds", "Time the last startup of this worker spent in each phase", ("phase",))
+
+class MongoMetricsListener(monitoring.CommandListener):
+    """Counts and times every command the driver sends, per collection"""
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        collection = target if isinstance(target, str) else "-"
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), "-")
+        MONGO_COMMANDS.inc(collection=collection, command=event.command_name, outcome=outcome)
+        MONGO_COMMAND_DURATION.observe(event.duration_micros / 1_000_000, collection=collection, command=event.command_name)
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Connection pool gauges; /ready reads them to spot a saturated pool"""
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.inc(address=f"{event.address[0]}:{event.address[1]}")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.dec(address=f"{event.address[0]}:{event.address[1]}")
+
+    def connection_check_out_started(self, event):
+        MONGO_POOL_WAITING.inc(address=f"{event.address[0]}:{event.address[1]}")
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_WAITING.dec(address=f"{event.address[0]}:{event.address[1]}")
+
+    def connection_checked_out(self, event):
+        address = f"{event.address[0]}:{event.address[1]}"
+        MONGO_POOL_WAITING.dec(address=address)
+        MONGO_POOL_CHECKED_OUT.inc(address=address)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.dec(address=f"{event.address[0]}:{event.address[1]}")
+
+class MetricsMiddleware:
+    """Records request counts, latency and in-flight requests per route template"""
+    def __init__(self, app):
+        self.app = app
+
+    def route_template(self, scope) -> str:
+        partial = None
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope["method"]
+        route = self.route_template(scope)
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        HTTP_IN_FLIGHT.inc(method=method, route=route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec(method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status_code))
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, route=route)
+
+# ============================================
+# QUERY DEBUGGING
+# ============================================
+# Development/staging aid: with QUERY_DEBUG=1 every HTTP response carries the
+# number of MongoDB commands it sent and the time spent in them, and requests
+# that repeat the same query shape more than QUERY_DEBUG_THRESHOLD times
+# (typically a query inside a loop) are logged as N+1 suspects.
+
+QUERY_DEBUG = os.environ.get('QUERY_DEBUG', '').lower() in ('1', 'true', 'yes')
+QUERY_DEBUG_THRESHOLD = int(os.environ.get('QUERY_DEBUG_THRESHOLD', '10'))
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration_micros = 0
+        self.shapes = collections.Counter()
+        self._lock = threading.Lock()
+
+    def started(self, shape: str):
+        with self._lock:
+            self.count += 1
+            self.shapes[shape] += 1
+
+    def finished(self, duration_micros: int):
+        with self._lock:
+            self.duration_micros += duration_micros
+
+_query_stats: contextvars.ContextVar = contextvars.ContextVar("query_stats", default=None)
+
+def _shape_of(value):
+    if isinstance(value, dict):
+        return {key: _shape_of(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_shape_of(value[0])] if value else []
+    return "?"
+
+def query_shape(command_name: str, command) -> str:
+    """Command, collection and filter structure with all values blanked out"""
+    collection = command.get(command_name)
+    if command_name == "getMore":
+        collection = command.get("collection")
+    
+    spec = command.get("filter") or command.get("query")
+    if spec is None and command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or []
+        spec = statements[0].get("q") if statements else None
+    if spec is None and command_name == "aggregate":
+        spec = command.get("pipeline")
+    
+    shape = json.dumps(_shape_of(spec), sort_keys=True) if spec is not None else ""
+    return f"{command_name} {collection if isinstance(collection, str) else '-'} {shape}".strip()
+
+class QueryCounterListener(monitoring.CommandListener):
+    """Attributes driver commands to the HTTP request that issued them.
+
+    Motor runs commands on executor threads but copies the caller's context,
+    so the request's QueryStats is visible here through a context variable.
+    """
+    def started(self, event):
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.started(query_shape(event.command_name, event.command))
+
+    def succeeded(self, event):
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.finished(event.duration_micros)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+class QueryDebugMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_DEBUG:
+            await self.app(scope, receive, send)
+            return
+        
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.duration_micros / 1000:.1f}".encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _query_stats.reset(token)
+            repeated = [(shape, n) for shape, n in stats.shapes.most_common() if n > QUERY_DEBUG_THRESHOLD]
+            for shape, n in repeated:
+                logger.warning(
+                    f"Possible N+1 in {scope['method']} {scope['path']}: {n} x {shape} "
+                    f"({stats.count} commands, {stats.duration_micros / 1000:.1f} ms total)"
+                )
+
 # MongoDB connection
+# Pool size, timeouts, read/write concerns and wire compression can be set
+# with MONGO_* variables; unset ones keep the options in MONGO_URL or the
+# driver defaults.
+MONGO_INT_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGO_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGO_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+    'MONGO_CONNECT_TIMEOUT_MS': 'connectTimeoutMS',
+    'MONGO_SOCKET_TIMEOUT_MS': 'socketTimeoutMS',
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+    'MONGO_WTIMEOUT_MS': 'wTimeoutMS',
+}
+MONGO_STR_OPTIONS = {
+    'MONGO_READ_CONCERN': 'readConcernLevel',
+    'MONGO_READ_PREFERENCE': 'readPreference',
+    'MONGO_COMPRESSORS': 'compressors',  # e.g. "zstd,zlib"; zstd and snappy need their python packages
+}
+
+def mongo_client_options() -> dict:
+    options = {}
+    for name, option in MONGO_INT_OPTIONS.items():
+        if os.environ.get(name):
+            options[option] = int(os.environ[name])
+    for name, option in MONGO_STR_OPTIONS.items():
+        if os.environ.get(name):
+            options[option] = os.environ[name]
+    write_concern = os.environ.get('MONGO_WRITE_CONCERN', '')
+    if write_concern:
+        options['w'] = int(write_concern) if write_concern.isdigit() else write_concern
+    return options
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    event_listeners=[MongoMetricsListener(), QueryCounterListener(), MongoPoolListener()],
+    **mongo_client_options()
+)
 db = client[os.environ['DB_NAME']]
 
 # Security
@@ -57,16 +470,19 @@ def create_access_token(data: dict):
 
 # Get current user from token
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
+    return await get_user_from_token(credentials.credentials)
+
+async def get_user_from_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         user_type: str = payload.get("type", "user")
-        if email is None:
+        # Stream tickets only open /events/stream
+        if email is None or user_type == "stream":
             raise HTTPException(status_code=401, detail="Invalid token")
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
     if user_type == "instructor":
@@ -92,7 +508,45 @@ async def create_audit_log(user_email: str, action: str, module: str, ip: str, d
         "details": details,
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
-    await db.audit_logs.insert_one(audit_log)
+    with WORK_IN_FLIGHT.track(kind="audit"):
+        await db.audit_logs.insert_one(audit_log)
+
+# ============================================
+# REQUEST COALESCING
+# ============================================
+# When many clients ask for the same expensive read at once (everyone opening
+# the dashboard as a class session starts), only the first call does the
+# work and the others wait for its result. The key holds the route, its
+# parameters and the caller's role, everything the response depends on.
+# The result object is shared, so callers must not modify it. The work runs
+# in its own task: a caller that disconnects does not cancel it for the rest.
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, route: str, key: tuple, compute):
+        call_key = (route, key)
+        call = self._calls.get(call_key)
+        if call is None:
+            call = {"task": asyncio.ensure_future(self._run(route, call_key, compute)), "shared": 0}
+            self._calls[call_key] = call
+            SINGLEFLIGHT_REQUESTS.inc(route=route, outcome="executed")
+        else:
+            call["shared"] += 1
+            SINGLEFLIGHT_REQUESTS.inc(route=route, outcome="shared")
+        return await asyncio.shield(call["task"])
+
+    async def _run(self, route: str, call_key: tuple, compute):
+        start = time.perf_counter()
+        try:
+            return await compute()
+        finally:
+            call = self._calls.pop(call_key)
+            if call["shared"]:
+                SINGLEFLIGHT_SAVED_SECONDS.inc((time.perf_counter() - start) * call["shared"], route=route)
+
+singleflight = SingleFlight()
 
 # Create the main app
 app = FastAPI()
@@ -149,6 +603,7 @@ class GoodCreate(BaseModel):
     quantity: int
     location: str
     responsible: str
+    warehouse_id: Optional[str] = None  # where the initial quantity is stocked
 
 class GoodUpdate(BaseModel):
     name: Optional[str] = None
@@ -177,21 +632,36 @@ class AssignmentDetailCreate(BaseModel):
     quantity_assigned: int
 
 class AssignmentCreate(BaseModel):
-    instructor_name: str
-    discipline: str
+    # Either the ids or the names may be sent; the names are stored as display snapshots
+    instructor_name: Optional[str] = None
+    discipline: Optional[str] = None
+    instructor_id: Optional[str] = None
+    sport_id: Optional[str] = None
     details: List[AssignmentDetailCreate]
     notes: Optional[str] = ""
 
 class Assignment(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
+    instructor_id: Optional[str] = None
     instructor_name: str
+    sport_id: Optional[str] = None
     discipline: str
     created_by: str
     created_at: str
     status: str
     notes: str
 
+class AssignmentReturn(BaseModel):
+    notes: Optional[str] = ""
+
+class ActaPrintRunRequest(BaseModel):
+    assignment_ids: Optional[List[str]] = None
+    instructor_id: Optional[str] = None
+    sport_id: Optional[str] = None
+    instructor_name: Optional[str] = None
+    discipline: Optional[str] = None
+
 class DashboardStats(BaseModel):
     total_goods: int
     total_quantity: int
@@ -268,16 +738,39 @@ class Warehouse(BaseModel):
     active: bool
     created_at: str
 
+class WarehouseStockSet(BaseModel):
+    quantity: int = Field(ge=0)
+
+class StockTransferLine(BaseModel):
+    good_id: str
+    quantity: int = Field(gt=0)
+
+class StockTransfer(BaseModel):
+    from_warehouse_id: str
+    to_warehouse_id: str
+    lines: List[StockTransferLine]
+    notes: Optional[str] = ""
+
+class ReportJobCreate(BaseModel):
+    report_type: str
+    format: str = "xlsx"
+    category_id: Optional[str] = None
+    instructor_id: Optional[str] = None
+    sport_id: Optional[str] = None
+    instructor_name: Optional[str] = None
+    discipline: Optional[str] = None
+
 # Email notification function
 async def send_email_notification(to_email: str, subject: str, html_content: str):
     try:
-        import resend
-        resend.api_key = os.environ.get('RESEND_API_KEY', '')
-        
-        if not resend.api_key:
+        api_key = os.environ.get('RESEND_API_KEY', '')
+        if not api_key:
             logger.warning("RESEND_API_KEY not configured, skipping email notification")
             return False
-            
+        
+        import resend
+        resend.api_key = api_key
+        
         params = {
             "from": "Sistema de Inventarios <onboarding@resend.dev>",
             "to": [to_email],
@@ -285,23 +778,374 @@ async def send_email_notification(to_email: str, subject: str, html_content: str
             "html": html_content,
         }
         
-        email = resend.Emails.send(params)
+        start = time.perf_counter()
+        try:
+            with WORK_IN_FLIGHT.track(kind="email"):
+                await asyncio.to_thread(resend.Emails.send, params)
+        except Exception:
+            EMAIL_SEND_DURATION.observe(time.perf_counter() - start, outcome="failure")
+            raise
+        EMAIL_SEND_DURATION.observe(time.perf_counter() - start, outcome="success")
         logger.info(f"Email sent successfully to {to_email}")
         return True
     except Exception as e:
         logger.error(f"Error sending email: {str(e)}")
         return False
 
+# ============================================
+# ACTA STORAGE
+# ============================================
+# Acta PDFs and signed uploads are addressed by a key relative to the storage
+# root, e.g. "ACTA-1234ABCD.pdf" or "signed/SIGNED_1234ABCD.pdf". The backend
+# is chosen with ACTAS_STORAGE (local, gridfs or s3) so several API nodes can
+# share the same files.
+
+STORAGE_CHUNK_SIZE = 256 * 1024  # 256 KB
+S3_PART_SIZE = 8 * 1024 * 1024  # 8 MB, S3 requires at least 5 MB per part
+
+class ActaStorage(ABC):
+    async def save(self, key: str, data: bytes, content_type: str):
+        async def single_chunk():
+            yield data
+        await self.save_stream(key, single_chunk(), content_type)
+
+    @abstractmethod
+    async def save_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: str):
+        ...
+
+    @abstractmethod
+    async def stat(self, key: str) -> Optional[dict]:
+        """Return {"size", "modified"} for a stored file, or None if missing"""
+
+    @abstractmethod
+    def iter_chunks(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield the bytes of a stored file from start up to end (inclusive)"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+class LocalActaStorage(ActaStorage):
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    # Every filesystem call runs in a thread, so a slow disk never stalls the event loop
+
+    async def save_stream(self, key, chunks, content_type):
+        target = self.path(key)
+        await asyncio.to_thread(target.parent.mkdir, parents=True, exist_ok=True)
+        
+        # Write to a temp file next to the target and rename it into place,
+        # so readers never see a partially written file
+        fd, tmp_name = await asyncio.to_thread(tempfile.mkstemp, dir=target.parent, prefix=".upload-", suffix=".part")
+        tmp_path = Path(tmp_name)
+        try:
+            out = os.fdopen(fd, "wb")
+            try:
+                async for chunk in chunks:
+                    await asyncio.to_thread(out.write, chunk)
+                await asyncio.to_thread(out.flush)
+                await asyncio.to_thread(os.fsync, out.fileno())
+            finally:
+                await asyncio.to_thread(out.close)
+            await asyncio.to_thread(os.replace, tmp_path, target)
+        except BaseException:
+            await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+            raise
+
+    async def stat(self, key):
+        try:
+            info = await asyncio.to_thread(os.stat, self.path(key))
+        except FileNotFoundError:
+            return None
+        return {"size": info.st_size, "modified": datetime.fromtimestamp(info.st_mtime, timezone.utc)}
+
+    async def iter_chunks(self, key, start=0, end=None):
+        f = await asyncio.to_thread(open, self.path(key), "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = STORAGE_CHUNK_SIZE if remaining is None else min(STORAGE_CHUNK_SIZE, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def delete(self, key):
+        await asyncio.to_thread(self.path(key).unlink, missing_ok=True)
+
+class GridFSActaStorage(ActaStorage):
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+        self._bucket = None
+
+    def bucket(self):
+        if self._bucket is None:
+            from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+            self._bucket = AsyncIOMotorGridFSBucket(db, bucket_name=self.bucket_name)
+        return self._bucket
+
+    def files(self):
+        return db[f"{self.bucket_name}.files"]
+
+    async def save_stream(self, key, chunks, content_type):
+        # GridFS only exposes a new revision once it is closed; older
+        # revisions are removed afterwards
+        grid_in = self.bucket().open_upload_stream(key, metadata={"content_type": content_type})
+        try:
+            async for chunk in chunks:
+                await grid_in.write(chunk)
+        except BaseException:
+            await grid_in.abort()
+            raise
+        await grid_in.close()
+        
+        old_revisions = await self.files().find({"filename": key, "_id": {"$ne": grid_in._id}}, {"_id": 1}).to_list(None)
+        for revision in old_revisions:
+            await self.bucket().delete(revision["_id"])
+
+    async def stat(self, key):
+        grid_file = await self.files().find_one({"filename": key}, {"length": 1, "uploadDate": 1}, sort=[("uploadDate", -1)])
+        if grid_file is None:
+            return None
+        return {"size": grid_file["length"], "modified": grid_file["uploadDate"].replace(tzinfo=timezone.utc)}
+
+    async def iter_chunks(self, key, start=0, end=None):
+        grid_out = await self.bucket().open_download_stream_by_name(key)
+        grid_out.seek(start)
+        remaining = (grid_out.length if end is None else end + 1) - start
+        while remaining > 0:
+            chunk = await grid_out.read(min(STORAGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    async def delete(self, key):
+        revisions = await self.files().find({"filename": key}, {"_id": 1}).to_list(None)
+        for revision in revisions:
+            await self.bucket().delete(revision["_id"])
+
+class S3ActaStorage(ActaStorage):
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, region: Optional[str] = None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url, region_name=self.region)
+        return self._client
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    async def save_stream(self, key, chunks, content_type):
+        # Small files go up in a single PUT, larger ones as a multipart upload.
+        # Either way the object only becomes visible once complete.
+        s3 = self.client()
+        object_key = self.object_key(key)
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        
+        async def upload_part():
+            part_number = len(parts) + 1
+            part = await asyncio.to_thread(
+                s3.upload_part, Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                PartNumber=part_number, Body=bytes(buffer)
+            )
+            parts.append({"ETag": part["ETag"], "PartNumber": part_number})
+            buffer.clear()
+        
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                if len(buffer) >= S3_PART_SIZE:
+                    if upload_id is None:
+                        upload = await asyncio.to_thread(
+                            s3.create_multipart_upload, Bucket=self.bucket, Key=object_key, ContentType=content_type
+                        )
+                        upload_id = upload["UploadId"]
+                    await upload_part()
+            
+            if upload_id is None:
+                await asyncio.to_thread(
+                    s3.put_object, Bucket=self.bucket, Key=object_key, Body=bytes(buffer), ContentType=content_type
+                )
+            else:
+                if buffer:
+                    await upload_part()
+                await asyncio.to_thread(
+                    s3.complete_multipart_upload, Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            if upload_id is not None:
+                await asyncio.to_thread(s3.abort_multipart_upload, Bucket=self.bucket, Key=object_key, UploadId=upload_id)
+            raise
+
+    async def stat(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            head = await asyncio.to_thread(self.client().head_object, Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {"size": head["ContentLength"], "modified": head["LastModified"]}
+
+    async def iter_chunks(self, key, start=0, end=None):
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        response = await asyncio.to_thread(
+            self.client().get_object, Bucket=self.bucket, Key=self.object_key(key), Range=byte_range
+        )
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, STORAGE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, key):
+        await asyncio.to_thread(self.client().delete_object, Bucket=self.bucket, Key=self.object_key(key))
+
+def create_acta_storage() -> ActaStorage:
+    backend = os.environ.get('ACTAS_STORAGE', 'local').lower()
+    if backend == "gridfs":
+        return GridFSActaStorage(os.environ.get('ACTAS_GRIDFS_BUCKET', 'actas'))
+    if backend == "s3":
+        return S3ActaStorage(
+            bucket=os.environ['ACTAS_S3_BUCKET'],
+            prefix=os.environ.get('ACTAS_S3_PREFIX', ''),
+            endpoint_url=os.environ.get('ACTAS_S3_ENDPOINT_URL') or None,
+            region=os.environ.get('ACTAS_S3_REGION') or None
+        )
+    return LocalActaStorage(ROOT_DIR / "actas")
+
+acta_storage = create_acta_storage()
+
+# When set, local acta files are handed to nginx with X-Accel-Redirect so it
+# serves them with sendfile (zero-copy), including Range and conditional
+# requests. Must match an "internal" nginx location aliased to actas/.
+ACTAS_X_ACCEL_PREFIX = os.environ.get('ACTAS_X_ACCEL_PREFIX', '')
+
+def parse_byte_range(header: Optional[str], size: int):
+    """Parse a single "bytes=" Range header.
+
+    Returns (start, end) inclusive, or None when the whole file should be
+    served (no header, malformed or multi-range). Raises ValueError when the
+    range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    if not (start_text or end_text) or not all(text.isdigit() for text in (start_text, end_text) if text):
+        return None
+    
+    if start_text == "":
+        # Suffix range: the last N bytes
+        suffix_length = int(end_text)
+        if suffix_length == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(size - suffix_length, 0), size - 1
+    
+    start = int(start_text)
+    end = min(int(end_text), size - 1) if end_text else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+async def serve_stored_file(request: Request, key: str, filename: str, media_type: str, cache_control: str):
+    info = await acta_storage.stat(key)
+    if info is None:
+        return None
+    
+    size = info["size"]
+    modified = info["modified"]
+    last_modified = format_datetime(modified.astimezone(timezone.utc), usegmt=True)
+    etag = f'"{size:x}-{int(modified.timestamp() * 1000):x}"'
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Accept-Ranges": "bytes",
+        "Last-Modified": last_modified,
+        "ETag": etag,
+        "Cache-Control": cache_control
+    }
+    
+    if ACTAS_X_ACCEL_PREFIX and isinstance(acta_storage, LocalActaStorage):
+        headers["X-Accel-Redirect"] = f"{ACTAS_X_ACCEL_PREFIX.rstrip('/')}/{key}"
+        return Response(headers=headers, media_type=media_type)
+    
+    # Conditional requests: the client already has this version
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    not_modified = False
+    if if_none_match:
+        not_modified = etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    elif if_modified_since:
+        try:
+            not_modified = int(modified.timestamp()) <= int(parsedate_to_datetime(if_modified_since).timestamp())
+        except (TypeError, ValueError):
+            not_modified = False
+    if not_modified:
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "Content-Disposition"})
+    
+    # A Range is only honoured if the client's copy is still current
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() not in (etag, last_modified):
+        range_header = None
+    
+    try:
+        byte_range = parse_byte_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}", "Accept-Ranges": "bytes"})
+    
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(acta_storage.iter_chunks(key), media_type=media_type, headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        acta_storage.iter_chunks(key, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers
+    )
+
 # Get instructors and disciplines from database
 @api_router.get("/instructors")
 async def get_instructors(current_user: dict = Depends(get_current_user)):
-    instructors = await db.instructors.find({"active": True}, {"_id": 0}).to_list(1000)
-    return {"instructors": [i["name"] for i in instructors]}
+    instructors = await db.instructors.find({"active": True}, {"_id": 0, "id": 1, "name": 1}).to_list(1000)
+    return {
+        "instructors": [i["name"] for i in instructors],
+        "options": [{"id": i["id"], "name": i["name"]} for i in instructors]
+    }
 
 @api_router.get("/disciplines")
 async def get_disciplines(current_user: dict = Depends(get_current_user)):
-    sports = await db.sports.find({"active": True}, {"_id": 0}).to_list(1000)
-    return {"disciplines": [s["name"] for s in sports]}
+    sports = await db.sports.find({"active": True}, {"_id": 0, "id": 1, "name": 1}).to_list(1000)
+    return {
+        "disciplines": [s["name"] for s in sports],
+        "options": [{"id": s["id"], "name": s["name"]} for s in sports]
+    }
 
 # Auth endpoints
 @api_router.post("/auth/login", response_model=LoginResponse)
@@ -378,7 +1222,10 @@ async def create_user(request: Request, user_data: UserCreate, current_user: dic
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await db.users.insert_one(user)
+    try:
+        await db.users.insert_one(user)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="El email ya está registrado")
     
     client_ip = request.client.host if request.client else "unknown"
     await create_audit_log(current_user["email"], "CREATE_USER", "users", client_ip, f"Created user: {user_data.email}")
@@ -398,7 +1245,10 @@ async def update_user(request: Request, user_id: str, user_data: UserUpdate, cur
     update_data = {k: v for k, v in user_data.model_dump(exclude_unset=True).items() if v is not None}
     
     if update_data:
-        await db.users.update_one({"id": user_id}, {"$set": update_data})
+        try:
+            await db.users.update_one({"id": user_id}, {"$set": update_data})
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="El email ya está registrado")
         
         client_ip = request.client.host if request.client else "unknown"
         await create_audit_log(current_user["email"], "UPDATE_USER", "users", client_ip, f"Updated user: {user_id}")
@@ -436,9 +1286,11 @@ async def create_category(request: Request, category_data: CategoryCreate, curre
     }
     
     await db.categories.insert_one(category)
+    await bump_data_versions("categories")
     
     client_ip = request.client.host if request.client else "unknown"
     await create_audit_log(current_user["email"], "CREATE_CATEGORY", "categories", client_ip, f"Created: {category_data.name}")
+    publish_event("dashboard.delta", {"total_categories": 1})
     
     return category
 
@@ -455,9 +1307,11 @@ async def delete_category(request: Request, category_id: str, current_user: dict
     result = await db.categories.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
+    await bump_data_versions("categories")
     
     client_ip = request.client.host if request.client else "unknown"
     await create_audit_log(current_user["email"], "DELETE_CATEGORY", "categories", client_ip, f"Deleted: {category_id}")
+    publish_event("dashboard.delta", {"total_categories": -1})
     
     return {"message": "Categoría eliminada exitosamente"}
 
@@ -527,7 +1381,11 @@ async def delete_instructor(request: Request, instructor_id: str, current_user:
         raise HTTPException(status_code=404, detail="Instructor no encontrado")
     
     # Check if instructor is in use by any assignments
-    assignments_using_instructor = await db.assignments.count_documents({"instructor_name": instructor["name"]})
+    # Assignments whose name matched no instructor in the backfill have no id
+    assignments_using_instructor = await db.assignments.count_documents({"$or": [
+        {"instructor_id": instructor_id},
+        {"instructor_id": None, "instructor_name": instructor["name"]}
+    ]})
     if assignments_using_instructor > 0:
         raise HTTPException(
             status_code=400, 
@@ -591,7 +1449,10 @@ async def delete_sport(request: Request, sport_id: str, current_user: dict = Dep
         raise HTTPException(status_code=404, detail="Deporte no encontrado")
     
     # Check if sport is in use by any assignments
-    assignments_using_sport = await db.assignments.count_documents({"discipline": sport["name"]})
+    assignments_using_sport = await db.assignments.count_documents({"$or": [
+        {"sport_id": sport_id},
+        {"sport_id": None, "discipline": sport["name"]}
+    ]})
     if assignments_using_sport > 0:
         raise HTTPException(
             status_code=400, 
@@ -651,6 +1512,10 @@ async def update_warehouse(request: Request, warehouse_id: str, warehouse_data:
 
 @api_router.delete("/warehouses/{warehouse_id}")
 async def delete_warehouse(request: Request, warehouse_id: str, current_user: dict = Depends(get_current_user)):
+    stocked = await db.warehouse_stock.find_one({"warehouse_id": warehouse_id, "quantity": {"$gt": 0}})
+    if stocked:
+        raise HTTPException(status_code=400, detail="La bodega tiene bienes, transfiéralos antes de eliminarla")
+    
     result = await db.warehouses.delete_one({"id": warehouse_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Bodega no encontrada")
@@ -660,11 +1525,237 @@ async def delete_warehouse(request: Request, warehouse_id: str, current_user: di
     
     return {"message": "Bodega eliminada exitosamente"}
 
+# Warehouse stock
+# warehouse_stock holds how many units of each good are kept in each
+# warehouse, one document per (warehouse_id, good_id). Units handed to an
+# instructor still count for their warehouse, since they come back to it.
+
+_transactions_supported = None
+
+async def supports_transactions() -> bool:
+    """Multi-document transactions need a replica set or a sharded cluster"""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions_supported = False
+    return _transactions_supported
+
+def transfer_operations(transfer: StockTransfer, now: str) -> tuple:
+    """Guarded decrements of the source and upserted increments of the destination"""
+    decrements = [UpdateOne(
+        {"warehouse_id": transfer.from_warehouse_id, "good_id": line.good_id, "quantity": {"$gte": line.quantity}},
+        {"$inc": {"quantity": -line.quantity}, "$set": {"updated_at": now}}
+    ) for line in transfer.lines]
+    increments = [UpdateOne(
+        {"warehouse_id": transfer.to_warehouse_id, "good_id": line.good_id},
+        {"$inc": {"quantity": line.quantity}, "$set": {"updated_at": now}},
+        upsert=True
+    ) for line in transfer.lines]
+    return decrements, increments
+
+async def warehouse_stored_units(warehouse_id: str, session=None) -> int:
+    rows = await db.warehouse_stock.aggregate([
+        {"$match": {"warehouse_id": warehouse_id}},
+        {"$group": {"_id": None, "stored": {"$sum": "$quantity"}}}
+    ], session=session).to_list(1)
+    return rows[0]["stored"] if rows else 0
+
+async def check_warehouse_capacity(warehouse: dict, incoming: int, replaced: int = 0):
+    """400 unless the warehouse can take incoming more units, counting the
+    replaced units it holds now as freed. A capacity of 0 means no limit;
+    lowering what a warehouse holds is always allowed."""
+    capacity = warehouse.get("capacity") or 0
+    if capacity <= 0 or incoming <= replaced:
+        return
+    stored = await warehouse_stored_units(warehouse["id"]) - replaced
+    if stored + incoming > capacity:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Capacidad insuficiente en bodega de destino. Libre: {max(capacity - stored, 0)}, Solicitado: {incoming}"
+        )
+
+async def apply_stock_transfer(transfer: StockTransfer, capacity: int = 0) -> bool:
+    """Move every line or none; False when the source ran short or the
+    destination filled up meanwhile. A capacity of 0 means no limit.
+
+    Without transactions the destination's capacity is only checked by the
+    caller beforehand, so two transfers racing into it can overfill it.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    decrements, increments = transfer_operations(transfer, now)
+    operations = decrements + increments
+    
+    if await supports_transactions():
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                result = await db.warehouse_stock.bulk_write(operations, ordered=True, session=session)
+                # A source line without enough units matches nothing
+                if result.matched_count + result.upserted_count != len(operations):
+                    await session.abort_transaction()
+                    return False
+                if capacity > 0 and await warehouse_stored_units(transfer.to_warehouse_id, session) > capacity:
+                    await session.abort_transaction()
+                    return False
+        return True
+    
+    # Standalone server: guarded decrements one line at a time, undone on failure
+    applied = []
+    for line, decrement in zip(transfer.lines, decrements):
+        result = await db.warehouse_stock.bulk_write([decrement])
+        if result.modified_count == 0:
+            if applied:
+                await db.warehouse_stock.bulk_write([UpdateOne(
+                    {"warehouse_id": transfer.from_warehouse_id, "good_id": done.good_id},
+                    {"$inc": {"quantity": done.quantity}}
+                ) for done in applied], ordered=False)
+            return False
+        applied.append(line)
+    await db.warehouse_stock.bulk_write(increments, ordered=False)
+    return True
+
+@api_router.get("/warehouses/utilization")
+async def get_warehouse_utilization(current_user: dict = Depends(get_current_user)):
+    """Units stored per warehouse against its capacity, fullest first"""
+    pipeline = [
+        {"$match": {"quantity": {"$gt": 0}}},
+        {"$group": {"_id": "$warehouse_id", "stored": {"$sum": "$quantity"}, "goods_count": {"$sum": 1}}}
+    ]
+    stored = {row["_id"]: row async for row in db.warehouse_stock.aggregate(pipeline)}
+    warehouses = await db.warehouses.find({}, {"_id": 0, "id": 1, "name": 1, "capacity": 1, "active": 1}).to_list(1000)
+    
+    utilization = []
+    for warehouse in warehouses:
+        row = stored.get(warehouse["id"], {})
+        units = row.get("stored", 0)
+        utilization.append({
+            "warehouse_id": warehouse["id"],
+            "name": warehouse["name"],
+            "active": warehouse.get("active", True),
+            "capacity": warehouse["capacity"],
+            "stored": units,
+            "goods_count": row.get("goods_count", 0),
+            "utilization": round(units / warehouse["capacity"], 4) if warehouse["capacity"] > 0 else None
+        })
+    utilization.sort(key=lambda w: w["utilization"] if w["utilization"] is not None else -1, reverse=True)
+    return utilization
+
+@api_router.get("/warehouses/{warehouse_id}/stock")
+async def get_warehouse_stock(warehouse_id: str, current_user: dict = Depends(get_current_user)):
+    rows = await db.warehouse_stock.find(
+        {"warehouse_id": warehouse_id, "quantity": {"$gt": 0}},
+        {"_id": 0}
+    ).to_list(None)
+    goods = await db.goods.find(
+        {"id": {"$in": [r["good_id"] for r in rows]}},
+        {"_id": 0, "id": 1, "name": 1}
+    ).to_list(None)
+    names = {g["id"]: g["name"] for g in goods}
+    for row in rows:
+        row["good_name"] = names.get(row["good_id"], "N/A")
+    return rows
+
+@api_router.put("/warehouses/{warehouse_id}/stock/{good_id}")
+async def set_warehouse_stock(request: Request, warehouse_id: str, good_id: str, stock: WarehouseStockSet, current_user: dict = Depends(get_current_user)):
+    """Set how many units of a good a warehouse holds, e.g. after a physical count"""
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    warehouse = await db.warehouses.find_one({"id": warehouse_id}, {"_id": 0, "id": 1, "capacity": 1})
+    if not warehouse:
+        raise HTTPException(status_code=404, detail="Bodega no encontrada")
+    good = await db.goods.find_one({"id": good_id}, {"_id": 0, "id": 1, "quantity": 1})
+    if not good:
+        raise HTTPException(status_code=404, detail="Bien no encontrado")
+    
+    elsewhere = await db.warehouse_stock.aggregate([
+        {"$match": {"good_id": good_id, "warehouse_id": {"$ne": warehouse_id}}},
+        {"$group": {"_id": None, "quantity": {"$sum": "$quantity"}}}
+    ]).to_list(1)
+    placed_elsewhere = elsewhere[0]["quantity"] if elsewhere else 0
+    if placed_elsewhere + stock.quantity > good["quantity"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cantidad mayor a la disponible para ubicar: {good['quantity'] - placed_elsewhere}"
+        )
+    current = await db.warehouse_stock.find_one({"warehouse_id": warehouse_id, "good_id": good_id}, {"_id": 0, "quantity": 1})
+    await check_warehouse_capacity(warehouse, stock.quantity, current["quantity"] if current else 0)
+    
+    await db.warehouse_stock.update_one(
+        {"warehouse_id": warehouse_id, "good_id": good_id},
+        {"$set": {"quantity": stock.quantity, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    
+    client_ip = request.client.host if request.client else "unknown"
+    await create_audit_log(current_user["email"], "SET_WAREHOUSE_STOCK", "warehouses", client_ip, f"Warehouse: {warehouse_id}, good: {good_id}, quantity: {stock.quantity}")
+    
+    return {"warehouse_id": warehouse_id, "good_id": good_id, "quantity": stock.quantity}
+
+@api_router.post("/warehouses/transfers")
+async def transfer_stock(request: Request, transfer: StockTransfer, current_user: dict = Depends(get_current_user)):
+    """Move goods between warehouses; all lines move or none do"""
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    if transfer.from_warehouse_id == transfer.to_warehouse_id:
+        raise HTTPException(status_code=400, detail="La bodega de origen y destino deben ser distintas")
+    if not transfer.lines:
+        raise HTTPException(status_code=400, detail="Indique al menos un bien")
+    if len({line.good_id for line in transfer.lines}) != len(transfer.lines):
+        raise HTTPException(status_code=400, detail="Cada bien debe aparecer una sola vez")
+    
+    warehouses = await db.warehouses.find(
+        {"id": {"$in": [transfer.from_warehouse_id, transfer.to_warehouse_id]}},
+        {"_id": 0, "id": 1, "capacity": 1}
+    ).to_list(2)
+    if len(warehouses) != 2:
+        raise HTTPException(status_code=404, detail="Bodega no encontrada")
+    capacity = next(w for w in warehouses if w["id"] == transfer.to_warehouse_id).get("capacity") or 0
+    
+    source = await db.warehouse_stock.find(
+        {"warehouse_id": transfer.from_warehouse_id, "good_id": {"$in": [line.good_id for line in transfer.lines]}},
+        {"_id": 0, "good_id": 1, "quantity": 1}
+    ).to_list(None)
+    in_source = {row["good_id"]: row["quantity"] for row in source}
+    for line in transfer.lines:
+        if in_source.get(line.good_id, 0) < line.quantity:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Stock insuficiente en bodega de origen para {line.good_id}. Disponible: {in_source.get(line.good_id, 0)}, Solicitado: {line.quantity}"
+            )
+    
+    await check_warehouse_capacity(
+        {"id": transfer.to_warehouse_id, "capacity": capacity},
+        sum(line.quantity for line in transfer.lines)
+    )
+    
+    if not await apply_stock_transfer(transfer, capacity):
+        raise HTTPException(status_code=409, detail="El stock de las bodegas cambió, intente de nuevo")
+    
+    transfer_doc = {
+        "id": str(uuid.uuid4()),
+        **transfer.model_dump(),
+        "created_by": current_user["email"],
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.warehouse_transfers.insert_one(transfer_doc)
+    transfer_doc.pop("_id", None)
+    
+    client_ip = request.client.host if request.client else "unknown"
+    await create_audit_log(current_user["email"], "TRANSFER_STOCK", "warehouses", client_ip, f"From {transfer.from_warehouse_id} to {transfer.to_warehouse_id}: {len(transfer.lines)} goods")
+    
+    return transfer_doc
+
 # Goods endpoints
 @api_router.get("/goods", response_model=List[Good])
 async def get_goods(current_user: dict = Depends(get_current_user)):
-    goods = await db.goods.find({}, {"_id": 0}).to_list(1000)
-    return goods
+    return await singleflight.do("goods", (current_user["role"],), load_goods)
+
+async def load_goods() -> List[dict]:
+    return await db.goods.find({}, {"_id": 0}).to_list(1000)
 
 @api_router.post("/goods", response_model=Good)
 async def create_good(request: Request, good_data: GoodCreate, current_user: dict = Depends(get_current_user)):
@@ -681,13 +1772,61 @@ async def create_good(request: Request, good_data: GoodCreate, current_user: dic
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
+    if good_data.warehouse_id:
+        warehouse = await db.warehouses.find_one({"id": good_data.warehouse_id}, {"_id": 0, "id": 1, "capacity": 1})
+        if not warehouse:
+            raise HTTPException(status_code=404, detail="Bodega no encontrada")
+        await check_warehouse_capacity(warehouse, good_data.quantity)
+    
     await db.goods.insert_one(good)
+    await bump_data_versions("goods")
+    if good_data.warehouse_id:
+        await db.warehouse_stock.insert_one({
+            "warehouse_id": good_data.warehouse_id,
+            "good_id": good["id"],
+            "quantity": good["quantity"],
+            "updated_at": good["created_at"]
+        })
+    await record_stock_movements([
+        stock_movement(good, "alta", good["quantity"], good["available_quantity"], current_user["email"])
+    ])
     
     client_ip = request.client.host if request.client else "unknown"
     await create_audit_log(current_user["email"], "CREATE_GOOD", "goods", client_ip, f"Created: {good_data.name}")
     
+    good.pop("_id", None)
+    publish_event("good.upserted", good)
+    publish_event("dashboard.delta", {
+        "total_goods": 1,
+        "total_quantity": good["quantity"],
+        "available_quantity": good["available_quantity"]
+    })
+    
     return good
 
+@api_router.get("/goods/{good_id}/stock")
+async def get_good_stock(good_id: str, current_user: dict = Depends(get_current_user)):
+    """Warehouses where a good is stocked"""
+    good = await db.goods.find_one({"id": good_id}, {"_id": 0, "id": 1, "quantity": 1})
+    if not good:
+        raise HTTPException(status_code=404, detail="Bien no encontrado")
+    
+    rows = await db.warehouse_stock.find({"good_id": good_id, "quantity": {"$gt": 0}}, {"_id": 0}).to_list(None)
+    warehouses = await db.warehouses.find(
+        {"id": {"$in": [r["warehouse_id"] for r in rows]}},
+        {"_id": 0, "id": 1, "name": 1}
+    ).to_list(None)
+    names = {w["id"]: w["name"] for w in warehouses}
+    for row in rows:
+        row["warehouse_name"] = names.get(row["warehouse_id"], "N/A")
+    
+    return {
+        "good_id": good_id,
+        "quantity": good["quantity"],
+        "unplaced": good["quantity"] - sum(r["quantity"] for r in rows),
+        "warehouses": rows
+    }
+
 @api_router.put("/goods/{good_id}", response_model=Good)
 async def update_good(request: Request, good_id: str, good_data: GoodUpdate, current_user: dict = Depends(get_current_user)):
     good = await db.goods.find_one({"id": good_id}, {"_id": 0})
@@ -696,43 +1835,694 @@ async def update_good(request: Request, good_id: str, good_data: GoodUpdate, cur
     
     update_data = {k: v for k, v in good_data.model_dump(exclude_unset=True).items() if v is not None}
     
+    if update_data.get("quantity", good["quantity"]) < good["quantity"]:
+        # Warehouses may not hold more units than the good has in total
+        placed = await db.warehouse_stock.aggregate([
+            {"$match": {"good_id": good_id}},
+            {"$group": {"_id": None, "quantity": {"$sum": "$quantity"}}}
+        ]).to_list(1)
+        placed_quantity = placed[0]["quantity"] if placed else 0
+        if update_data["quantity"] < placed_quantity:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Hay {placed_quantity} unidades ubicadas en bodegas; reduzca primero el stock por bodega"
+            )
+    
     if update_data:
         await db.goods.update_one({"id": good_id}, {"$set": update_data})
+        await bump_data_versions("goods")
+        
+        if "quantity" in update_data and update_data["quantity"] != good["quantity"]:
+            # Only the total changes; available_quantity is left as it was
+            await record_stock_movements([
+                stock_movement(good, "ajuste", update_data["quantity"] - good["quantity"], 0, current_user["email"])
+            ])
         
         client_ip = request.client.host if request.client else "unknown"
         await create_audit_log(current_user["email"], "UPDATE_GOOD", "goods", client_ip, f"Updated: {good_id}")
     
     updated_good = await db.goods.find_one({"id": good_id}, {"_id": 0})
+    if update_data:
+        publish_event("good.upserted", updated_good)
+        if updated_good["quantity"] != good["quantity"]:
+            publish_event("dashboard.delta", {"total_quantity": updated_good["quantity"] - good["quantity"]})
     return updated_good
 
 @api_router.delete("/goods/{good_id}")
 async def delete_good(request: Request, good_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.goods.delete_one({"id": good_id})
-    if result.deleted_count == 0:
+    good = await db.goods.find_one_and_delete({"id": good_id}, {"_id": 0})
+    if not good:
         raise HTTPException(status_code=404, detail="Bien no encontrado")
+    await bump_data_versions("goods")
+    
+    await record_stock_movements([
+        stock_movement(good, "baja", -good["quantity"], -good["available_quantity"], current_user["email"])
+    ])
+    await db.warehouse_stock.delete_many({"good_id": good_id})
     
     client_ip = request.client.host if request.client else "unknown"
     await create_audit_log(current_user["email"], "DELETE_GOOD", "goods", client_ip, f"Deleted: {good_id}")
+    publish_event("good.deleted", {"id": good_id})
+    publish_event("dashboard.delta", {
+        "total_goods": -1,
+        "total_quantity": -good["quantity"],
+        "available_quantity": -good["available_quantity"]
+    })
     
     return {"message": "Bien eliminado exitosamente"}
 
-# Assignment endpoints
-@api_router.get("/assignments", response_model=List[dict])
-async def get_assignments(current_user: dict = Depends(get_current_user)):
-    assignments = await db.assignments.find({}, {"_id": 0}).to_list(1000)
-    
-    for assignment in assignments:
-        details = await db.assignment_details.find(
-            {"assignment_id": assignment["id"]}, 
-            {"_id": 0}
-        ).to_list(1000)
-        assignment["details"] = details
-    
-    return assignments
+# ============================================
+# LEASES
+# ============================================
+# Every API worker starts the same background loops. Work that must run in
+# only one of them takes a named lease first: a leases document naming the
+# holding process and when its hold expires. The holder renews it on every
+# pass; if it dies, another worker takes over once the lease has expired.
 
-@api_router.post("/assignments")
-async def create_assignment(request: Request, assignment_data: AssignmentCreate, current_user: dict = Depends(get_current_user)):
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+async def acquire_lease(name: str, seconds: float) -> bool:
+    """Take or renew the named lease for this worker; False while another holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        lease = await db.leases.find_one_and_update(
+            {"id": name, "$or": [{"holder": WORKER_ID}, {"expires_at": {"$lt": now.isoformat()}}]},
+            {"$set": {"holder": WORKER_ID, "expires_at": (now + timedelta(seconds=seconds)).isoformat()}},
+            projection={"_id": 0, "holder": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The lease exists and is held by another worker, so the upsert
+        # tried to insert a second document with the same id
+        return False
+    return lease is not None and lease["holder"] == WORKER_ID
+
+# ============================================
+# STOCK LEDGER
+# ============================================
+# Every change to a good's quantity or available_quantity is appended to
+# stock_movements. Checkpoints store the stock of every good at a cutoff, so
+# an as-of query starts from the nearest checkpoint and only replays the
+# movements after it. Each checkpoint is built from the previous one plus the
+# movements in between, never from the live goods collection, so it always
+# agrees with the ledger.
+#
+# Movement types: apertura (opening balance written by manage.py), alta,
+# ajuste (quantity edited), asignacion, devolucion, baja (good deleted) and
+# conciliacion (drift fixed by reconcile_stock).
+
+STOCK_CHECKPOINT_HOURS = float(os.environ.get('STOCK_CHECKPOINT_HOURS', '24'))
+STOCK_CHECKPOINT_LAG = timedelta(minutes=1)  # leaves in-flight writes out of a new checkpoint
+
+_stock_checkpoint_task = None
+
+def stock_movement(good: dict, movement_type: str, quantity_delta: int, available_delta: int, user_email: str, reference: Optional[str] = None) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "good_id": good["id"],
+        "good_name": good.get("name", "N/A"),
+        "type": movement_type,
+        "quantity_delta": quantity_delta,
+        "available_delta": available_delta,
+        "reference": reference,
+        "user_email": user_email,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
+async def record_stock_movements(movements: List[dict]):
+    if movements:
+        await db.stock_movements.insert_many(movements, ordered=False)
+
+def parse_as_of(value: str) -> str:
+    """ISO timestamp normalized to UTC so it compares with stored created_at strings"""
+    try:
+        at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida, use formato ISO 8601")
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return at.astimezone(timezone.utc).isoformat()
+
+async def stock_as_of(at: str, good_id: Optional[str] = None) -> dict:
+    """Stock per good at instant at: nearest checkpoint plus the movements after it"""
+    checkpoint = await db.stock_checkpoints.find_one(
+        {"taken_at": {"$lte": at}, "complete": True},
+        {"_id": 0},
+        sort=[("taken_at", -1)]
+    )
+    
+    stock = {}
+    since = None
+    if checkpoint:
+        since = checkpoint["taken_at"]
+        item_query = {"checkpoint_id": checkpoint["id"]}
+        if good_id:
+            item_query["good_id"] = good_id
+        async for item in db.stock_checkpoint_items.find(item_query, {"_id": 0, "checkpoint_id": 0}):
+            stock[item["good_id"]] = item
+    
+    match = {"created_at": {"$lte": at}}
+    if since:
+        match["created_at"]["$gt"] = since
+    if good_id:
+        match["good_id"] = good_id
+    replayed = 0
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": "$good_id",
+            "quantity": {"$sum": "$quantity_delta"},
+            "available_quantity": {"$sum": "$available_delta"},
+            "good_name": {"$last": "$good_name"},
+            "last_type": {"$last": "$type"},
+            "movements": {"$sum": 1}
+        }}
+    ]
+    async for delta in db.stock_movements.aggregate(pipeline):
+        replayed += delta["movements"]
+        if delta["last_type"] == "baja":
+            stock.pop(delta["_id"], None)
+            continue
+        item = stock.setdefault(delta["_id"], {"good_id": delta["_id"], "quantity": 0, "available_quantity": 0})
+        item["good_name"] = delta["good_name"]
+        item["quantity"] += delta["quantity"]
+        item["available_quantity"] += delta["available_quantity"]
+    
+    return {
+        "at": at,
+        "checkpoint": since,
+        "replayed_movements": replayed,
+        "goods": sorted(stock.values(), key=lambda item: item["good_name"])
+    }
+
+async def create_stock_checkpoint(cutoff: Optional[datetime] = None) -> dict:
+    taken_at = (cutoff or datetime.now(timezone.utc) - STOCK_CHECKPOINT_LAG).isoformat()
+    state = await stock_as_of(taken_at)
+    
+    checkpoint = {
+        "id": str(uuid.uuid4()),
+        "taken_at": taken_at,
+        "goods_count": len(state["goods"]),
+        "replayed_movements": state["replayed_movements"],
+        "complete": False,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.stock_checkpoints.insert_one(checkpoint)
+    items = [{"checkpoint_id": checkpoint["id"], **item} for item in state["goods"]]
+    for start in range(0, len(items), 1000):
+        await db.stock_checkpoint_items.insert_many(items[start:start + 1000], ordered=False)
+    # Readers only use complete checkpoints, so a crash above leaves nothing half-built in use
+    await db.stock_checkpoints.update_one({"id": checkpoint["id"]}, {"$set": {"complete": True}})
+    
+    checkpoint["complete"] = True
+    checkpoint.pop("_id", None)
+    return checkpoint
+
+async def stock_checkpoint_loop():
+    """Take a checkpoint whenever the latest one is older than STOCK_CHECKPOINT_HOURS.
+
+    Runs in every worker, but only the holder of the stock_checkpoints lease
+    writes checkpoints. The lease outlasts a few passes, so the holder keeps
+    it while alive.
+    """
+    interval = timedelta(hours=STOCK_CHECKPOINT_HOURS)
+    pause = min(interval.total_seconds(), 600)
+    while True:
+        try:
+            if not await acquire_lease("stock_checkpoints", 3 * pause):
+                await asyncio.sleep(pause)
+                continue
+            latest = await db.stock_checkpoints.find_one({"complete": True}, {"_id": 0, "taken_at": 1}, sort=[("taken_at", -1)])
+            if not latest or datetime.fromisoformat(latest["taken_at"]) < datetime.now(timezone.utc) - interval:
+                checkpoint = await create_stock_checkpoint()
+                logger.info(f"Stock checkpoint taken at {checkpoint['taken_at']} ({checkpoint['replayed_movements']} movements replayed)")
+        except Exception as e:
+            logger.warning(f"Stock checkpoint failed: {str(e)}")
+        await asyncio.sleep(pause)
+
+@api_router.get("/stock/as-of")
+async def get_stock_as_of(at: str, good_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    return await stock_as_of(parse_as_of(at), good_id)
+
+@api_router.get("/stock/movements")
+async def get_stock_movements(
+    good_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = 200,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    query = {}
+    if good_id:
+        query["good_id"] = good_id
+    if date_from or date_to:
+        query["created_at"] = {}
+        if date_from:
+            query["created_at"]["$gte"] = parse_as_of(date_from)
+        if date_to:
+            query["created_at"]["$lte"] = parse_as_of(date_to)
+    
+    limit = max(1, min(limit, 1000))
+    return await db.stock_movements.find(query, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+
+@api_router.post("/stock/checkpoints")
+async def take_stock_checkpoint(request: Request, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    checkpoint = await create_stock_checkpoint()
+    
+    client_ip = request.client.host if request.client else "unknown"
+    await create_audit_log(current_user["email"], "STOCK_CHECKPOINT", "stock", client_ip, f"Checkpoint at {checkpoint['taken_at']}")
+    
+    return checkpoint
+
+# Stock reconciliation
+# available_quantity should equal quantity minus what open assignments hold.
+# It drifts when update_good edits quantity or a multi-line assignment fails
+# halfway, so this recomputes it and optionally corrects it.
+# Assignments and returns change a good and its assignment_details in
+# separate writes, so a check can see one without the other. They stamp
+# stock_updated_at on the good before touching the assignment side; goods
+# stamped within RECONCILE_GRACE_SECONDS are reported but not corrected, and
+# a correction only applies if the stamp is still the one that was read.
+
+RECONCILE_GRACE_SECONDS = 60
+
+async def outstanding_by_good(good_ids: List[str]) -> dict:
+    """Units held by open assignments for the given goods, in a single aggregation"""
+    pipeline = [
+        {"$match": {"good_id": {"$in": good_ids}}},
+        {"$lookup": {
+            "from": "assignments",
+            "localField": "assignment_id",
+            "foreignField": "id",
+            "as": "assignment"
+        }},
+        {"$match": {"assignment.status": {"$in": ["Pendiente", "Entregado"]}}},
+        {"$group": {"_id": "$good_id", "outstanding": {"$sum": "$quantity_assigned"}}}
+    ]
+    return {row["_id"]: row["outstanding"] async for row in db.assignment_details.aggregate(pipeline)}
+
+async def reconcile_stock(fix: bool, user_email: str, batch_size: int = 500, concurrency: int = 4) -> dict:
+    """Compare available_quantity with quantity minus outstanding units, batch by batch.
+
+    Each batch reads its goods and then the outstanding units of just those
+    goods. Differences on goods with a recent stock write, and corrections
+    whose good changed after it was read, are counted as skipped; they are
+    checked again on the next run. The corrections go out in one bulk_write.
+    """
+    in_flight_after = (datetime.now(timezone.utc) - timedelta(seconds=RECONCILE_GRACE_SECONDS)).isoformat()
+    good_ids = [g["id"] for g in await db.goods.find({}, {"_id": 0, "id": 1}).sort("id", 1).to_list(None)]
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def check_batch(ids: List[str]) -> List[dict]:
+        async with semaphore:
+            goods = await db.goods.find(
+                {"id": {"$in": ids}},
+                {"_id": 0, "id": 1, "name": 1, "quantity": 1, "available_quantity": 1, "stock_updated_at": 1}
+            ).to_list(None)
+            outstanding = await outstanding_by_good(ids)
+        differences = []
+        for good in goods:
+            expected = good["quantity"] - outstanding.get(good["id"], 0)
+            if expected != good["available_quantity"]:
+                differences.append({
+                    "good_id": good["id"],
+                    "good_name": good["name"],
+                    "quantity": good["quantity"],
+                    "outstanding": outstanding.get(good["id"], 0),
+                    "available_quantity": good["available_quantity"],
+                    "expected_available": expected,
+                    "stock_updated_at": good.get("stock_updated_at"),
+                    # An assignment or return may be halfway through
+                    "in_flight": good.get("stock_updated_at", "") > in_flight_after,
+                    # More units out than the good has; needs a human, not a fix
+                    "fixable": expected >= 0
+                })
+        return differences
+    
+    batches = [good_ids[start:start + batch_size] for start in range(0, len(good_ids), batch_size)]
+    results = await asyncio.gather(*(check_batch(batch) for batch in batches))
+    differences = [d for batch in results for d in batch]
+    
+    fixed = 0
+    skipped = 0
+    if fix:
+        fixable = [d for d in differences if d["fixable"]]
+        to_fix = [d for d in fixable if not d["in_flight"]]
+        applied = []
+        if to_fix:
+            fixed_at = datetime.now(timezone.utc).isoformat()
+            # Only goods still as the check saw them; a null stamp also matches a missing one
+            result = await db.goods.bulk_write([
+                UpdateOne(
+                    {"id": d["good_id"], "quantity": d["quantity"], "available_quantity": d["available_quantity"],
+                     "stock_updated_at": d["stock_updated_at"]},
+                    {"$set": {"available_quantity": d["expected_available"], "stock_updated_at": fixed_at}}
+                )
+                for d in to_fix
+            ], ordered=False)
+            if result.modified_count == len(to_fix):
+                applied = to_fix
+            else:
+                # Some goods changed in the meantime; the applied ones carry this run's stamp
+                stamped = {g["id"] async for g in db.goods.find(
+                    {"id": {"$in": [d["good_id"] for d in to_fix]}, "stock_updated_at": fixed_at},
+                    {"_id": 0, "id": 1}
+                )}
+                applied = [d for d in to_fix if d["good_id"] in stamped]
+        for d in fixable:
+            d["fixed"] = d in applied
+        skipped = len(fixable) - len(applied)
+        if applied:
+            await bump_data_versions("goods")
+            await record_stock_movements([stock_movement(
+                {"id": d["good_id"], "name": d["good_name"]},
+                "conciliacion", 0, d["expected_available"] - d["available_quantity"], user_email
+            ) for d in applied])
+            publish_stock_changes({d["good_id"]: d["expected_available"] - d["available_quantity"] for d in applied})
+        fixed = len(applied)
+    
+    return {
+        "checked": len(good_ids),
+        "batches": len(batches),
+        "differences": differences,
+        "fixed": fixed,
+        "skipped": skipped
+    }
+
+@api_router.post("/admin/stock/reconcile")
+async def reconcile_stock_endpoint(request: Request, fix: bool = False, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    result = await reconcile_stock(fix, current_user["email"])
+    
+    if fix:
+        client_ip = request.client.host if request.client else "unknown"
+        await create_audit_log(current_user["email"], "RECONCILE_STOCK", "stock", client_ip, f"Fixed: {result['fixed']} goods, skipped: {result['skipped']}")
+    
+    return result
+
+# ============================================
+# ACTA PDF RENDERING
+# ============================================
+# ReportLab is imported inside these functions: it is the heaviest import in
+# the module and only acta downloads need it, so workers start without it.
+
+ACTA_LOGO_URL = "https://customer-assets.emergentagent.com/job_cc84c26b-490c-4e94-9201-0c145d45c1fb/artifacts/p507w2uv_LOGO-PRINCIPAL-CON-FONDO.jpg"
+PRINT_RUN_MAX_ACTAS = int(os.environ.get('PRINT_RUN_MAX_ACTAS', '500'))
+
+_acta_resources = None
+
+def load_acta_logo() -> Optional[bytes]:
+    import urllib.request
+    try:
+        with urllib.request.urlopen(ACTA_LOGO_URL, timeout=5) as response:
+            return response.read()
+    except Exception as e:
+        logger.warning(f"Could not load acta logo: {str(e)}")
+        return None
+
+def build_acta_resources(logo_bytes: Optional[bytes]) -> dict:
+    """Style sheet, table styles and logo shared by every acta render"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+    return {
+        "styles": getSampleStyleSheet(),
+        "logo_bytes": logo_bytes,
+        "goods_table_style": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1E40AF')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]),
+        "signature_table_style": TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 1), (-1, 1), 10),
+        ])
+    }
+
+def get_acta_resources() -> dict:
+    global _acta_resources
+    if _acta_resources is None:
+        _acta_resources = build_acta_resources(load_acta_logo())
+    return _acta_resources
+
+def build_acta_logo(resources: dict):
+    if not resources["logo_bytes"]:
+        return None
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image
+    try:
+        return Image(io.BytesIO(resources["logo_bytes"]), width=2*inch, height=0.8*inch, lazy=0)
+    except Exception as e:
+        logger.warning(f"Invalid acta logo image: {str(e)}")
+        return None
+
+def build_acta_story(acta: dict, resources: dict, logo=None) -> list:
+    """Flowables for one acta.
+
+    acta holds code, instructor_name, discipline, date, delivered_by, notes
+    and lines, a list of (good name, description, quantity) tuples.
+    """
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer, Table
+    styles = resources["styles"]
+    elements = []
+    
+    if logo is not None:
+        elements.append(logo)
+    
+    elements.append(Spacer(1, 0.3*inch))
+    elements.append(Paragraph("<b>ACTA DE ENTREGA DE INVENTARIO</b>", styles['Title']))
+    elements.append(Spacer(1, 0.3*inch))
+    
+    info = f"""<br/>
+    <b>Código:</b> {acta['code']}<br/>
+    <b>Instructor:</b> {acta['instructor_name']}<br/>
+    <b>Disciplina:</b> {acta['discipline']}<br/>
+    <b>Fecha:</b> {acta['date']}<br/>
+    <b>Entregado por:</b> {acta['delivered_by']}<br/>
+    """
+    elements.append(Paragraph(info, styles['Normal']))
+    elements.append(Spacer(1, 0.3*inch))
+    
+    table_data = [["Bien", "Descripción", "Cantidad"]]
+    for name, description, quantity in acta["lines"]:
+        table_data.append([name, description, str(quantity)])
+    table = Table(table_data)
+    table.setStyle(resources["goods_table_style"])
+    elements.append(table)
+    
+    if acta.get("notes"):
+        elements.append(Spacer(1, 0.3*inch))
+        elements.append(Paragraph(f"<b>Notas:</b> {acta['notes']}", styles['Normal']))
+    
+    # Signature section
+    elements.append(Spacer(1, inch))
+    sig_table_data = [
+        ["_" * 30, "_" * 30],
+        ["Firma Instructor", "Firma Responsable"]
+    ]
+    sig_table = Table(sig_table_data, colWidths=[2.5*inch, 2.5*inch])
+    sig_table.setStyle(resources["signature_table_style"])
+    elements.append(sig_table)
+    
+    return elements
+
+def render_actas_pdf(actas: List[dict], resources: Optional[dict] = None) -> bytes:
+    """Render one or more actas into a single PDF, one acta per page.
+
+    The logo flowable is built once per document and shared by every page;
+    it is not shared between documents because renders run in worker threads.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import PageBreak, SimpleDocTemplate
+    with WORK_IN_FLIGHT.track(kind="pdf"), ACTA_RENDER_DURATION.time():
+        resources = resources or get_acta_resources()
+        logo = build_acta_logo(resources)
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+        elements = []
+        for index, acta in enumerate(actas):
+            if index > 0:
+                elements.append(PageBreak())
+            elements.extend(build_acta_story(acta, resources, logo))
+        doc.build(elements)
+    ACTA_RENDER_PAGES.inc(len(actas))
+    return buffer.getvalue()
+
+# Assignment endpoints
+def good_snapshot(good: dict, category_names: dict) -> dict:
+    """Names copied into assignment_details when they are written.
+
+    Read paths print these instead of joining goods and categories, and old
+    actas keep showing what was delivered after a good is renamed.
+    """
+    return {
+        "good_name": good["name"],
+        "good_description": good.get("description", ""),
+        "category_name": category_names.get(good["category_id"], "N/A")
+    }
+
+# Instructor holdings
+# instructor_holdings keeps one document per (instructor_id, good_id) with
+# what the instructor holds right now: "quantity" assigned and not returned,
+# and the part of it whose reception was confirmed. Assignment writes keep it
+# current with $inc; "python manage.py reconcile-holdings" rebuilds it.
+
+async def update_holdings(instructor: dict, details: List[dict], quantity_sign: int, confirmed_sign: int):
+    """instructor needs id and name, as found on an assignment or an instructor document"""
+    if not instructor.get("id"):
+        return  # assignment from before instructor ids whose name matched no instructor
+    totals = {}
+    for detail in details:
+        entry = totals.setdefault(detail["good_id"], {"quantity": 0, "detail": detail})
+        entry["quantity"] += detail["quantity_assigned"]
+    
+    now = datetime.now(timezone.utc).isoformat()
+    operations = [UpdateOne(
+        {"instructor_id": instructor["id"], "good_id": good_id},
+        {
+            "$inc": {
+                "quantity": quantity_sign * entry["quantity"],
+                "quantity_confirmed": confirmed_sign * entry["quantity"]
+            },
+            "$set": {
+                "instructor_name": instructor["name"],
+                "good_name": entry["detail"].get("good_name", "N/A"),
+                "category_name": entry["detail"].get("category_name", "N/A"),
+                "updated_at": now
+            }
+        },
+        upsert=True
+    ) for good_id, entry in totals.items()]
+    if operations:
+        await db.instructor_holdings.bulk_write(operations, ordered=False)
+    if quantity_sign < 0:
+        await db.instructor_holdings.delete_many({"instructor_id": instructor["id"], "quantity": {"$lte": 0}})
+
+@api_router.get("/assignments", response_model=List[dict])
+async def get_assignments(current_user: dict = Depends(get_current_user)):
+    assignments = await db.assignments.find({}, {"_id": 0}).to_list(1000)
+    details = await db.assignment_details.find(
+        {"assignment_id": {"$in": [a["id"] for a in assignments]}},
+        {"_id": 0}
+    ).to_list(None)
+    return build_assignments_report(assignments, details)
+
+async def resolve_assignment_refs(assignment_data: AssignmentCreate) -> tuple:
+    """Instructor and sport documents for an assignment, by id or else by name"""
+    if assignment_data.instructor_id:
+        instructor = await db.instructors.find_one({"id": assignment_data.instructor_id}, {"_id": 0, "password_hash": 0})
+    elif assignment_data.instructor_name:
+        instructor = await db.instructors.find_one({"name": assignment_data.instructor_name}, {"_id": 0, "password_hash": 0})
+    else:
+        raise HTTPException(status_code=400, detail="Indique el instructor")
+    if not instructor:
+        raise HTTPException(status_code=404, detail="Instructor no encontrado")
+    
+    if assignment_data.sport_id:
+        sport = await db.sports.find_one({"id": assignment_data.sport_id}, {"_id": 0})
+    elif assignment_data.discipline:
+        sport = await db.sports.find_one({"name": assignment_data.discipline}, {"_id": 0})
+    else:
+        raise HTTPException(status_code=400, detail="Indique la disciplina")
+    if not sport:
+        raise HTTPException(status_code=404, detail="Deporte no encontrado")
+    
+    return instructor, sport
+
+async def backfill_assignment_refs(batch_size: int = 1000, dry_run: bool = False) -> dict:
+    """Set instructor_id and sport_id on assignments that only have the names.
+
+    Names that match nothing get None, so the assignment is not picked up
+    again; the delete guards still find those by name.
+    """
+    instructors = await db.instructors.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    sports = await db.sports.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    instructor_ids = {i["name"]: i["id"] for i in instructors}
+    sport_ids = {s["name"]: s["id"] for s in sports}
+    
+    pending = db.assignments.find(
+        {"$or": [{"instructor_id": {"$exists": False}}, {"sport_id": {"$exists": False}}]},
+        {"_id": 0, "id": 1, "instructor_name": 1, "discipline": 1}
+    )
+    updated = 0
+    unmatched_instructors = set()
+    unmatched_sports = set()
+    operations = []
+    async for assignment in pending:
+        instructor_id = instructor_ids.get(assignment["instructor_name"])
+        sport_id = sport_ids.get(assignment["discipline"])
+        if not instructor_id:
+            unmatched_instructors.add(assignment["instructor_name"])
+        if not sport_id:
+            unmatched_sports.add(assignment["discipline"])
+        operations.append(UpdateOne({"id": assignment["id"]}, {"$set": {"instructor_id": instructor_id, "sport_id": sport_id}}))
+        if len(operations) >= batch_size:
+            if not dry_run:
+                await db.assignments.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations and not dry_run:
+        await db.assignments.bulk_write(operations, ordered=False)
+    updated += len(operations)
+    if updated and not dry_run:
+        await bump_data_versions("assignments")
+    
+    return {
+        "updated": updated,
+        "unmatched_instructors": sorted(unmatched_instructors),
+        "unmatched_sports": sorted(unmatched_sports)
+    }
+
+MATCH_NOTHING = {"$in": []}
+
+async def assignment_ref_query(
+    instructor_id: Optional[str] = None,
+    sport_id: Optional[str] = None,
+    instructor_name: Optional[str] = None,
+    discipline: Optional[str] = None
+) -> dict:
+    """Assignments filter on instructor_id/sport_id. The names are still
+    accepted and resolved to ids; an unknown name matches nothing."""
+    query = {}
+    if not instructor_id and instructor_name:
+        instructor = await db.instructors.find_one({"name": instructor_name}, {"_id": 0, "id": 1})
+        instructor_id = instructor["id"] if instructor else MATCH_NOTHING
+    if not sport_id and discipline:
+        sport = await db.sports.find_one({"name": discipline}, {"_id": 0, "id": 1})
+        sport_id = sport["id"] if sport else MATCH_NOTHING
+    if instructor_id:
+        query["instructor_id"] = instructor_id
+    if sport_id:
+        query["sport_id"] = sport_id
+    return query
+
+@api_router.post("/assignments")
+async def create_assignment(request: Request, assignment_data: AssignmentCreate, current_user: dict = Depends(get_current_user)):
+    instructor, sport = await resolve_assignment_refs(assignment_data)
+    
     # Validate stock
+    goods_by_id = {}
     for detail in assignment_data.details:
         good = await db.goods.find_one({"id": detail.good_id}, {"_id": 0})
         if not good:
@@ -743,12 +2533,19 @@ async def create_assignment(request: Request, assignment_data: AssignmentCreate,
                 status_code=400, 
                 detail=f"Stock insuficiente para {good['name']}. Disponible: {good['available_quantity']}, Solicitado: {detail.quantity_assigned}"
             )
+        goods_by_id[good["id"]] = good
+    
+    category_ids = list({g["category_id"] for g in goods_by_id.values()})
+    categories = await db.categories.find({"id": {"$in": category_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    category_names = {c["id"]: c["name"] for c in categories}
     
     assignment_id = str(uuid.uuid4())
     assignment = {
         "id": assignment_id,
-        "instructor_name": assignment_data.instructor_name,
-        "discipline": assignment_data.discipline,
+        "instructor_id": instructor["id"],
+        "instructor_name": instructor["name"],
+        "sport_id": sport["id"],
+        "discipline": sport["name"],
         "created_by": current_user["email"],
         "created_at": datetime.now(timezone.utc).isoformat(),
         "status": "Pendiente",
@@ -765,91 +2562,42 @@ async def create_assignment(request: Request, assignment_data: AssignmentCreate,
             "assignment_id": assignment_id,
             "good_id": detail.good_id,
             "quantity_assigned": detail.quantity_assigned,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            **good_snapshot(goods_by_id[detail.good_id], category_names)
         }
-        await db.assignment_details.insert_one(detail_doc)
-        details_list.append(detail_doc)
-        
+        # The good first, stamped, so reconcile_stock leaves it alone until the detail exists
         await db.goods.update_one(
             {"id": detail.good_id},
-            {"$inc": {"available_quantity": -detail.quantity_assigned}}
+            {"$inc": {"available_quantity": -detail.quantity_assigned},
+             "$set": {"stock_updated_at": datetime.now(timezone.utc).isoformat()}}
         )
+        await db.assignment_details.insert_one(detail_doc)
+        details_list.append(detail_doc)
+    await bump_data_versions("assignments", "goods")
+    
+    await update_holdings(instructor, details_list, 1, 0)
+    await record_stock_movements([
+        stock_movement(goods_by_id[d["good_id"]], "asignacion", 0, -d["quantity_assigned"], current_user["email"], assignment_id)
+        for d in details_list
+    ])
     
     # Generate PDF
     acta_code = f"ACTA-{assignment_id[:8].upper()}"
     pdf_filename = f"{acta_code}.pdf"
-    pdf_path = ROOT_DIR / "actas" / pdf_filename
-    pdf_path.parent.mkdir(exist_ok=True)
     
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Logo
-    logo_url = "https://customer-assets.emergentagent.com/job_cc84c26b-490c-4e94-9201-0c145d45c1fb/artifacts/p507w2uv_LOGO-PRINCIPAL-CON-FONDO.jpg"
-    try:
-        img = Image(logo_url, width=2*inch, height=0.8*inch)
-        elements.append(img)
-    except:
-        pass
-    
-    elements.append(Spacer(1, 0.3*inch))
+    lines = [(d["good_name"], d["good_description"], d["quantity_assigned"]) for d in details_list]
     
-    title = Paragraph("<b>ACTA DE ENTREGA DE INVENTARIO</b>", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    info = f"""<br/>
-    <b>Código:</b> {acta_code}<br/>
-    <b>Instructor:</b> {assignment_data.instructor_name}<br/>
-    <b>Disciplina:</b> {assignment_data.discipline}<br/>
-    <b>Fecha:</b> {datetime.now(timezone.utc).strftime('%d/%m/%Y %H:%M')}<br/>
-    <b>Entregado por:</b> {current_user['name']} ({current_user['email']})<br/>
-    """
-    elements.append(Paragraph(info, styles['Normal']))
-    elements.append(Spacer(1, 0.3*inch))
-    
-    table_data = [["Bien", "Descripción", "Cantidad"]]
-    for detail in assignment_data.details:
-        good = await db.goods.find_one({"id": detail.good_id}, {"_id": 0})
-        table_data.append([good["name"], good["description"], str(detail.quantity_assigned)])
-    
-    table = Table(table_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1E40AF')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(table)
-    
-    if assignment_data.notes:
-        elements.append(Spacer(1, 0.3*inch))
-        elements.append(Paragraph(f"<b>Notas:</b> {assignment_data.notes}", styles['Normal']))
-    
-    # Signature section
-    elements.append(Spacer(1, inch))
-    sig_table_data = [
-        ["_" * 30, "_" * 30],
-        ["Firma Instructor", "Firma Responsable"]
-    ]
-    sig_table = Table(sig_table_data, colWidths=[2.5*inch, 2.5*inch])
-    sig_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 1), (-1, 1), 10),
-    ]))
-    elements.append(sig_table)
-    
-    doc.build(elements)
+    acta_pdf = await asyncio.to_thread(render_actas_pdf, [{
+        "code": acta_code,
+        "instructor_name": instructor["name"],
+        "discipline": sport["name"],
+        "date": datetime.now(timezone.utc).strftime('%d/%m/%Y %H:%M'),
+        "delivered_by": f"{current_user['name']} ({current_user['email']})",
+        "notes": assignment_data.notes,
+        "lines": lines
+    }])
     
-    with open(pdf_path, 'wb') as f:
-        f.write(buffer.getvalue())
+    await acta_storage.save(pdf_filename, acta_pdf, "application/pdf")
     
     acta = {
         "id": str(uuid.uuid4()),
@@ -863,15 +2611,19 @@ async def create_assignment(request: Request, assignment_data: AssignmentCreate,
     await db.actas.insert_one(acta)
     
     client_ip = request.client.host if request.client else "unknown"
-    await create_audit_log(current_user["email"], "CREATE_ASSIGNMENT", "assignments", client_ip, f"Instructor: {assignment_data.instructor_name}")
+    await create_audit_log(current_user["email"], "CREATE_ASSIGNMENT", "assignments", client_ip, f"Instructor: {instructor['name']}")
+    
+    assignment.pop("_id", None)
+    acta.pop("_id", None)
+    publish_stock_changes({d["good_id"]: -d["quantity_assigned"] for d in details_list}, total_assignments=1)
+    publish_event("assignment.created", assignment)
+    publish_event("acta.created", acta)
     
     # Send email notification to instructor
-    instructor = await db.instructors.find_one({"name": assignment_data.instructor_name}, {"_id": 0})
-    if instructor and instructor.get("email"):
+    if instructor.get("email"):
         goods_list = "<ul>"
-        for detail in assignment_data.details:
-            good = await db.goods.find_one({"id": detail.good_id}, {"_id": 0})
-            goods_list += f"<li>{good['name']} - Cantidad: {detail.quantity_assigned}</li>"
+        for detail in details_list:
+            goods_list += f"<li>{detail['good_name']} - Cantidad: {detail['quantity_assigned']}</li>"
         goods_list += "</ul>"
         
         email_html = f"""
@@ -879,12 +2631,12 @@ async def create_assignment(request: Request, assignment_data: AssignmentCreate,
             <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
                 <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #ddd; border-radius: 10px;">
                     <h2 style="color: #1E40AF;">Nueva Asignación de Inventario - Academia Jotuns Club SAS</h2>
-                    <p>Estimado/a <strong>{assignment_data.instructor_name}</strong>,</p>
+                    <p>Estimado/a <strong>{instructor['name']}</strong>,</p>
                     <p>Se ha generado una nueva asignación de inventario a su nombre:</p>
                     
                     <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 20px 0;">
                         <p><strong>Código de Acta:</strong> {acta_code}</p>
-                        <p><strong>Disciplina:</strong> {assignment_data.discipline}</p>
+                        <p><strong>Disciplina:</strong> {sport['name']}</p>
                         <p><strong>Fecha:</strong> {datetime.now(timezone.utc).strftime('%d/%m/%Y %H:%M')}</p>
                         <p><strong>Responsable:</strong> {current_user['name']}</p>
                     </div>
@@ -916,55 +2668,438 @@ async def create_assignment(request: Request, assignment_data: AssignmentCreate,
         "acta_code": acta_code
     }
 
+@api_router.post("/assignments/{assignment_id}/return")
+async def return_assignment(request: Request, assignment_id: str, return_data: AssignmentReturn, current_user: dict = Depends(get_current_user)):
+    """Register the return of every good in an assignment and restore stock"""
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    assignment = await db.assignments.find_one({"id": assignment_id}, {"_id": 0})
+    if not assignment:
+        raise HTTPException(status_code=404, detail="Asignación no encontrada")
+    
+    if assignment["status"] not in ("Pendiente", "Entregado"):
+        raise HTTPException(status_code=400, detail="Esta asignación ya fue devuelta")
+    
+    # Stamp the goods before the status change, so reconcile_stock does not
+    # correct them while the units are returned but not yet back in stock
+    details = await db.assignment_details.find({"assignment_id": assignment_id}, {"_id": 0}).to_list(None)
+    await db.goods.update_many(
+        {"id": {"$in": [d["good_id"] for d in details]}},
+        {"$set": {"stock_updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    
+    # The status filter makes a concurrent second return a no-op
+    result = await db.assignments.update_one(
+        {"id": assignment_id, "status": assignment["status"]},
+        {"$set": {
+            "status": "Devuelto",
+            "returned_at": datetime.now(timezone.utc).isoformat(),
+            "returned_by": current_user["email"],
+            "return_notes": return_data.notes
+        }}
+    )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=409, detail="La asignación cambió de estado, intente de nuevo")
+    
+    for detail in details:
+        await db.goods.update_one(
+            {"id": detail["good_id"]},
+            {"$inc": {"available_quantity": detail["quantity_assigned"]},
+             "$set": {"stock_updated_at": datetime.now(timezone.utc).isoformat()}}
+        )
+    await bump_data_versions("assignments", "goods")
+    
+    confirmed_sign = -1 if assignment["status"] == "Entregado" else 0
+    await update_holdings({"id": assignment.get("instructor_id"), "name": assignment["instructor_name"]}, details, -1, confirmed_sign)
+    await record_stock_movements([
+        stock_movement(
+            {"id": d["good_id"], "name": d.get("good_name", "N/A")},
+            "devolucion", 0, d["quantity_assigned"], current_user["email"], assignment_id
+        )
+        for d in details
+    ])
+    
+    client_ip = request.client.host if request.client else "unknown"
+    await create_audit_log(current_user["email"], "RETURN_ASSIGNMENT", "assignments", client_ip, f"Assignment: {assignment_id}")
+    publish_stock_changes({d["good_id"]: d["quantity_assigned"] for d in details})
+    publish_event("assignment.updated", {"id": assignment_id, "status": "Devuelto"})
+    
+    return {"message": "Devolución registrada exitosamente"}
+
+@api_router.get("/holdings")
+async def get_holdings(instructor_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """Goods each instructor holds right now"""
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    query = {"instructor_id": instructor_id} if instructor_id else {}
+    return await db.instructor_holdings.find(query, {"_id": 0}).sort([("instructor_name", 1), ("good_name", 1)]).to_list(None)
+
 # Actas endpoints
 @api_router.get("/actas")
 async def get_actas(current_user: dict = Depends(get_current_user)):
     actas = await db.actas.find({}, {"_id": 0}).to_list(1000)
+    assignments = await db.assignments.find(
+        {"id": {"$in": list({acta["assignment_id"] for acta in actas})}},
+        {"_id": 0}
+    ).to_list(None)
+    assignments_by_id = {a["id"]: a for a in assignments}
     
     for acta in actas:
-        assignment = await db.assignments.find_one({"id": acta["assignment_id"]}, {"_id": 0})
-        acta["assignment"] = assignment
+        acta["assignment"] = assignments_by_id.get(acta["assignment_id"])
     
     return actas
 
+# Acta bundles
+class ZipStreamSink:
+    """File object that collects ZIP output between yields.
+
+    It reports itself as seekable, so zipfile writes each entry's CRC and
+    sizes into its local header instead of a trailing data descriptor, which
+    some readers (Windows Explorer, Java's ZipInputStream) reject for stored
+    entries. zipfile only seeks back within the entry it is writing, so an
+    entry is kept here until it is complete and then handed out.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.flushed = 0  # bytes already taken
+        self.position = 0
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, position: int, whence: int = 0) -> int:
+        if whence != 0 or position < self.flushed:
+            raise OSError("ZipStreamSink can only seek within the current entry")
+        self.position = position
+        return position
+
+    def write(self, data) -> int:
+        offset = self.position - self.flushed
+        self.buffer[offset:offset + len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.flushed += len(data)
+        self.buffer.clear()
+        return data
+
+async def stream_actas_zip(entries: List[tuple]):
+    """Yield a ZIP archive of (arcname, storage key) entries, one entry at a time"""
+    sink = ZipStreamSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, key in entries:
+            info = await acta_storage.stat(key)
+            if info is None:
+                logger.warning(f"Acta file missing from storage, skipped in bundle: {key}")
+                continue
+            
+            zip_info = zipfile.ZipInfo(arcname, date_time=info["modified"].timetuple()[:6])
+            zip_info.file_size = info["size"]
+            with archive.open(zip_info, mode="w") as entry:
+                async for chunk in acta_storage.iter_chunks(key):
+                    entry.write(chunk)
+            yield sink.take()
+    # Central directory
+    yield sink.take()
+
+@api_router.get("/actas/bundle")
+async def download_actas_bundle(
+    request: Request,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    instructor_id: Optional[str] = None,
+    sport_id: Optional[str] = None,
+    instructor_name: Optional[str] = None,
+    discipline: Optional[str] = None,
+    signed_only: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    query = await assignment_ref_query(instructor_id, sport_id, instructor_name, discipline)
+    if signed_only:
+        query["signed_acta_uploaded"] = True
+    
+    # Dates are YYYY-MM-DD and created_at is an ISO string, so both bounds
+    # compare lexicographically; date_to includes the whole day
+    try:
+        created_at = {}
+        if date_from:
+            created_at["$gte"] = datetime.strptime(date_from, "%Y-%m-%d").date().isoformat()
+        if date_to:
+            created_at["$lt"] = (datetime.strptime(date_to, "%Y-%m-%d").date() + timedelta(days=1)).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido, use AAAA-MM-DD")
+    if created_at:
+        query["created_at"] = created_at
+    
+    assignments = await db.assignments.find(
+        query,
+        {"_id": 0, "id": 1, "signed_acta_uploaded": 1, "signed_acta_filename": 1}
+    ).sort("created_at", 1).to_list(None)
+    
+    entries = []
+    if not signed_only:
+        actas = db.actas.find(
+            {"assignment_id": {"$in": [a["id"] for a in assignments]}},
+            {"_id": 0, "pdf_filename": 1}
+        ).sort("created_at", 1)
+        async for acta in actas:
+            entries.append((f"actas/{acta['pdf_filename']}", acta["pdf_filename"]))
+    for assignment in assignments:
+        if assignment.get("signed_acta_uploaded") and assignment.get("signed_acta_filename"):
+            signed_filename = assignment["signed_acta_filename"]
+            entries.append((f"firmadas/{signed_filename}", f"signed/{signed_filename}"))
+    
+    if not entries:
+        raise HTTPException(status_code=404, detail="No hay actas para los filtros indicados")
+    
+    client_ip = request.client.host if request.client else "unknown"
+    await create_audit_log(current_user["email"], "DOWNLOAD_ACTAS_BUNDLE", "actas", client_ip, f"Files: {len(entries)}")
+    
+    bundle_filename = f"actas_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M')}.zip"
+    return StreamingResponse(
+        stream_actas_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={bundle_filename}"}
+    )
+
+async def build_print_run_actas(assignments: List[dict]) -> List[dict]:
+    """Load everything the actas of these assignments need with one query per collection"""
+    assignment_ids = [a["id"] for a in assignments]
+    details = await db.assignment_details.find({"assignment_id": {"$in": assignment_ids}}, {"_id": 0}).to_list(None)
+    actas = await db.actas.find({"assignment_id": {"$in": assignment_ids}}, {"_id": 0, "assignment_id": 1, "code": 1}).to_list(None)
+    creators = list({a["created_by"] for a in assignments})
+    users = await db.users.find({"email": {"$in": creators}}, {"_id": 0, "email": 1, "name": 1}).to_list(None)
+    
+    codes = {a["assignment_id"]: a["code"] for a in actas}
+    user_names = {u["email"]: u["name"] for u in users}
+    lines_by_assignment = {}
+    for detail in details:
+        lines_by_assignment.setdefault(detail["assignment_id"], []).append(
+            (detail.get("good_name", "N/A"), detail.get("good_description", ""), detail["quantity_assigned"])
+        )
+    
+    return [{
+        "code": codes.get(a["id"], f"ACTA-{a['id'][:8].upper()}"),
+        "instructor_name": a["instructor_name"],
+        "discipline": a["discipline"],
+        "date": datetime.fromisoformat(a["created_at"]).strftime('%d/%m/%Y %H:%M'),
+        "delivered_by": f"{user_names.get(a['created_by'], a['created_by'])} ({a['created_by']})",
+        "notes": a.get("notes", ""),
+        "lines": lines_by_assignment.get(a["id"], [])
+    } for a in assignments]
+
+@api_router.post("/actas/print-run")
+async def print_run_actas(request: Request, print_run: ActaPrintRunRequest, current_user: dict = Depends(get_current_user)):
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    query = await assignment_ref_query(
+        print_run.instructor_id, print_run.sport_id, print_run.instructor_name, print_run.discipline
+    )
+    if print_run.assignment_ids:
+        query["id"] = {"$in": print_run.assignment_ids}
+    if not query:
+        raise HTTPException(status_code=400, detail="Indique asignaciones, instructor o disciplina")
+    
+    assignments = await db.assignments.find(query, {"_id": 0}).sort("created_at", 1).to_list(PRINT_RUN_MAX_ACTAS + 1)
+    if not assignments:
+        raise HTTPException(status_code=404, detail="No hay actas para los filtros indicados")
+    if len(assignments) > PRINT_RUN_MAX_ACTAS:
+        raise HTTPException(status_code=400, detail=f"Máximo {PRINT_RUN_MAX_ACTAS} actas por impresión")
+    
+    actas = await build_print_run_actas(assignments)
+    pdf = await asyncio.to_thread(render_actas_pdf, actas)
+    
+    client_ip = request.client.host if request.client else "unknown"
+    await create_audit_log(current_user["email"], "PRINT_RUN_ACTAS", "actas", client_ip, f"Actas: {len(actas)}")
+    
+    filename = f"impresion_actas_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M')}.pdf"
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @api_router.get("/actas/{acta_id}/download")
-async def download_acta(acta_id: str, current_user: dict = Depends(get_current_user)):
+async def download_acta(request: Request, acta_id: str, current_user: dict = Depends(get_current_user)):
     acta = await db.actas.find_one({"id": acta_id}, {"_id": 0})
     if not acta:
         raise HTTPException(status_code=404, detail="Acta no encontrada")
     
-    pdf_path = ROOT_DIR / "actas" / acta["pdf_filename"]
-    if not pdf_path.exists():
+    # Generated actas never change once written
+    response = await serve_stored_file(
+        request,
+        acta["pdf_filename"],
+        acta["pdf_filename"],
+        "application/pdf",
+        "private, max-age=86400"
+    )
+    if response is None:
         raise HTTPException(status_code=404, detail="Archivo PDF no encontrado")
     
-    return FileResponse(
-        pdf_path, 
-        filename=acta["pdf_filename"], 
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={acta['pdf_filename']}"}
+    return response
+
+# Signed acta uploads
+SIGNED_ACTA_MAX_BYTES = int(os.environ.get('SIGNED_ACTA_MAX_MB', '50')) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+# Room for the multipart boundaries and part headers around the file itself
+SIGNED_ACTA_FORM_OVERHEAD = 64 * 1024
+
+# Accepted signed acta formats, detected from the file content (magic bytes)
+SIGNED_ACTA_TYPES = [
+    (b"%PDF-", "pdf", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "png", "image/png"),
+    (b"\xff\xd8\xff", "jpg", "image/jpeg"),
+]
+
+def detect_signed_acta_type(head: bytes):
+    for magic, extension, content_type in SIGNED_ACTA_TYPES:
+        if head.startswith(magic):
+            return extension, content_type
+    return None
+
+async def multipart_file_chunks(request: Request, field_name: str) -> AsyncIterator[bytes]:
+    """Data of one file field, parsed straight from the request body stream.
+
+    Unlike UploadFile, nothing is spooled to disk first, so the caller can
+    stop reading as soon as the file is rejected. Data is regrouped into
+    UPLOAD_CHUNK_SIZE chunks.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Se esperaba un formulario multipart con el archivo")
+    
+    part = {"header_field": b"", "header_value": b"", "headers": {}, "wanted": False, "found": False}
+    buffer = bytearray()
+    
+    def on_header_field(data, start, end):
+        part["header_field"] += data[start:end]
+    
+    def on_header_value(data, start, end):
+        part["header_value"] += data[start:end]
+    
+    def on_header_end():
+        part["headers"][part["header_field"].lower()] = part["header_value"]
+        part["header_field"] = part["header_value"] = b""
+    
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["wanted"] = not part["found"] and disposition.get(b"name") == field_name.encode()
+        part["headers"] = {}
+    
+    def on_part_data(data, start, end):
+        if part["wanted"]:
+            buffer.extend(data[start:end])
+    
+    def on_part_end():
+        if part["wanted"]:
+            part["found"] = True
+            part["wanted"] = False
+    
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    async for data in request.stream():
+        parser.write(data)
+        if len(buffer) >= UPLOAD_CHUNK_SIZE or (part["found"] and buffer):
+            yield bytes(buffer)
+            buffer.clear()
+        if part["found"]:
+            return
+    parser.finalize()
+    if not part["found"]:
+        raise HTTPException(status_code=400, detail=f"Falta el campo '{field_name}' con el archivo")
+
+async def save_signed_upload(chunks: AsyncIterator[bytes], key_prefix: str) -> dict:
+    """Stream an upload into acta storage, hashing it on the fly.
+
+    The format is detected from the first bytes, so the stored extension and
+    content type do not depend on the client supplied filename. Reading stops
+    with 413 as soon as the running size passes SIGNED_ACTA_MAX_BYTES.
+    """
+    first_chunk = await anext(chunks, b"")
+    if not first_chunk:
+        raise HTTPException(status_code=400, detail="El archivo está vacío")
+    
+    detected = detect_signed_acta_type(first_chunk)
+    if detected is None:
+        raise HTTPException(status_code=415, detail="Formato no soportado. Use PDF, JPG o PNG")
+    extension, content_type = detected
+    
+    digest = hashlib.sha256()
+    size = 0
+    
+    async def checked_chunks():
+        nonlocal size
+        chunk = first_chunk
+        while chunk:
+            size += len(chunk)
+            if size > SIGNED_ACTA_MAX_BYTES:
+                raise signed_acta_too_large()
+            await asyncio.to_thread(digest.update, chunk)
+            yield chunk
+            chunk = await anext(chunks, b"")
+    
+    filename = f"{key_prefix}.{extension}"
+    await acta_storage.save_stream(f"signed/{filename}", checked_chunks(), content_type)
+    
+    return {
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "sha256": digest.hexdigest()
+    }
+
+def signed_acta_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"El archivo supera el tamaño máximo de {SIGNED_ACTA_MAX_BYTES // (1024 * 1024)} MB"
     )
 
 @api_router.post("/actas/{assignment_id}/upload-signed")
 async def upload_signed_acta(
     request: Request,
     assignment_id: str, 
-    file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user)
 ):
+    """Multipart form with the file in the "file" field. The body is parsed
+    here rather than through UploadFile so oversized files are refused
+    before they are read, or as soon as they pass the limit."""
+    try:
+        content_length = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Content-Length inválido")
+    if content_length > SIGNED_ACTA_MAX_BYTES + SIGNED_ACTA_FORM_OVERHEAD:
+        raise signed_acta_too_large()
+    
     assignment = await db.assignments.find_one({"id": assignment_id}, {"_id": 0})
     if not assignment:
         raise HTTPException(status_code=404, detail="Asignación no encontrada")
     
     # Save uploaded file
-    upload_dir = ROOT_DIR / "actas" / "signed"
-    upload_dir.mkdir(exist_ok=True, parents=True)
+    saved = await save_signed_upload(multipart_file_chunks(request, "file"), f"SIGNED_{assignment_id[:8].upper()}")
+    signed_filename = saved["filename"]
     
-    file_extension = file.filename.split(".")[-1]
-    signed_filename = f"SIGNED_{assignment_id[:8].upper()}.{file_extension}"
-    file_path = upload_dir / signed_filename
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # A re-upload in a different format leaves the previous file behind
+    previous_filename = assignment.get("signed_acta_filename")
+    if previous_filename and previous_filename != signed_filename:
+        await acta_storage.delete(f"signed/{previous_filename}")
     
     # Update assignment
     await db.assignments.update_one(
@@ -972,99 +3107,891 @@ async def upload_signed_acta(
         {"$set": {
             "signed_acta_uploaded": True,
             "signed_acta_filename": signed_filename,
+            "signed_acta_content_type": saved["content_type"],
+            "signed_acta_size": saved["size"],
+            "signed_acta_sha256": saved["sha256"],
             "signed_acta_uploaded_at": datetime.now(timezone.utc).isoformat(),
             "signed_acta_uploaded_by": current_user["email"]
         }}
     )
+    await bump_data_versions("assignments")
     
     client_ip = request.client.host if request.client else "unknown"
     await create_audit_log(current_user["email"], "UPLOAD_SIGNED_ACTA", "actas", client_ip, f"Assignment: {assignment_id}")
+    publish_event("acta.signed", {"assignment_id": assignment_id})
     
-    return {"message": "Acta firmada subida exitosamente", "filename": signed_filename}
+    return {
+        "message": "Acta firmada subida exitosamente",
+        "filename": signed_filename,
+        "size": saved["size"],
+        "sha256": saved["sha256"]
+    }
 
 @api_router.get("/actas/{assignment_id}/download-signed")
-async def download_signed_acta(assignment_id: str, current_user: dict = Depends(get_current_user)):
+async def download_signed_acta(request: Request, assignment_id: str, current_user: dict = Depends(get_current_user)):
     assignment = await db.assignments.find_one({"id": assignment_id}, {"_id": 0})
     if not assignment or not assignment.get("signed_acta_uploaded"):
         raise HTTPException(status_code=404, detail="Acta firmada no encontrada")
     
-    file_path = ROOT_DIR / "actas" / "signed" / assignment["signed_acta_filename"]
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    # Signed actas can be re-uploaded, so clients must revalidate
+    response = await serve_stored_file(
+        request,
+        f"signed/{assignment['signed_acta_filename']}",
+        assignment["signed_acta_filename"],
+        assignment.get("signed_acta_content_type", "application/pdf"),
+        "private, no-cache"
+    )
+    if response is None:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    
+    return response
+
+# Dashboard stats
+@api_router.get("/dashboard/stats", response_model=DashboardStats)
+async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
+    return await singleflight.do("dashboard", (current_user["role"],), load_dashboard_stats)
+
+async def load_dashboard_stats() -> dict:
+    goods = await db.goods.find({}, {"_id": 0}).to_list(10000)
+    total_goods = len(goods)
+    total_quantity = sum(g["quantity"] for g in goods)
+    available_quantity = sum(g["available_quantity"] for g in goods)
+    assigned_quantity = total_quantity - available_quantity
+    
+    assignments = await db.assignments.count_documents({})
+    categories = await db.categories.count_documents({})
+    recent = await db.assignments.find({}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
+    
+    return {
+        "total_goods": total_goods,
+        "total_quantity": total_quantity,
+        "available_quantity": available_quantity,
+        "assigned_quantity": assigned_quantity,
+        "total_assignments": assignments,
+        "total_categories": categories,
+        "recent_assignments": recent
+    }
+
+# Audit logs
+@api_router.get("/audit")
+async def get_audit_logs(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    logs = await db.audit_logs.find({}, {"_id": 0}).sort("timestamp", -1).limit(100).to_list(100)
+    return logs
+
+# Reports
+def build_inventory_report(goods: List[dict], categories: List[dict]) -> List[dict]:
+    """Goods with their category name, kept free of I/O so it can be benchmarked"""
+    category_names = {c["id"]: c["name"] for c in categories}
+    for good in goods:
+        good["category_name"] = category_names.get(good["category_id"], "N/A")
+    return goods
+
+def build_assignments_report(assignments: List[dict], details: List[dict]) -> List[dict]:
+    """Assignments with their details, kept free of I/O"""
+    details_by_assignment = collections.defaultdict(list)
+    for detail in details:
+        details_by_assignment[detail["assignment_id"]].append(detail)
+    for assignment in assignments:
+        assignment["details"] = details_by_assignment.get(assignment["id"], [])
+    return assignments
+
+# ============================================
+# REPORT CACHE
+# ============================================
+# GET /reports bodies are cached per worker, keyed by the report parameters
+# and the version counters of the collections the report reads. Every write
+# to goods, assignments or categories bumps its counter in data_versions, so
+# a cached body is never served once its data changed; stale entries just
+# age out of the LRU. Workers re-read the counters at most every
+# REPORT_CACHE_VERSION_SECONDS, which bounds how long another worker's write
+# can go unseen; this worker's own writes are seen at once.
+
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_MB', '64')) * 1024 * 1024
+REPORT_CACHE_VERSION_SECONDS = float(os.environ.get('REPORT_CACHE_VERSION_SECONDS', '2'))
+
+REPORT_DEPENDENCIES = {
+    "inventory": ("goods", "categories"),
+    "assignments": ("assignments",),
+}
+
+_data_versions = {}
+_data_versions_loaded_at = 0.0
+
+async def bump_data_versions(*collections: str):
+    for name in collections:
+        version = await db.data_versions.find_one_and_update(
+            {"id": name},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        _data_versions[name] = version["version"]
+
+async def current_data_versions(collections: tuple) -> tuple:
+    global _data_versions_loaded_at
+    if time.monotonic() - _data_versions_loaded_at > REPORT_CACHE_VERSION_SECONDS:
+        versions = await db.data_versions.find({}, {"_id": 0}).to_list(None)
+        _data_versions.update({v["id"]: v["version"] for v in versions})
+        _data_versions_loaded_at = time.monotonic()
+    return tuple(_data_versions.get(name, 0) for name in collections)
+
+class ReportCache:
+    """LRU of rendered report bodies, bounded by their total size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: tuple, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+        REPORT_CACHE_BYTES.set(self.size)
+
+report_cache = ReportCache(REPORT_CACHE_MAX_BYTES)
+
+REPORT_DETAILS_BATCH = 1000  # assignments per assignment_details query
+
+async def load_report(
+    report_type: str,
+    category_id: Optional[str] = None,
+    instructor_id: Optional[str] = None,
+    sport_id: Optional[str] = None,
+    instructor_name: Optional[str] = None,
+    discipline: Optional[str] = None
+) -> List[dict]:
+    """Every matching row; the cursors are read to the end, in batches"""
+    if report_type == "inventory":
+        query = {"category_id": category_id} if category_id else {}
+        categories = await db.categories.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+        goods = [good async for good in db.goods.find(query, {"_id": 0})]
+        return build_inventory_report(goods, categories)
+    
+    elif report_type == "assignments":
+        query = await assignment_ref_query(instructor_id, sport_id, instructor_name, discipline)
+        report = []
+        batch = []
+        
+        async def add_batch():
+            details = await db.assignment_details.find(
+                {"assignment_id": {"$in": [a["id"] for a in batch]}},
+                {"_id": 0}
+            ).to_list(None)
+            report.extend(build_assignments_report(batch, details))
+        
+        # Details are loaded per batch so the $in list stays bounded
+        async for assignment in db.assignments.find(query, {"_id": 0}):
+            batch.append(assignment)
+            if len(batch) == REPORT_DETAILS_BATCH:
+                await add_batch()
+                batch = []
+        if batch:
+            await add_batch()
+        return report
+    
+    return []
+
+@api_router.get("/reports")
+async def get_reports(
+    report_type: str,
+    category_id: Optional[str] = None,
+    instructor_id: Optional[str] = None,
+    sport_id: Optional[str] = None,
+    instructor_name: Optional[str] = None,
+    discipline: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if report_type == "assignments" and (instructor_name or discipline):
+        # Names are resolved before the cache key is built; instructors and
+        # sports can be renamed without any assignment changing
+        ref_query = await assignment_ref_query(instructor_id, sport_id, instructor_name, discipline)
+        if MATCH_NOTHING in ref_query.values():
+            return Response(content=b"[]", media_type="application/json")
+        instructor_id, sport_id = ref_query.get("instructor_id"), ref_query.get("sport_id")
+        instructor_name = discipline = None
+    
+    async def build() -> bytes:
+        return JSONResponse(await load_report(
+            report_type, category_id, instructor_id, sport_id, instructor_name, discipline
+        )).body
+    
+    dependencies = REPORT_DEPENDENCIES.get(report_type)
+    if not dependencies or REPORT_CACHE_MAX_BYTES <= 0:
+        params = (report_type, category_id, instructor_id, sport_id, instructor_name, discipline)
+        body = await singleflight.do("reports", (current_user["role"], params), build)
+        return Response(content=body, media_type="application/json")
+    
+    # Versions are read before the report, so a write that lands while it
+    # is built leaves it stored under an already outdated key
+    if report_type == "inventory":
+        params = (category_id,)
+    else:
+        params = (instructor_id, sport_id)
+    key = (report_type, params, await current_data_versions(dependencies))
+    
+    body = report_cache.get(key)
+    if body is None:
+        REPORT_CACHE_REQUESTS.inc(outcome="miss")
+        body = await singleflight.do("reports", (current_user["role"], key), build)
+        report_cache.put(key, body)
+    else:
+        REPORT_CACHE_REQUESTS.inc(outcome="hit")
+    return Response(content=body, media_type="application/json")
+
+# ============================================
+# REPORT JOBS
+# ============================================
+# Large reports can be requested as a job instead of through GET /reports.
+# POST /reports/jobs queues it in report_jobs and answers at once; a
+# background task in one of the API workers builds the file and the client
+# polls GET /reports/jobs/{id} until it is "done", then downloads it. Files
+# go to the acta storage under reports/ (JSON and CSV gzip-compressed, XLSX
+# is already a zip) and are deleted with their job REPORT_JOB_TTL_HOURS
+# after they were built.
+# A running job holds a lock that its worker renews every
+# REPORT_JOB_HEARTBEAT_SECONDS; once the lock lapses another worker may run
+# the job again, under a new lock_id. Each run writes its own file and only
+# the run that still holds the lock records its result.
+
+REPORT_JOB_TTL_HOURS = int(os.environ.get('REPORT_JOB_TTL_HOURS', '24'))
+REPORT_JOB_CONCURRENCY = int(os.environ.get('REPORT_JOB_CONCURRENCY', '2'))
+REPORT_JOB_POLL_SECONDS = 5  # picks up jobs queued through other workers
+REPORT_JOB_LOCK_SECONDS = 300  # a lock not renewed for this long was lost with its worker
+REPORT_JOB_HEARTBEAT_SECONDS = 60
+REPORT_JOB_CLEANUP_SECONDS = 600
+
+REPORT_FORMATS = {
+    "json": ("json.gz", "application/gzip"),
+    "csv": ("csv.gz", "application/gzip"),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+# Same columns as the Excel export of the Reports page
+REPORT_COLUMNS = {
+    "inventory": ["Nombre", "Categoría", "Descripción", "Estado", "Cantidad Total", "Cantidad Disponible", "Ubicación", "Responsable"],
+    "assignments": ["Instructor", "Disciplina", "Bien", "Cantidad", "Fecha", "Estado"],
+}
+
+_report_worker_task = None
+_report_jobs_wakeup = asyncio.Event()
+_report_job_tasks = set()
+
+def report_rows(report_type: str, report: List[dict]) -> List[list]:
+    if report_type == "inventory":
+        return [
+            [g["name"], g["category_name"], g.get("description", ""), g.get("status", ""),
+             g.get("quantity", 0), g.get("available_quantity", 0), g.get("location", ""), g.get("responsible", "")]
+            for g in report
+        ]
+    return [
+        [a["instructor_name"], a["discipline"], d.get("good_name", "N/A"), d["quantity_assigned"],
+         a["created_at"][:10], a.get("status", "")]
+        for a in report for d in a["details"]
+    ]
+
+def encode_report(report_type: str, report: List[dict], file_format: str) -> bytes:
+    """Serialize a report into the stored file; CPU-bound, runs in a thread"""
+    if file_format == "json":
+        return gzip.compress(json.dumps(report, ensure_ascii=False, default=str).encode())
+    
+    rows = report_rows(report_type, report)
+    if file_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(REPORT_COLUMNS[report_type])
+        writer.writerows(rows)
+        # BOM so Excel opens the accents correctly
+        return gzip.compress(buffer.getvalue().encode("utf-8-sig"))
+    
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Reporte")
+    sheet.append(REPORT_COLUMNS[report_type])
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+async def claim_report_job() -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await db.report_jobs.find_one_and_update(
+        {"$or": [{"status": "queued"}, {"status": "running", "locked_until": {"$lt": now.isoformat()}}]},
+        {"$set": {
+            "status": "running",
+            "started_at": now.isoformat(),
+            "lock_id": uuid.uuid4().hex,
+            "locked_by": WORKER_ID,
+            "locked_until": (now + timedelta(seconds=REPORT_JOB_LOCK_SECONDS)).isoformat()
+        }},
+        projection={"_id": 0},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def report_job_heartbeat(job: dict):
+    """Renew the job's lock while it runs; stops once another worker took it over"""
+    while True:
+        await asyncio.sleep(REPORT_JOB_HEARTBEAT_SECONDS)
+        locked_until = datetime.now(timezone.utc) + timedelta(seconds=REPORT_JOB_LOCK_SECONDS)
+        try:
+            renewed = await db.report_jobs.update_one(
+                {"id": job["id"], "status": "running", "lock_id": job["lock_id"]},
+                {"$set": {"locked_until": locked_until.isoformat()}}
+            )
+        except Exception as e:
+            logger.warning(f"Report job {job['id']} heartbeat: {str(e)}")
+            continue
+        if not renewed.matched_count:
+            logger.warning(f"Report job {job['id']} lost its lock")
+            return
+
+async def run_report_job(job: dict):
+    params = job["params"]
+    extension, media_type = REPORT_FORMATS[job["format"]]
+    file_key = None
+    heartbeat = asyncio.create_task(report_job_heartbeat(job))
+    try:
+        report = await load_report(**params)
+        data = await asyncio.to_thread(encode_report, params["report_type"], report, job["format"])
+        file_key = f"reports/{job['id']}-{job['lock_id'][:8]}.{extension}"
+        await acta_storage.save(file_key, data, media_type)
+        result = {"status": "done", "file_key": file_key, "rows": len(report), "size": len(data)}
+    except Exception as e:
+        logger.error(f"Report job {job['id']} failed: {str(e)}")
+        result = {"status": "failed", "error": str(e)}
+    finally:
+        heartbeat.cancel()
+    
+    finished_at = datetime.now(timezone.utc)
+    recorded = await db.report_jobs.update_one({"id": job["id"], "lock_id": job["lock_id"]}, {"$set": {
+        **result,
+        "finished_at": finished_at.isoformat(),
+        "expires_at": (finished_at + timedelta(hours=REPORT_JOB_TTL_HOURS)).isoformat()
+    }})
+    if not recorded.matched_count:
+        # Another run owns the job now and records its own file
+        logger.warning(f"Report job {job['id']} was taken over, discarding this run")
+        if file_key:
+            await acta_storage.delete(file_key)
+
+async def delete_expired_report_jobs():
+    now = datetime.now(timezone.utc).isoformat()
+    async for job in db.report_jobs.find({"expires_at": {"$lt": now}}, {"_id": 0, "id": 1, "file_key": 1}):
+        if job.get("file_key"):
+            await acta_storage.delete(job["file_key"])
+        await db.report_jobs.delete_one({"id": job["id"]})
+
+def report_job_finished(task: asyncio.Task):
+    _report_job_tasks.discard(task)
+    _report_jobs_wakeup.set()
+
+async def report_worker_loop():
+    """Run queued report jobs, at most REPORT_JOB_CONCURRENCY at a time in this worker"""
+    last_cleanup = 0.0
+    while True:
+        _report_jobs_wakeup.clear()
+        try:
+            if time.monotonic() - last_cleanup > REPORT_JOB_CLEANUP_SECONDS:
+                last_cleanup = time.monotonic()
+                await delete_expired_report_jobs()
+            while len(_report_job_tasks) < REPORT_JOB_CONCURRENCY:
+                job = await claim_report_job()
+                if job is None:
+                    break
+                task = asyncio.create_task(run_report_job(job))
+                _report_job_tasks.add(task)
+                task.add_done_callback(report_job_finished)
+        except Exception as e:
+            logger.warning(f"Report job worker: {str(e)}")
+        try:
+            await asyncio.wait_for(_report_jobs_wakeup.wait(), REPORT_JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+async def get_own_report_job(job_id: str, current_user: dict) -> dict:
+    job = await db.report_jobs.find_one({"id": job_id}, {"_id": 0, "locked_until": 0, "lock_id": 0, "locked_by": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado o expirado")
+    if job["created_by"] != current_user["email"] and current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return job
+
+@api_router.post("/reports/jobs", status_code=202)
+async def create_report_job(request: Request, job_data: ReportJobCreate, current_user: dict = Depends(get_current_user)):
+    if job_data.report_type not in REPORT_COLUMNS:
+        raise HTTPException(status_code=400, detail="Tipo de reporte no válido")
+    if job_data.format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato no válido, use json, csv o xlsx")
+    
+    job = {
+        "id": str(uuid.uuid4()),
+        "status": "queued",
+        "format": job_data.format,
+        "params": job_data.model_dump(exclude={"format"}),
+        "created_by": current_user["email"],
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.report_jobs.insert_one(dict(job))
+    _report_jobs_wakeup.set()
+    
+    client_ip = request.client.host if request.client else "unknown"
+    await create_audit_log(current_user["email"], "CREATE_REPORT_JOB", "reports", client_ip, f"Report: {job_data.report_type} ({job_data.format})")
+    
+    return job
+
+@api_router.get("/reports/jobs")
+async def get_report_jobs(current_user: dict = Depends(get_current_user)):
+    """The user's recent report jobs, newest first"""
+    return await db.report_jobs.find(
+        {"created_by": current_user["email"]},
+        {"_id": 0, "locked_until": 0, "lock_id": 0, "locked_by": 0}
+    ).sort("created_at", -1).to_list(50)
+
+@api_router.get("/reports/jobs/{job_id}")
+async def get_report_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    return await get_own_report_job(job_id, current_user)
+
+@api_router.get("/reports/jobs/{job_id}/download")
+async def download_report_job(request: Request, job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await get_own_report_job(job_id, current_user)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail="El reporte aún no está listo")
+    
+    extension, media_type = REPORT_FORMATS[job["format"]]
+    filename = f"reporte_{job['params']['report_type']}_{job['created_at'][:10]}.{extension}"
+    response = await serve_stored_file(request, job["file_key"], filename, media_type, "private, max-age=3600")
+    if response is None:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado o expirado")
+    return response
+
+# ============================================
+# ANALYTICS
+# ============================================
+# Utilization trends bucketed by day, week (starting Monday) or month, in UTC.
+# Dates are stored as ISO strings, so the pipelines parse them before
+# $dateTrunc (MongoDB 5.0+). A bucket only depends on assignments created or
+# confirmed inside its own period, so once a period has ended its result is
+# kept in analytics_buckets and later requests only aggregate the periods that
+# are not stored yet, normally just the current one. After rewriting old
+# assignment data, drop analytics_buckets to have them rebuilt.
+
+ANALYTICS_UNITS = ("day", "week", "month")
+ANALYTICS_MAX_PERIODS = int(os.environ.get('ANALYTICS_MAX_PERIODS', '400'))
+ANALYTICS_DEFAULT_WEEKS = 12
+
+def analytics_period_start(day: date, unit: str) -> date:
+    if unit == "week":
+        return day - timedelta(days=day.weekday())
+    if unit == "month":
+        return day.replace(day=1)
+    return day
+
+def analytics_next_period(start: date, unit: str) -> date:
+    if unit == "week":
+        return start + timedelta(days=7)
+    if unit == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+def analytics_date_expr(field: str) -> dict:
+    # Second precision is enough and avoids depending on how many fractional
+    # digits isoformat() wrote; all stored timestamps are UTC
+    return {"$dateFromString": {
+        "dateString": {"$substrBytes": [field, 0, 19]},
+        "format": "%Y-%m-%dT%H:%M:%S",
+        "timezone": "UTC"
+    }}
+
+def analytics_period_expr(field: str, unit: str) -> dict:
+    """Period start of an ISO string field as YYYY-MM-DD, matching analytics_period_start"""
+    trunc = {"date": analytics_date_expr(field), "unit": unit, "timezone": "UTC"}
+    if unit == "week":
+        trunc["startOfWeek"] = "monday"
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": {"$dateTrunc": trunc}, "timezone": "UTC"}}
+
+async def aggregate_analytics_buckets(start: date, end: date, unit: str) -> dict:
+    """Buckets for every period from start up to end (exclusive), keyed by period start"""
+    span = {"$gte": start.isoformat(), "$lt": end.isoformat()}
+    buckets = {}
+    period = start
+    while period < end:
+        buckets[period.isoformat()] = {"assigned": [], "goods": [], "confirmations": 0, "confirm_seconds": 0}
+        period = analytics_next_period(period, unit)
+
+    lines = [
+        {"$match": {"created_at": span}},
+        {"$project": {"_id": 0, "id": 1, "discipline": 1, "period": analytics_period_expr("$created_at", unit)}},
+        {"$lookup": {
+            "from": "assignment_details",
+            "localField": "id",
+            "foreignField": "assignment_id",
+            "as": "detail",
+            "pipeline": [{"$project": {"_id": 0, "good_id": 1, "good_name": 1, "category_name": 1, "quantity_assigned": 1}}]
+        }},
+        {"$unwind": "$detail"},
+    ]
+    assigned_pipeline = lines + [
+        {"$group": {
+            "_id": {"period": "$period", "category": {"$ifNull": ["$detail.category_name", "N/A"]}, "discipline": "$discipline"},
+            "quantity": {"$sum": "$detail.quantity_assigned"}
+        }},
+    ]
+    goods_pipeline = lines + [
+        {"$group": {
+            "_id": {"period": "$period", "good_id": "$detail.good_id"},
+            "good_name": {"$last": {"$ifNull": ["$detail.good_name", "N/A"]}},
+            "quantity": {"$sum": "$detail.quantity_assigned"},
+            "lines": {"$sum": 1}
+        }},
+    ]
+    confirmed_pipeline = [
+        {"$match": {"confirmed_at": span}},
+        {"$group": {
+            "_id": analytics_period_expr("$confirmed_at", unit),
+            "count": {"$sum": 1},
+            "seconds": {"$sum": {"$dateDiff": {
+                "startDate": analytics_date_expr("$created_at"),
+                "endDate": analytics_date_expr("$confirmed_at"),
+                "unit": "second"
+            }}}
+        }},
+    ]
+    assigned, goods, confirmed = await asyncio.gather(
+        db.assignments.aggregate(assigned_pipeline).to_list(None),
+        db.assignments.aggregate(goods_pipeline).to_list(None),
+        db.assignments.aggregate(confirmed_pipeline).to_list(None),
+    )
+
+    for row in assigned:
+        key = row["_id"]
+        buckets[key["period"]]["assigned"].append({
+            "category": key["category"],
+            "discipline": key["discipline"],
+            "quantity": row["quantity"]
+        })
+    for row in goods:
+        key = row["_id"]
+        buckets[key["period"]]["goods"].append({
+            "good_id": key["good_id"],
+            "good_name": row["good_name"],
+            "quantity": row["quantity"],
+            "lines": row["lines"]
+        })
+    for row in confirmed:
+        buckets[row["_id"]]["confirmations"] = row["count"]
+        buckets[row["_id"]]["confirm_seconds"] = row["seconds"]
+    return buckets
+
+async def load_analytics_buckets(periods: List[date], unit: str, today: date) -> dict:
+    """Stored buckets for ended periods, aggregating and storing the missing ones"""
+    complete = {p.isoformat() for p in periods if analytics_next_period(p, unit) <= today}
+    buckets = {}
+    async for bucket in db.analytics_buckets.find(
+        {"unit": unit, "period": {"$in": sorted(complete)}},
+        {"_id": 0, "unit": 0, "computed_at": 0}
+    ):
+        buckets[bucket.pop("period")] = bucket
+
+    missing = [p for p in periods if p.isoformat() not in buckets]
+    if missing:
+        fresh = await aggregate_analytics_buckets(missing[0], analytics_next_period(missing[-1], unit), unit)
+        now = datetime.now(timezone.utc).isoformat()
+        operations = [
+            UpdateOne(
+                {"unit": unit, "period": period},
+                {"$set": {**bucket, "computed_at": now}},
+                upsert=True
+            )
+            for period, bucket in fresh.items() if period in complete and period not in buckets
+        ]
+        if operations:
+            await db.analytics_buckets.bulk_write(operations, ordered=False)
+        buckets.update(fresh)
+    return buckets
+
+@api_router.get("/analytics/utilization")
+async def get_utilization_analytics(
+    unit: str = "week",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    top: int = 10,
+    current_user: dict = Depends(get_current_user)
+):
+    """Items assigned per period by category and discipline, average time to
+    confirm reception and the most requested goods. The range is widened to
+    whole periods and defaults to the last 12 weeks."""
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    if unit not in ANALYTICS_UNITS:
+        raise HTTPException(status_code=400, detail="Unidad no válida, use day, week o month")
+    
+    today = datetime.now(timezone.utc).date()
+    try:
+        last = datetime.strptime(date_to, "%Y-%m-%d").date() if date_to else today
+        first = datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else last - timedelta(weeks=ANALYTICS_DEFAULT_WEEKS)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido, use AAAA-MM-DD")
+    if first > last:
+        raise HTTPException(status_code=400, detail="date_from no puede ser posterior a date_to")
     
-    return FileResponse(file_path, filename=assignment["signed_acta_filename"], media_type="application/pdf")
-
-# Dashboard stats
-@api_router.get("/dashboard/stats", response_model=DashboardStats)
-async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
-    goods = await db.goods.find({}, {"_id": 0}).to_list(10000)
-    total_goods = len(goods)
-    total_quantity = sum(g["quantity"] for g in goods)
-    available_quantity = sum(g["available_quantity"] for g in goods)
-    assigned_quantity = total_quantity - available_quantity
+    periods = []
+    period = analytics_period_start(first, unit)
+    while period <= last:
+        periods.append(period)
+        if len(periods) > ANALYTICS_MAX_PERIODS:
+            raise HTTPException(status_code=400, detail=f"Rango demasiado amplio, máximo {ANALYTICS_MAX_PERIODS} periodos")
+        period = analytics_next_period(period, unit)
     
-    assignments = await db.assignments.count_documents({})
-    categories = await db.categories.count_documents({})
-    recent = await db.assignments.find({}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
+    buckets = await load_analytics_buckets(periods, unit, today)
+    
+    results = []
+    goods = {}
+    confirmations = 0
+    confirm_seconds = 0
+    for period in periods:
+        key = period.isoformat()
+        bucket = buckets[key]
+        results.append({
+            "period": key,
+            "complete": analytics_next_period(period, unit) <= today,
+            "items_assigned": sum(row["quantity"] for row in bucket["assigned"]),
+            "assigned": sorted(bucket["assigned"], key=lambda row: (row["category"], row["discipline"])),
+            "confirmations": bucket["confirmations"],
+            "avg_confirm_hours": round(bucket["confirm_seconds"] / bucket["confirmations"] / 3600, 2) if bucket["confirmations"] else None
+        })
+        confirmations += bucket["confirmations"]
+        confirm_seconds += bucket["confirm_seconds"]
+        for row in bucket["goods"]:
+            total = goods.setdefault(row["good_id"], {"good_id": row["good_id"], "good_name": row["good_name"], "quantity": 0, "lines": 0})
+            total["good_name"] = row["good_name"]
+            total["quantity"] += row["quantity"]
+            total["lines"] += row["lines"]
     
     return {
-        "total_goods": total_goods,
-        "total_quantity": total_quantity,
-        "available_quantity": available_quantity,
-        "assigned_quantity": assigned_quantity,
-        "total_assignments": assignments,
-        "total_categories": categories,
-        "recent_assignments": recent
+        "unit": unit,
+        "date_from": periods[0].isoformat(),
+        "date_to": (analytics_next_period(periods[-1], unit) - timedelta(days=1)).isoformat(),
+        "items_assigned": sum(p["items_assigned"] for p in results),
+        "confirmations": confirmations,
+        "avg_confirm_hours": round(confirm_seconds / confirmations / 3600, 2) if confirmations else None,
+        "periods": results,
+        "top_goods": sorted(goods.values(), key=lambda g: (-g["quantity"], g["good_name"]))[:max(top, 0)]
     }
 
-# Audit logs
-@api_router.get("/audit")
-async def get_audit_logs(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "admin":
-        raise HTTPException(status_code=403, detail="No autorizado")
-    
-    logs = await db.audit_logs.find({}, {"_id": 0}).sort("timestamp", -1).limit(100).to_list(100)
-    return logs
+# ============================================
+# DEMAND FORECAST
+# ============================================
+# Restock recommendations from assignment history. Mongo sums each good's
+# demand per day and returns one document per good with the days and
+# quantities as parallel arrays, so years of history arrive as a few thousand
+# documents that become flat NumPy columns. The forecast itself works on a
+# goods x weeks matrix:
+# - the demand rate is an exponentially weighted weekly mean (half-life
+#   DEMAND_HALF_LIFE_WEEKS), taken after removing the seasonal effect
+# - the seasonal index compares each calendar month's daily demand with the
+#   good's overall daily demand, once there is a full year of history
+# - the projected demand over the horizon is the rate times the seasonal
+#   index of the months ahead, plus RESTOCK_SAFETY_Z standard deviations of
+#   deseasonalized weekly demand as safety stock; what exceeds available
+#   stock is a shortfall
+# numpy and pandas are imported on first use so they do not slow down startup.
 
-# Reports
-@api_router.get("/reports")
-async def get_reports(
-    report_type: str,
-    category_id: Optional[str] = None,
-    instructor_name: Optional[str] = None,
-    discipline: Optional[str] = None,
+DEMAND_HALF_LIFE_WEEKS = float(os.environ.get('DEMAND_HALF_LIFE_WEEKS', '8'))
+RESTOCK_SAFETY_Z = float(os.environ.get('RESTOCK_SAFETY_Z', '1.65'))
+RESTOCK_MAX_HISTORY_WEEKS = 520
+
+async def load_demand_history(since: date) -> dict:
+    """Daily assigned quantities per good since a date, as flat columns"""
+    import numpy as np
+
+    pipeline = [
+        {"$match": {"created_at": {"$gte": since.isoformat()}}},
+        {"$project": {"_id": 0, "id": 1, "day": {"$substrBytes": ["$created_at", 0, 10]}}},
+        {"$lookup": {
+            "from": "assignment_details",
+            "localField": "id",
+            "foreignField": "assignment_id",
+            "as": "detail",
+            "pipeline": [{"$project": {"_id": 0, "good_id": 1, "quantity_assigned": 1}}]
+        }},
+        {"$unwind": "$detail"},
+        {"$group": {"_id": {"good_id": "$detail.good_id", "day": "$day"}, "quantity": {"$sum": "$detail.quantity_assigned"}}},
+        {"$group": {"_id": "$_id.good_id", "days": {"$push": "$_id.day"}, "quantities": {"$push": "$quantity"}}},
+    ]
+    good_ids = []
+    lengths = []
+    days = []
+    quantities = []
+    async for row in db.assignments.aggregate(pipeline, allowDiskUse=True, batchSize=500):
+        good_ids.append(row["_id"])
+        lengths.append(len(row["days"]))
+        days.extend(row["days"])
+        quantities.extend(row["quantities"])
+    return {
+        "good_ids": good_ids,
+        "lengths": np.array(lengths, dtype=np.int64),
+        "days": np.array(days, dtype="datetime64[D]"),
+        "quantities": np.array(quantities, dtype=np.float64)
+    }
+
+def build_restock_forecast(goods: List[dict], categories: List[dict], history: dict, today: date,
+                           history_weeks: int, horizon_weeks: int) -> List[dict]:
+    """Demand rate, seasonal peak and projected shortfall for every good"""
+    import numpy as np
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(goods, columns=["id", "name", "category_id", "available_quantity"])
+    n = len(frame)
+    if n == 0:
+        return []
+    weeks = history_weeks
+    # Whole weeks ending today, so the last column is the most recent 7 days
+    start = np.datetime64(today, "D") + 1 - 7 * weeks
+
+    # Rows of deleted goods and days outside the window are dropped
+    codes = np.repeat(pd.Index(frame["id"]).get_indexer(history["good_ids"]), history["lengths"])
+    offsets = (history["days"] - start).astype(np.int64)
+    keep = (codes >= 0) & (offsets >= 0) & (offsets < 7 * weeks)
+    codes, offsets, quantities = codes[keep], offsets[keep], history["quantities"][keep]
+    months = (history["days"][keep].astype("datetime64[M]").astype(np.int64)) % 12
+
+    weekly = np.bincount(codes * weeks + offsets // 7, weights=quantities, minlength=n * weeks).reshape(n, weeks)
+    by_month = np.bincount(codes * 12 + months, weights=quantities, minlength=n * 12).reshape(n, 12)
+
+    # A good's history starts at its first week with demand, so goods added
+    # recently are not diluted by the weeks before they existed
+    has_demand = weekly.any(axis=1)
+    first_week = np.where(has_demand, (weekly > 0).argmax(axis=1), weeks)
+    observed = np.arange(weeks) >= first_week[:, None]
+    observed_weeks = observed.sum(axis=1)
+
+    # Days of each calendar month from each good's first week to today
+    window_days = start + np.arange(7 * weeks)
+    day_months = window_days.astype("datetime64[M]").astype(np.int64) % 12
+    cumulative = np.zeros((7 * weeks + 1, 12))
+    cumulative[1:] = np.cumsum(np.eye(12)[day_months], axis=0)
+    exposure = cumulative[-1] - cumulative[7 * first_week]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily_rate = by_month.sum(axis=1) / exposure.sum(axis=1)
+        seasonal = by_month / exposure / daily_rate[:, None]
+    seasonal = np.where(np.isfinite(seasonal), seasonal, 1.0)
+    seasonal[observed_weeks < 52] = 1.0
+
+    # Deseasonalized exponentially weighted weekly rate; a floor on the index
+    # keeps months with little demand from inflating the base rate
+    week_months = day_months[3::7]
+    adjusted = weekly / np.maximum(seasonal[:, week_months], 0.25)
+    weights = 0.5 ** ((weeks - 1 - np.arange(weeks)) / DEMAND_HALF_LIFE_WEEKS) * observed
+    weight_totals = weights.sum(axis=1)
+    safe_totals = np.where(weight_totals > 0, weight_totals, 1.0)
+    rate = (adjusted * weights).sum(axis=1) / safe_totals
+
+    mean = (adjusted * observed).sum(axis=1) / np.maximum(observed_weeks, 1)
+    variance = (((adjusted - mean[:, None]) ** 2) * observed).sum(axis=1) / np.maximum(observed_weeks - 1, 1)
+    deviation = np.sqrt(variance)
+
+    horizon_months = (np.datetime64(today, "D") + 1 + np.arange(7 * horizon_weeks)).astype("datetime64[M]").astype(np.int64) % 12
+    horizon_factor = seasonal[:, horizon_months].mean(axis=1)
+    projected = rate * horizon_weeks * horizon_factor
+    safety = RESTOCK_SAFETY_Z * deviation * np.sqrt(horizon_weeks) * horizon_factor
+    available = frame["available_quantity"].to_numpy(dtype=np.float64)
+    shortfall = projected + safety - available
+    # Rounded first so float noise (a shortfall of 18.0000001) is not
+    # rounded up into an extra unit
+    recommended = np.ceil(np.clip(shortfall, 0, None).round(6))
+    weekly_need = rate * horizon_factor
+    with np.errstate(divide="ignore"):
+        cover = np.where(weekly_need > 0, available / weekly_need, np.inf)
+
+    # Only a month well above the average counts as a seasonal peak
+    peak = seasonal.argmax(axis=1)
+    peak_factor = seasonal[np.arange(n), peak]
+    has_peak = (observed_weeks >= 52) & (peak_factor >= 1.2)
+    result = pd.DataFrame({
+        "good_id": frame["id"],
+        "good_name": frame["name"],
+        "category_name": frame["category_id"].map({c["id"]: c["name"] for c in categories}).fillna("N/A"),
+        "available_quantity": frame["available_quantity"],
+        "weekly_demand": rate.round(2),
+        "weekly_deviation": deviation.round(2),
+        "history_weeks": observed_weeks,
+        "peak_month": np.where(has_peak, peak + 1, 0),
+        "peak_factor": peak_factor.round(2),
+        "horizon_factor": horizon_factor.round(2),
+        "projected_demand": projected.round(1),
+        "safety_stock": safety.round(1),
+        "shortfall": np.clip(shortfall, 0, None).round(1),
+        "recommended_restock": recommended.astype(np.int64),
+        "weeks_of_cover": cover.round(1)
+    })[has_demand]
+    result = result.sort_values(["recommended_restock", "weeks_of_cover"], ascending=[False, True])
+
+    records = result.to_dict("records")
+    for record in records:
+        if record["peak_month"] == 0:
+            record["peak_month"] = None
+            record["peak_factor"] = None
+        if not np.isfinite(record["weeks_of_cover"]):
+            record["weeks_of_cover"] = None
+    return records
+
+@api_router.get("/analytics/restock")
+async def get_restock_recommendations(
+    horizon_weeks: int = 8,
+    history_weeks: int = 104,
+    only_shortfalls: bool = True,
+    limit: int = 200,
     current_user: dict = Depends(get_current_user)
 ):
-    if report_type == "inventory":
-        goods = await db.goods.find({}, {"_id": 0}).to_list(10000)
-        for good in goods:
-            category = await db.categories.find_one({"id": good["category_id"]}, {"_id": 0})
-            good["category_name"] = category["name"] if category else "N/A"
-        return goods
+    """Goods expected to run short within the horizon and how many units to
+    restock, from their demand rate, variability and seasonal peaks"""
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    if not 1 <= horizon_weeks <= 52:
+        raise HTTPException(status_code=400, detail="horizon_weeks debe estar entre 1 y 52")
+    if not 4 <= history_weeks <= RESTOCK_MAX_HISTORY_WEEKS:
+        raise HTTPException(status_code=400, detail=f"history_weeks debe estar entre 4 y {RESTOCK_MAX_HISTORY_WEEKS}")
     
-    elif report_type == "assignments":
-        query = {}
-        if instructor_name:
-            query["instructor_name"] = instructor_name
-        if discipline:
-            query["discipline"] = discipline
-        
-        assignments = await db.assignments.find(query, {"_id": 0}).to_list(10000)
-        for assignment in assignments:
-            details = await db.assignment_details.find(
-                {"assignment_id": assignment["id"]}, 
-                {"_id": 0}
-            ).to_list(1000)
-            
-            for detail in details:
-                good = await db.goods.find_one({"id": detail["good_id"]}, {"_id": 0})
-                detail["good_name"] = good["name"] if good else "N/A"
-            
-            assignment["details"] = details
-        
-        return assignments
+    today = datetime.now(timezone.utc).date()
     
-    return []
+    async def compute():
+        history, goods, categories = await asyncio.gather(
+            load_demand_history(today + timedelta(days=1) - timedelta(weeks=history_weeks)),
+            db.goods.find({}, {"_id": 0, "id": 1, "name": 1, "category_id": 1, "available_quantity": 1}).to_list(None),
+            db.categories.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+        )
+        with WORK_IN_FLIGHT.track(kind="forecast"):
+            return await asyncio.to_thread(build_restock_forecast, goods, categories, history, today, history_weeks, horizon_weeks)
+    
+    forecast = await singleflight.do("restock", (today.isoformat(), history_weeks, horizon_weeks), compute)
+    recommendations = [f for f in forecast if f["recommended_restock"] > 0] if only_shortfalls else forecast
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "horizon_weeks": horizon_weeks,
+        "history_weeks": history_weeks,
+        "goods_with_demand": len(forecast),
+        "goods_short": sum(1 for f in forecast if f["recommended_restock"] > 0),
+        "recommendations": recommendations[:max(limit, 0)]
+    }
 
 # ============================================
 # INSTRUCTOR PORTAL ENDPOINTS
@@ -1076,32 +4003,29 @@ async def get_instructor_assignments(current_user: dict = Depends(get_current_us
     if current_user.get("role") != "instructor":
         raise HTTPException(status_code=403, detail="Solo instructores pueden acceder a este recurso")
     
-    instructor_name = current_user["name"]
-    
     # Get active assignments for this instructor
     assignments = await db.assignments.find(
-        {"instructor_name": instructor_name, "status": {"$in": ["Pendiente", "Entregado"]}},
+        {"instructor_id": current_user["id"], "status": {"$in": ["Pendiente", "Entregado"]}},
         {"_id": 0}
     ).to_list(1000)
     
-    # Enrich with assignment details and good info
-    for assignment in assignments:
-        details = await db.assignment_details.find(
-            {"assignment_id": assignment["id"]},
-            {"_id": 0}
-        ).to_list(100)
-        
-        for detail in details:
-            good = await db.goods.find_one({"id": detail["good_id"]}, {"_id": 0})
-            if good:
-                detail["good_name"] = good["name"]
-                detail["good_description"] = good.get("description", "")
-                category = await db.categories.find_one({"id": good["category_id"]}, {"_id": 0})
-                detail["category_name"] = category["name"] if category else "N/A"
-        
-        assignment["details"] = details
+    # Details carry good and category names from when they were written
+    details = await db.assignment_details.find(
+        {"assignment_id": {"$in": [a["id"] for a in assignments]}},
+        {"_id": 0}
+    ).to_list(None)
+    return build_assignments_report(assignments, details)
+
+@api_router.get("/instructor/my-holdings")
+async def get_instructor_holdings(current_user: dict = Depends(get_current_user)):
+    """Goods the logged-in instructor holds right now"""
+    if current_user.get("role") != "instructor":
+        raise HTTPException(status_code=403, detail="Solo instructores pueden acceder a este recurso")
     
-    return assignments
+    return await db.instructor_holdings.find(
+        {"instructor_id": current_user["id"]},
+        {"_id": 0}
+    ).sort("good_name", 1).to_list(None)
 
 @api_router.get("/instructor/my-history")
 async def get_instructor_history(current_user: dict = Depends(get_current_user)):
@@ -1109,29 +4033,18 @@ async def get_instructor_history(current_user: dict = Depends(get_current_user))
     if current_user.get("role") != "instructor":
         raise HTTPException(status_code=403, detail="Solo instructores pueden acceder a este recurso")
     
-    instructor_name = current_user["name"]
-    
     # Get all assignments (including returned) for this instructor
     assignments = await db.assignments.find(
-        {"instructor_name": instructor_name},
+        {"instructor_id": current_user["id"]},
         {"_id": 0}
     ).sort("created_at", -1).to_list(1000)
     
     # Enrich with assignment details
-    for assignment in assignments:
-        details = await db.assignment_details.find(
-            {"assignment_id": assignment["id"]},
-            {"_id": 0}
-        ).to_list(100)
-        
-        for detail in details:
-            good = await db.goods.find_one({"id": detail["good_id"]}, {"_id": 0})
-            if good:
-                detail["good_name"] = good["name"]
-        
-        assignment["details"] = details
-    
-    return assignments
+    details = await db.assignment_details.find(
+        {"assignment_id": {"$in": [a["id"] for a in assignments]}},
+        {"_id": 0}
+    ).to_list(None)
+    return build_assignments_report(assignments, details)
 
 @api_router.get("/instructor/my-actas")
 async def get_instructor_actas(current_user: dict = Depends(get_current_user)):
@@ -1139,12 +4052,10 @@ async def get_instructor_actas(current_user: dict = Depends(get_current_user)):
     if current_user.get("role") != "instructor":
         raise HTTPException(status_code=403, detail="Solo instructores pueden acceder a este recurso")
     
-    instructor_name = current_user["name"]
-    
     # Get assignments for this instructor
     assignments = await db.assignments.find(
-        {"instructor_name": instructor_name},
-        {"_id": 0}
+        {"instructor_id": current_user["id"]},
+        {"_id": 0, "id": 1}
     ).to_list(1000)
     
     assignment_ids = [a["id"] for a in assignments]
@@ -1167,7 +4078,7 @@ async def confirm_reception(request: Request, assignment_id: str, current_user:
     
     # Find the assignment
     assignment = await db.assignments.find_one(
-        {"id": assignment_id, "instructor_name": instructor_name},
+        {"id": assignment_id, "instructor_id": current_user["id"]},
         {"_id": 0}
     )
     
@@ -1178,14 +4089,20 @@ async def confirm_reception(request: Request, assignment_id: str, current_user:
         raise HTTPException(status_code=400, detail="Esta asignación ya fue confirmada o devuelta")
     
     # Update assignment status to "Entregado" and add confirmation timestamp
-    await db.assignments.update_one(
-        {"id": assignment_id},
+    result = await db.assignments.update_one(
+        {"id": assignment_id, "status": "Pendiente"},
         {"$set": {
             "status": "Entregado",
             "confirmed_at": datetime.now(timezone.utc).isoformat(),
             "confirmed_by": instructor_name
         }}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Esta asignación ya fue confirmada o devuelta")
+    await bump_data_versions("assignments")
+    
+    details = await db.assignment_details.find({"assignment_id": assignment_id}, {"_id": 0}).to_list(None)
+    await update_holdings(current_user, details, 0, 1)
     
     client_ip = request.client.host if request.client else "unknown"
     await create_audit_log(
@@ -1195,18 +4112,689 @@ async def confirm_reception(request: Request, assignment_id: str, current_user:
         client_ip, 
         f"Instructor confirmed reception of assignment: {assignment_id}"
     )
+    publish_event("assignment.updated", {"id": assignment_id, "status": "Entregado"})
     
     return {"message": "Recepción confirmada exitosamente"}
 
+# ============================================
+# LIVE EVENTS
+# ============================================
+# Screens subscribe to GET /api/events/stream (Server-Sent Events) instead of
+# polling. Write endpoints publish compact deltas to an in-process bus:
+#   good.upserted {good}, good.deleted {id}, goods.stock {changes: [{id, available_delta}]},
+#   dashboard.delta {counter: delta}, assignment.created {assignment},
+#   assignment.updated {id, status}, acta.created {acta}, acta.signed {assignment_id}
+# and resync {} when a client missed events and should reload.
+#
+# The bus only reaches clients of the same worker. With EVENTS_SOURCE=changestream
+# and a replica set, events come from a MongoDB change stream instead, so every
+# worker sees every write. Those events are coarser: goods and assignments
+# arrive whole and the dashboard gets dashboard.changed {} to reload.
+
+EVENTS_SOURCE = os.environ.get('EVENTS_SOURCE', 'local')
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', '256'))
+EVENTS_HISTORY = 1000  # recent events kept for clients that reconnect with Last-Event-ID
+EVENTS_HEARTBEAT = 15  # seconds between keep-alive comments
+
+class EventBus:
+    def __init__(self, queue_size: int, history_size: int):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.history = collections.deque(maxlen=history_size)
+        # Ids from another worker or an earlier process must not match ours
+        self.prefix = uuid.uuid4().hex[:8]
+        self.sequence = 0
+    
+    def publish(self, event_type: str, data: dict):
+        self.sequence += 1
+        event = {"id": f"{self.prefix}-{self.sequence}", "seq": self.sequence, "type": event_type, "data": data}
+        self.history.append(event)
+        EVENTS_PUBLISHED.inc(type=event_type)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A client this far behind gets a resync instead of a growing backlog
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"id": event["id"], "type": "resync", "data": {}})
+    
+    def subscribe(self, last_event_id: Optional[str] = None) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if last_event_id:
+            prefix, _, seq = last_event_id.partition("-")
+            missed = None
+            if prefix == self.prefix and seq.isdigit():
+                seq = int(seq)
+                if not self.history or self.history[0]["seq"] <= seq + 1:
+                    missed = [e for e in self.history if e["seq"] > seq]
+            if missed is None or len(missed) >= self.queue_size:
+                queue.put_nowait({"id": f"{self.prefix}-{self.sequence}", "type": "resync", "data": {}})
+            else:
+                for event in missed:
+                    queue.put_nowait(event)
+        self.subscribers.add(queue)
+        EVENT_SUBSCRIBERS.set(len(self.subscribers))
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        EVENT_SUBSCRIBERS.set(len(self.subscribers))
+
+event_bus = EventBus(EVENTS_QUEUE_SIZE, EVENTS_HISTORY)
+_events_from_change_stream = False
+_change_stream_task = None
+
+def publish_event(event_type: str, data: dict):
+    """Publish from a write endpoint; skipped when the change stream is the source"""
+    if not _events_from_change_stream:
+        event_bus.publish(event_type, data)
+
+def publish_stock_changes(available_deltas: dict, **dashboard_deltas):
+    changes = [{"id": good_id, "available_delta": delta} for good_id, delta in available_deltas.items() if delta]
+    if changes:
+        publish_event("goods.stock", {"changes": changes})
+    total = sum(available_deltas.values())
+    if total:
+        dashboard_deltas["available_quantity"] = total
+    if dashboard_deltas:
+        publish_event("dashboard.delta", dashboard_deltas)
+
+def change_to_events(change: dict) -> List[tuple]:
+    collection = change["ns"]["coll"]
+    operation = change["operationType"]
+    document = change.get("fullDocument")
+    if document:
+        document.pop("_id", None)
+    
+    events = []
+    if collection == "goods":
+        if operation == "delete":
+            # Deletes only carry the ObjectId, not the good id screens know
+            events.append(("resync", {}))
+        elif document:
+            events.append(("good.upserted", document))
+    elif collection == "assignments" and document:
+        if operation == "insert":
+            events.append(("assignment.created", document))
+        else:
+            events.append(("assignment.updated", {"id": document["id"], "status": document["status"]}))
+    elif collection == "actas" and document and operation == "insert":
+        events.append(("acta.created", document))
+    if collection in ("goods", "assignments", "categories"):
+        events.append(("dashboard.changed", {}))
+    return events
+
+async def watch_change_stream():
+    """Feed the bus from a change stream, resuming after errors"""
+    pipeline = [{"$match": {"ns.coll": {"$in": ["goods", "assignments", "actas", "categories"]}}}]
+    resume_token = None
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    for event_type, data in change_to_events(change):
+                        event_bus.publish(event_type, data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Change stream interrupted: {str(e)}")
+            event_bus.publish("resync", {})
+            await asyncio.sleep(5)
+
+async def start_event_source():
+    global _events_from_change_stream, _change_stream_task
+    if EVENTS_SOURCE != "changestream":
+        return
+    if not await supports_transactions():
+        logger.warning("EVENTS_SOURCE=changestream needs a replica set; publishing events in-process instead")
+        return
+    _events_from_change_stream = True
+    _change_stream_task = asyncio.create_task(watch_change_stream())
+
+async def event_stream(request: Request, queue: asyncio.Queue) -> AsyncIterator[str]:
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            data = json.dumps(event["data"], default=str, separators=(",", ":"))
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+    finally:
+        event_bus.unsubscribe(queue)
+
+# EventSource cannot send an Authorization header, and the session token
+# must not end up in URLs (proxy logs, browser history). Browsers first POST
+# for a stream ticket: a JWT of type "stream" that only opens the event
+# stream and expires after EVENTS_TICKET_SECONDS. The stream stays open past
+# the ticket's expiry; to reconnect later the client gets a new ticket.
+EVENTS_TICKET_SECONDS = 60
+
+@api_router.post("/events/ticket")
+async def create_events_ticket(current_user: dict = Depends(get_current_user)):
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    ticket = jwt.encode({
+        "sub": current_user["email"],
+        "type": "stream",
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=EVENTS_TICKET_SECONDS)
+    }, SECRET_KEY, algorithm=ALGORITHM)
+    return {"ticket": ticket, "expires_in": EVENTS_TICKET_SECONDS}
+
+async def user_from_events_ticket(ticket: str) -> dict:
+    try:
+        payload = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Ticket expired")
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid ticket")
+    if payload.get("type") != "stream":
+        raise HTTPException(status_code=401, detail="Invalid ticket")
+    user = await db.users.find_one({"email": payload.get("sub")}, {"_id": 0})
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+@api_router.get("/events/stream")
+async def events_stream(request: Request, ticket: Optional[str] = None, last_event_id: Optional[str] = None):
+    """Server-Sent Events, authenticated by the Authorization header or a
+    ?ticket= from POST /events/ticket. A new EventSource cannot set
+    Last-Event-ID, so ?last_event_id= is accepted for resuming."""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        current_user = await get_user_from_token(authorization[7:])
+    elif ticket:
+        current_user = await user_from_events_ticket(ticket)
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if current_user.get("role") == "instructor":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    queue = event_bus.subscribe(request.headers.get("last-event-id") or last_event_id)
+    return StreamingResponse(
+        event_stream(request, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ============================================
+# IDEMPOTENCY KEYS
+# ============================================
+# A client may send "Idempotency-Key: <unique value>" with any POST, PUT,
+# PATCH or DELETE under /api and retry the request with the same key. The
+# first request claims the key in idempotency_keys and runs; if it succeeds
+# (2xx) its response is stored, and retries get it back with
+# Idempotency-Replayed: true without running the endpoint again. A retry
+# that arrives while the first request is still running waits for it. Failed
+# requests release the key so the client can fix and resend them.
+# Keys are per user and per route, and expire after IDEMPOTENCY_TTL_HOURS;
+# expires_at is stored as a BSON date because the TTL index needs one.
+
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '30'))
+IDEMPOTENCY_LOCK_SECONDS = 300  # a claim older than this was left by a worker that died
+IDEMPOTENCY_MAX_BODY_BYTES = 1024 * 1024  # larger responses are not stored
+IDEMPOTENT_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+def token_subject(authorization: str) -> Optional[str]:
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    return payload.get("sub")
+
+async def claim_idempotency_key(key: str) -> Optional[dict]:
+    """Claim the key for this request; returns the current record if another request holds it"""
+    now = datetime.now(timezone.utc)
+    claim = {
+        "status": "processing",
+        "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        "expires_at": now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    }
+    try:
+        await db.idempotency_keys.insert_one({"key": key, **claim})
+        return None
+    except DuplicateKeyError:
+        pass
+    taken = await db.idempotency_keys.update_one(
+        {"key": key, "status": "processing", "locked_until": {"$lt": now}},
+        {"$set": claim}
+    )
+    if taken.modified_count:
+        return None
+    record = await db.idempotency_keys.find_one({"key": key}, {"_id": 0})
+    # Released between the insert and the read: try to claim it again
+    return record or {"status": "processing"}
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENT_METHODS or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope["headers"])
+        client_key = headers.get(b"idempotency-key", b"").decode("latin-1").strip()
+        # Without a valid token the endpoint answers 401 anyway
+        subject = token_subject(headers.get(b"authorization", b"").decode("latin-1")) if client_key else None
+        if not subject:
+            await self.app(scope, receive, send)
+            return
+        if len(client_key) > 255:
+            await JSONResponse({"detail": "Idempotency-Key demasiado larga"}, status_code=400)(scope, receive, send)
+            return
+        
+        key = hashlib.sha256(f"{subject}\n{scope['method']}\n{scope['path']}\n{client_key}".encode()).hexdigest()
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        delay = 0.05
+        while True:
+            record = await claim_idempotency_key(key)
+            if record is None:
+                break
+            if record["status"] == "completed":
+                await self.replay(scope, receive, send, record)
+                return
+            if time.monotonic() >= deadline:
+                IDEMPOTENT_REQUESTS.inc(outcome="in_progress")
+                await JSONResponse(
+                    {"detail": "Hay una solicitud en curso con esta Idempotency-Key"}, status_code=409
+                )(scope, receive, send)
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        
+        await self.execute(scope, receive, send, key)
+
+    async def execute(self, scope, receive, send, key: str):
+        fingerprint = hashlib.sha256(scope.get("query_string", b""))
+        
+        async def hashing_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                fingerprint.update(message.get("body", b""))
+            return message
+        
+        status_code = 500
+        response_headers = []
+        chunks = []
+        size = 0
+        
+        async def capturing_send(message):
+            nonlocal status_code, response_headers, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                size += len(body)
+                if size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                    chunks.append(body)
+            await send(message)
+        
+        stored = False
+        try:
+            await self.app(scope, hashing_receive, capturing_send)
+            if 200 <= status_code < 300 and size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                await db.idempotency_keys.update_one({"key": key}, {"$set": {
+                    "status": "completed",
+                    "fingerprint": fingerprint.hexdigest(),
+                    "status_code": status_code,
+                    "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in response_headers],
+                    "body": b"".join(chunks)
+                }})
+                stored = True
+        finally:
+            if not stored:
+                await db.idempotency_keys.delete_one({"key": key, "status": "processing"})
+        IDEMPOTENT_REQUESTS.inc(outcome="executed")
+
+    async def replay(self, scope, receive, send, record: dict):
+        # The retry must carry the same query string and body as the original
+        fingerprint = hashlib.sha256(scope.get("query_string", b""))
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            fingerprint.update(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        if fingerprint.hexdigest() != record["fingerprint"]:
+            IDEMPOTENT_REQUESTS.inc(outcome="mismatch")
+            await JSONResponse(
+                {"detail": "La Idempotency-Key ya se usó con una solicitud distinta"}, status_code=422
+            )(scope, receive, send)
+            return
+        
+        IDEMPOTENT_REQUESTS.inc(outcome="replayed")
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+        headers.append((b"idempotency-replayed", b"true"))
+        await send({"type": "http.response.start", "status": record["status_code"], "headers": headers})
+        await send({"type": "http.response.body", "body": bytes(record["body"])})
+
+# ============================================
+# ON-DEMAND PROFILING
+# ============================================
+# An admin can profile a single request by sending "X-Profile: 1", or turn on
+# sampling for some routes / a share of traffic with PUT /api/admin/profiling.
+# Profiles are written to PROFILES_DIR in collapsed-stack format, which
+# flamegraph.pl, inferno and speedscope read directly.
+
+PROFILES_DIR = Path(os.environ.get('PROFILES_DIR', str(ROOT_DIR / "profiles")))
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', '5')) / 1000
+PROFILE_MAX_CONCURRENT = int(os.environ.get('PROFILE_MAX_CONCURRENT', '2'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '200'))
+PROFILING_SETTINGS_TTL = 10  # seconds between settings reloads, so all workers follow a toggle
+
+PROFILER_THREAD_PREFIX = "sampling-profiler"
+PROFILE_ID_PATTERN = re.compile(r"^[0-9T]+-[0-9a-f]{8}$")
+
+# Innermost frames of threads that are just waiting for work
+IDLE_FRAMES = {("selectors.py", "select"), ("thread.py", "_worker"), ("threading.py", "wait")}
+
+class ProfilingSettings(BaseModel):
+    enabled: bool = False
+    routes: List[str] = []  # path prefixes, empty means every route
+    sample_rate: float = Field(default=0.01, ge=0, le=1)
+
+class SamplingProfiler:
+    """Samples the Python stacks of all busy threads at a fixed interval.
+
+    Sampling every thread covers the event loop as well as work pushed to
+    worker threads (PDF rendering, Mongo I/O). Requests served concurrently
+    on the same loop show up in the profile too.
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"{PROFILER_THREAD_PREFIX}-{uuid.uuid4().hex[:6]}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                thread_name = thread_names.get(thread_id, str(thread_id))
+                if thread_name.startswith(PROFILER_THREAD_PREFIX):
+                    continue
+                if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_name)
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+_profiling_settings = ProfilingSettings()
+_profiling_settings_loaded_at = 0.0
+_active_profiles = 0
+
+async def get_profiling_settings() -> ProfilingSettings:
+    global _profiling_settings, _profiling_settings_loaded_at
+    if time.monotonic() - _profiling_settings_loaded_at > PROFILING_SETTINGS_TTL:
+        _profiling_settings_loaded_at = time.monotonic()
+        try:
+            stored = await db.settings.find_one({"id": "profiling"}, {"_id": 0, "id": 0})
+            _profiling_settings = ProfilingSettings(**stored) if stored else ProfilingSettings()
+        except Exception as e:
+            logger.warning(f"Could not load profiling settings: {str(e)}")
+    return _profiling_settings
+
+async def is_admin_token(authorization: str) -> bool:
+    if not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return False
+    if payload.get("type", "user") != "user":
+        return False
+    user = await db.users.find_one({"email": payload.get("sub")}, {"_id": 0, "role": 1, "active": 1})
+    return bool(user and user.get("role") == "admin" and user.get("active", True))
+
+def write_profile(profile_id: str, profiler: SamplingProfiler, metadata: dict):
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    (PROFILES_DIR / f"{profile_id}.collapsed").write_text(profiler.collapsed())
+    (PROFILES_DIR / f"{profile_id}.json").write_text(json.dumps(metadata))
+    
+    # Keep only the most recent profiles
+    old_profiles = sorted(PROFILES_DIR.glob("*.json"))[:-PROFILE_MAX_FILES]
+    for old in old_profiles:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".collapsed").unlink(missing_ok=True)
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def should_profile(self, scope) -> bool:
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") in (b"1", b"true"):
+            return await is_admin_token(headers.get(b"authorization", b"").decode("latin-1"))
+        settings = await get_profiling_settings()
+        if not settings.enabled or random.random() >= settings.sample_rate:
+            return False
+        return not settings.routes or any(scope["path"].startswith(route) for route in settings.routes)
+
+    async def __call__(self, scope, receive, send):
+        global _active_profiles
+        if scope["type"] != "http" or not await self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        # The cap is checked and the slot taken with no await in between,
+        # so concurrent requests cannot all get past it
+        if _active_profiles >= PROFILE_MAX_CONCURRENT:
+            await self.app(scope, receive, send)
+            return
+        _active_profiles += 1
+        
+        profile_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        status_code = 500
+        
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())])
+            await send(message)
+        
+        profiler = SamplingProfiler(PROFILE_INTERVAL)
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            _active_profiles -= 1
+            metadata = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "samples": profiler.samples,
+                "interval_ms": PROFILE_INTERVAL * 1000,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }
+            try:
+                await asyncio.to_thread(write_profile, profile_id, profiler, metadata)
+            except Exception as e:
+                logger.error(f"Could not write profile {profile_id}: {str(e)}")
+
+@api_router.get("/admin/profiling", response_model=ProfilingSettings)
+async def get_profiling(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    stored = await db.settings.find_one({"id": "profiling"}, {"_id": 0, "id": 0})
+    return stored or ProfilingSettings()
+
+@api_router.put("/admin/profiling", response_model=ProfilingSettings)
+async def update_profiling(request: Request, settings: ProfilingSettings, current_user: dict = Depends(get_current_user)):
+    global _profiling_settings_loaded_at
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    await db.settings.update_one({"id": "profiling"}, {"$set": settings.model_dump()}, upsert=True)
+    _profiling_settings_loaded_at = 0.0
+    
+    client_ip = request.client.host if request.client else "unknown"
+    await create_audit_log(
+        current_user["email"], "UPDATE_PROFILING", "admin", client_ip,
+        f"Enabled: {settings.enabled}, rate: {settings.sample_rate}, routes: {','.join(settings.routes) or '*'}"
+    )
+    
+    return settings
+
+@api_router.get("/admin/profiles")
+async def list_profiles(limit: int = 50, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    def read_metadata():
+        if not PROFILES_DIR.exists():
+            return []
+        files = sorted(PROFILES_DIR.glob("*.json"), reverse=True)[:limit]
+        return [json.loads(f.read_text()) for f in files]
+    
+    return await asyncio.to_thread(read_metadata)
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+    
+    profile_path = PROFILES_DIR / f"{profile_id}.collapsed"
+    if not PROFILE_ID_PATTERN.match(profile_id) or not profile_path.exists():
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    
+    return FileResponse(profile_path, filename=f"{profile_id}.collapsed", media_type="text/plain")
+
+# Metrics endpoint, outside /api so it is not exposed through the public proxy
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="No autorizado")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Health checks for the load balancer, also outside /api and without auth.
+# /health only says the worker answers; /ready returns 503 when the worker
+# should be taken out of rotation until it recovers.
+READY_PING_TIMEOUT_MS = int(os.environ.get('READY_PING_TIMEOUT_MS', '2000'))
+READY_MAX_PING_MS = float(os.environ.get('READY_MAX_PING_MS', '500'))
+READY_MAX_POOL_WAITING = int(os.environ.get('READY_MAX_POOL_WAITING', '20'))
+READY_MIN_FREE_DISK_MB = int(os.environ.get('READY_MIN_FREE_DISK_MB', '500'))
+
+# Size of the default executor used by asyncio.to_thread
+THREAD_POOL_SIZE = min(32, (os.cpu_count() or 1) + 4)
+
+def task_state(task: Optional[asyncio.Task]) -> str:
+    if task is None:
+        return "disabled"
+    if not task.done():
+        return "running"
+    return "stopped" if task.cancelled() else "failed"
+
+@app.get("/health", include_in_schema=False)
+async def health():
+    return {"status": "ok", "pid": os.getpid()}
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    checks = {}
+    failing = []
+    
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_PING_TIMEOUT_MS / 1000)
+        ping_ms = (time.perf_counter() - start) * 1000
+        checks["mongo"] = {"ping_ms": round(ping_ms, 1)}
+        if ping_ms > READY_MAX_PING_MS:
+            failing.append("mongo")
+    except Exception as e:
+        checks["mongo"] = {"error": str(e) or type(e).__name__}
+        failing.append("mongo")
+    
+    pool = {
+        "max_size": client.options.pool_options.max_pool_size,
+        "open": int(MONGO_POOL_CONNECTIONS.total()),
+        "in_use": int(MONGO_POOL_CHECKED_OUT.total()),
+        "waiting": int(MONGO_POOL_WAITING.total())
+    }
+    checks["mongo_pool"] = pool
+    if pool["waiting"] > READY_MAX_POOL_WAITING:
+        failing.append("mongo_pool")
+    
+    # PDF renders and email sends hold a to_thread worker each; when they
+    # use them all, new work queues behind them
+    work = {kind: int(WORK_IN_FLIGHT.value(kind=kind)) for kind in ("pdf", "email", "audit", "forecast")}
+    checks["workers"] = {"thread_pool_size": THREAD_POOL_SIZE, **work}
+    if work["pdf"] + work["email"] + work["forecast"] >= THREAD_POOL_SIZE:
+        failing.append("workers")
+    
+    tasks = {
+        "stock_checkpoints": task_state(_stock_checkpoint_task),
+        "change_stream": task_state(_change_stream_task),
+        "report_jobs": task_state(_report_worker_task)
+    }
+    checks["tasks"] = tasks
+    if "failed" in tasks.values():
+        failing.append("tasks")
+    
+    if isinstance(acta_storage, LocalActaStorage):
+        root = acta_storage.root if acta_storage.root.exists() else ROOT_DIR
+        usage = await asyncio.to_thread(shutil.disk_usage, root)
+        free_mb = usage.free // (1024 * 1024)
+        checks["disk"] = {"path": str(acta_storage.root), "free_mb": free_mb, "used_percent": round(usage.used / usage.total * 100, 1)}
+        if free_mb < READY_MIN_FREE_DISK_MB:
+            failing.append("disk")
+    
+    body = {"status": "unready" if failing else "ready", "failing": failing, "checks": checks}
+    return JSONResponse(body, status_code=503 if failing else 200)
+
 # Include the router
 app.include_router(api_router)
 
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(QueryDebugMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Added last so it is the outermost layer: responses the middlewares above
+# answer themselves (idempotency 400/409/422) carry CORS headers too, and
+# preflight requests are answered before reaching them
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Idempotency-Replayed"],
 )
 
 logging.basicConfig(
@@ -1215,52 +4803,208 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ============================================
+# STARTUP
+# ============================================
+# Default data is written once per database. Workers starting together take
+# the "seed" lease, so only one runs the pass; it upserts by email or name and
+# then stores a marker in app_state. Later starts only read the marker and
+# skip the pass, bcrypt hash of the default admin included. Remove the marker
+# document to seed again.
+
+SEED_MARKER_ID = "default_data"
+ASSIGNMENT_REFS_MARKER_ID = "assignment_refs_backfill"
+SEED_LEASE_SECONDS = 120  # the pass takes a second or two; a crashed worker's lease lapses
+
+DEFAULT_INSTRUCTORS = [
+    {"name": "Juan Pérez", "email": "juan.perez@academia.com", "phone": "555-0101", "specialization": "Fútbol"},
+    {"name": "María González", "email": "maria.gonzalez@academia.com", "phone": "555-0102", "specialization": "Natación"},
+    {"name": "Carlos Rodríguez", "email": "carlos.rodriguez@academia.com", "phone": "555-0103", "specialization": "Baloncesto"},
+    {"name": "Ana Martínez", "email": "ana.martinez@academia.com", "phone": "555-0104", "specialization": "Tenis"},
+    {"name": "Luis Fernández", "email": "luis.fernandez@academia.com", "phone": "555-0105", "specialization": "Atletismo"},
+]
+
+DEFAULT_SPORTS = [
+    {"name": "Fútbol", "description": "Deporte de equipo con balón"},
+    {"name": "Baloncesto", "description": "Deporte de canasta"},
+    {"name": "Voleibol", "description": "Deporte de red y pelota"},
+    {"name": "Natación", "description": "Deporte acuático"},
+    {"name": "Atletismo", "description": "Carreras y competiciones atléticas"},
+    {"name": "Tenis", "description": "Deporte de raqueta"},
+    {"name": "Gimnasia", "description": "Ejercicios de flexibilidad y fuerza"},
+    {"name": "Artes Marciales", "description": "Deportes de combate"},
+]
+
+@contextmanager
+def startup_phase(timings: dict, name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+        STARTUP_PHASE_DURATION.set(timings[name], phase=name)
+
+async def ensure_unique_index(collection, field: str):
+    """Unique index on field, replacing a non-unique one of the same name.
+    If existing documents repeat a value a plain index is created instead and
+    the error logged, so startup still completes."""
+    try:
+        await collection.create_index([(field, 1)], unique=True)
+        return
+    except DuplicateKeyError as e:
+        duplicates = e
+    except OperationFailure as e:
+        # IndexOptionsConflict / IndexKeySpecsConflict: a plain index exists
+        if e.code not in (85, 86):
+            raise
+        await collection.drop_index(f"{field}_1")
+        try:
+            await collection.create_index([(field, 1)], unique=True)
+            return
+        except DuplicateKeyError as retry_error:
+            duplicates = retry_error
+    await collection.create_index([(field, 1)])
+    conflict = duplicates.details.get("keyValue") if duplicates.details else duplicates
+    logger.error(f"Duplicate {collection.name}.{field} values, unique index not created: {conflict}")
+
+async def ensure_indexes():
+    await asyncio.gather(
+        ensure_unique_index(db.users, "email"),
+        db.instructors.create_index([("name", 1)]),
+        db.sports.create_index([("name", 1)]),
+        db.assignment_details.create_index([("assignment_id", 1)]),
+        db.assignment_details.create_index([("good_id", 1)]),
+        db.assignments.create_index([("id", 1)]),
+        db.assignments.create_index([("instructor_id", 1), ("created_at", -1)]),
+        db.assignments.create_index([("sport_id", 1), ("created_at", -1)]),
+        db.instructor_holdings.create_index([("instructor_id", 1), ("good_id", 1)], unique=True),
+        db.warehouse_stock.create_index([("warehouse_id", 1), ("good_id", 1)], unique=True),
+        db.warehouse_stock.create_index([("good_id", 1)]),
+        db.stock_movements.create_index([("created_at", 1)]),
+        db.stock_movements.create_index([("good_id", 1), ("created_at", 1)]),
+        db.stock_checkpoints.create_index([("taken_at", -1)]),
+        db.stock_checkpoint_items.create_index([("checkpoint_id", 1), ("good_id", 1)], unique=True),
+        db.idempotency_keys.create_index([("key", 1)], unique=True),
+        db.idempotency_keys.create_index([("expires_at", 1)], expireAfterSeconds=0),
+        db.report_jobs.create_index([("status", 1), ("created_at", 1)]),
+        db.report_jobs.create_index([("created_by", 1), ("created_at", -1)]),
+        db.report_jobs.create_index([("expires_at", 1)]),
+        db.data_versions.create_index([("id", 1)], unique=True),
+        db.leases.create_index([("id", 1)], unique=True),
+        db.assignments.create_index([("created_at", 1)]),
+        db.assignments.create_index([("confirmed_at", 1)], sparse=True),
+        db.analytics_buckets.create_index([("unit", 1), ("period", 1)], unique=True),
+    )
+
+async def seed_default_admin():
+    if await db.users.find_one({"email": "admin@academia.com"}, {"_id": 1}):
+        return
+    password_hash = await asyncio.to_thread(get_password_hash, "admin123")
+    try:
+        result = await db.users.update_one(
+            {"email": "admin@academia.com"},
+            {"$setOnInsert": {
+                "id": str(uuid.uuid4()),
+                "name": "Administrador",
+                "email": "admin@academia.com",
+                "password_hash": password_hash,
+                "role": "admin",
+                "active": True,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another worker inserted it between our upsert's match and insert
+        return
+    if result.upserted_id:
+        logger.info("Default admin user created: admin@academia.com / admin123")
+
+async def seed_default_documents(collection, documents: List[dict], label: str):
+    """Insert the defaults only into an empty collection, keyed by name"""
+    if await collection.count_documents({}, limit=1):
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    operations = [
+        UpdateOne(
+            {"name": document["name"]},
+            {"$setOnInsert": {"id": str(uuid.uuid4()), **document, "active": True, "created_at": now}},
+            upsert=True
+        )
+        for document in documents
+    ]
+    result = await collection.bulk_write(operations, ordered=False)
+    if result.upserted_count:
+        logger.info(f"Default {label} created")
+
+async def backfill_assignment_refs_once():
+    """Link assignments from before instructor_id/sport_id existed, once per
+    database; portal queries and filters only match on the ids. Workers
+    starting together may both run it, which only repeats the same writes."""
+    if await db.app_state.find_one({"id": ASSIGNMENT_REFS_MARKER_ID}, {"_id": 1}):
+        return
+    result = await backfill_assignment_refs()
+    if result["updated"]:
+        logger.info(f"Linked {result['updated']} assignments to their instructor and sport; run manage.py reconcile-holdings to re-key holdings")
+    if result["unmatched_instructors"] or result["unmatched_sports"]:
+        unmatched = result["unmatched_instructors"] + result["unmatched_sports"]
+        logger.warning(f"Assignment names without an instructor or sport: {', '.join(unmatched)}")
+    await db.app_state.update_one(
+        {"id": ASSIGNMENT_REFS_MARKER_ID},
+        {"$set": {"id": ASSIGNMENT_REFS_MARKER_ID, "done_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+
+async def seed_default_data() -> bool:
+    """Run the seed pass unless the marker exists; returns whether it ran"""
+    if await db.app_state.find_one({"id": SEED_MARKER_ID}, {"_id": 1}):
+        return False
+    # Instructor and sport names are not unique, so the upserts alone would
+    # not stop two workers from both inserting the defaults
+    if not await acquire_lease("seed", SEED_LEASE_SECONDS):
+        return False
+    if await db.app_state.find_one({"id": SEED_MARKER_ID}, {"_id": 1}):
+        return False
+    await asyncio.gather(
+        seed_default_admin(),
+        seed_default_documents(db.instructors, DEFAULT_INSTRUCTORS, "instructors"),
+        seed_default_documents(db.sports, DEFAULT_SPORTS, "sports"),
+    )
+    await db.app_state.update_one(
+        {"id": SEED_MARKER_ID},
+        {"$set": {"id": SEED_MARKER_ID, "seeded_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    return True
+
 @app.on_event("startup")
 async def startup_event():
-    # Create default admin
-    admin = await db.users.find_one({"email": "admin@academia.com"})
-    if not admin:
-        default_admin = {
-            "id": str(uuid.uuid4()),
-            "name": "Administrador",
-            "email": "admin@academia.com",
-            "password_hash": get_password_hash("admin123"),
-            "role": "admin",
-            "active": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.users.insert_one(default_admin)
-        logger.info("Default admin user created: admin@academia.com / admin123")
+    timings = {}
+    with startup_phase(timings, "indexes"):
+        await ensure_indexes()
+    with startup_phase(timings, "seed"):
+        seeded = await seed_default_data()
+    with startup_phase(timings, "migrations"):
+        await backfill_assignment_refs_once()
+    with startup_phase(timings, "event_source"):
+        await start_event_source()
     
-    # Create default instructors if none exist
-    instructors_count = await db.instructors.count_documents({})
-    if instructors_count == 0:
-        default_instructors = [
-            {"id": str(uuid.uuid4()), "name": "Juan Pérez", "email": "juan.perez@academia.com", "phone": "555-0101", "specialization": "Fútbol", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "María González", "email": "maria.gonzalez@academia.com", "phone": "555-0102", "specialization": "Natación", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Carlos Rodríguez", "email": "carlos.rodriguez@academia.com", "phone": "555-0103", "specialization": "Baloncesto", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Ana Martínez", "email": "ana.martinez@academia.com", "phone": "555-0104", "specialization": "Tenis", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Luis Fernández", "email": "luis.fernandez@academia.com", "phone": "555-0105", "specialization": "Atletismo", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-        ]
-        await db.instructors.insert_many(default_instructors)
-        logger.info("Default instructors created")
-    
-    # Create default sports if none exist
-    sports_count = await db.sports.count_documents({})
-    if sports_count == 0:
-        default_sports = [
-            {"id": str(uuid.uuid4()), "name": "Fútbol", "description": "Deporte de equipo con balón", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Baloncesto", "description": "Deporte de canasta", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Voleibol", "description": "Deporte de red y pelota", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Natación", "description": "Deporte acuático", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Atletismo", "description": "Carreras y competiciones atléticas", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Tenis", "description": "Deporte de raqueta", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Gimnasia", "description": "Ejercicios de flexibilidad y fuerza", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-            {"id": str(uuid.uuid4()), "name": "Artes Marciales", "description": "Deportes de combate", "active": True, "created_at": datetime.now(timezone.utc).isoformat()},
-        ]
-        await db.sports.insert_many(default_sports)
-        logger.info("Default sports created")
+    # Periodic stock checkpoints and queued report jobs
+    global _stock_checkpoint_task, _report_worker_task
+    if STOCK_CHECKPOINT_HOURS > 0:
+        _stock_checkpoint_task = asyncio.create_task(stock_checkpoint_loop())
+    if REPORT_JOB_CONCURRENCY > 0:
+        _report_worker_task = asyncio.create_task(report_worker_loop())
+    
+    phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+    logger.info(f"Startup took {sum(timings.values()) * 1000:.0f} ms ({phases}){'' if seeded else '; default data already seeded'}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if _stock_checkpoint_task:
+        _stock_checkpoint_task.cancel()
+    if _change_stream_task:
+        _change_stream_task.cancel()
+    if _report_worker_task:
+        _report_worker_task.cancel()
     client.close()
\ No newline at end of file
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Pages-per-second benchmark for acta PDF rendering
+Compares one render per acta with fresh styles (the old create_assignment
+path), one render per acta with shared resources, and a single batch
+"print run" document. No database or network access is needed.
+
+Usage:
+    python benchmarks/acta_render_benchmark.py --actas 200 --lines 5
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+import server  # noqa: E402
+
+
+def synthetic_logo() -> bytes:
+    from PIL import Image as PILImage
+
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (600, 240), (30, 64, 175)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def synthetic_actas(count: int, lines: int) -> list:
+    return [{
+        "code": f"ACTA-{index:08X}",
+        "instructor_name": "Juan Pérez",
+        "discipline": "Fútbol",
+        "date": "01/03/2025 10:00",
+        "delivered_by": "Administrador (admin@academia.com)",
+        "notes": "Entrega para temporada" if index % 3 == 0 else "",
+        "lines": [(f"Balón {line}", "Balón de entrenamiento talla 5", line + 1) for line in range(lines)]
+    } for index in range(count)]
+
+
+def run(label: str, fn, pages: int) -> float:
+    started = time.perf_counter()
+    total_bytes = fn()
+    elapsed = time.perf_counter() - started
+    print(f"   {label:<28} {pages / elapsed:8.1f} pages/s  {elapsed:7.2f} s  {total_bytes / 1024:8.0f} KB")
+    return pages / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark acta PDF rendering")
+    parser.add_argument("--actas", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=5, help="Goods lines per acta")
+    args = parser.parse_args()
+
+    logo = synthetic_logo()
+    resources = server.build_acta_resources(logo)
+    actas = synthetic_actas(args.actas, args.lines)
+
+    print(f"🖨️  Rendering {args.actas} actas with {args.lines} lines each")
+
+    def legacy():
+        # Fresh style sheet, table styles and logo per acta, as before
+        return sum(len(server.render_actas_pdf([acta], server.build_acta_resources(logo))) for acta in actas)
+
+    def individual():
+        return sum(len(server.render_actas_pdf([acta], resources)) for acta in actas)
+
+    def batch():
+        return len(server.render_actas_pdf(actas, resources))
+
+    legacy_rate = run("separate, fresh styles", legacy, args.actas)
+    run("separate, shared resources", individual, args.actas)
+    batch_rate = run("batch print run", batch, args.actas)
+    print(f"   batch speedup vs separate renders: {batch_rate / legacy_rate:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
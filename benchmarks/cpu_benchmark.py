@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the CPU-bound paths: acta PDF rendering, report assembly
+and the demand forecast
+Runs them directly, without HTTP or MongoDB, in the style of pytest-benchmark:
+warm-up, several timed rounds, min/median/stddev and ops/s per case. A separate
+untimed round under tracemalloc records peak memory, and acta cases also
+record bytes per PDF.
+
+Usage:
+    python benchmarks/cpu_benchmark.py
+    python benchmarks/cpu_benchmark.py --lines 1 10 50 200 --rounds 20
+    python benchmarks/cpu_benchmark.py --save-baseline benchmarks/cpu_baseline.json
+    python benchmarks/cpu_benchmark.py --baseline benchmarks/cpu_baseline.json --tolerance 0.15
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+import server  # noqa: E402
+
+
+def synthetic_logo() -> bytes:
+    from PIL import Image as PILImage
+
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (600, 240), (30, 64, 175)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def synthetic_acta(lines: int) -> dict:
+    return {
+        "code": "ACTA-0000BEEF",
+        "instructor_name": "Juan Pérez",
+        "discipline": "Fútbol",
+        "date": "01/03/2025 10:00",
+        "delivered_by": "Administrador (admin@academia.com)",
+        "notes": "Entrega para temporada",
+        "lines": [(f"Balón {line}", "Balón de entrenamiento talla 5", line % 9 + 1) for line in range(lines)]
+    }
+
+
+def synthetic_inventory(goods_count: int) -> tuple:
+    categories = [{"id": f"cat-{i}", "name": f"Categoría {i}"} for i in range(40)]
+    goods = [{
+        "id": f"good-{i}",
+        "name": f"Bien {i}",
+        "description": "Material deportivo",
+        "category_id": f"cat-{i % 45}",  # a few dangling categories, reported as N/A
+        "quantity": 50,
+        "available_quantity": 20
+    } for i in range(goods_count)]
+    return goods, categories
+
+
+def synthetic_assignments(assignment_count: int, details_per_assignment: int) -> tuple:
+    assignments = [{
+        "id": f"asg-{i}",
+        "instructor_name": f"Instructor {i % 30}",
+        "discipline": "Fútbol",
+        "status": "Asignado"
+    } for i in range(assignment_count)]
+    details = [{
+        "id": f"det-{i}-{j}",
+        "assignment_id": f"asg-{i}",
+        "good_id": f"good-{(i * details_per_assignment + j) % 500}",
+        "good_name": f"Bien {(i * details_per_assignment + j) % 500}",
+        "quantity_assigned": 1
+    } for i in range(assignment_count) for j in range(details_per_assignment)]
+    return assignments, details
+
+
+def synthetic_demand_history(goods_count: int, weeks: int) -> tuple:
+    """Goods plus the flat daily demand columns load_demand_history returns"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    today = server.datetime.now(server.timezone.utc).date()
+    goods, categories = synthetic_inventory(goods_count)
+    demand = rng.random((goods_count, 7 * weeks)) < 0.2
+    good_rows, day_offsets = np.nonzero(demand)
+    history = {
+        "good_ids": [g["id"] for g in goods],
+        "lengths": demand.sum(axis=1),
+        "days": np.datetime64(today, "D") - day_offsets.astype("timedelta64[D]"),
+        "quantities": rng.integers(1, 6, len(good_rows)).astype(np.float64)
+    }
+    return goods, categories, history, today
+
+
+class Case:
+    """One benchmark: setup() builds fresh inputs (untimed), run(inputs) is measured"""
+
+    def __init__(self, name: str, setup, run, items: int = 1):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.items = items
+
+
+def measure(case: Case, rounds: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        case.run(case.setup())
+
+    timings = []
+    output = None
+    for _ in range(rounds):
+        inputs = case.setup()
+        started = time.perf_counter()
+        output = case.run(inputs)
+        timings.append(time.perf_counter() - started)
+
+    # Memory is measured in its own round; tracemalloc would distort the timings
+    inputs = case.setup()
+    tracemalloc.start()
+    try:
+        case.run(inputs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(timings)
+    result = {
+        "rounds": rounds,
+        "min_ms": min(timings) * 1000,
+        "median_ms": median * 1000,
+        "stddev_ms": (statistics.stdev(timings) if len(timings) > 1 else 0.0) * 1000,
+        "ops_per_s": case.items / median,
+        "peak_kb": peak / 1024,
+    }
+    if isinstance(output, bytes):
+        result["bytes_per_pdf"] = len(output) / case.items
+    return result
+
+
+def build_cases(args, resources: dict) -> list:
+    cases = []
+    for lines in args.lines:
+        acta = synthetic_acta(lines)
+        cases.append(Case(
+            f"acta_render[lines={lines}]",
+            lambda: None,
+            lambda _, acta=acta: server.render_actas_pdf([acta], resources)
+        ))
+
+    batch = [synthetic_acta(args.lines[0]) for _ in range(args.batch)]
+    cases.append(Case(
+        f"acta_print_run[actas={args.batch}]",
+        lambda: None,
+        lambda _: server.render_actas_pdf(batch, resources),
+        items=args.batch
+    ))
+
+    cases.append(Case(
+        f"inventory_report[goods={args.goods}]",
+        lambda: synthetic_inventory(args.goods),
+        lambda inputs: server.build_inventory_report(*inputs)
+    ))
+    cases.append(Case(
+        f"assignments_report[assignments={args.assignments}]",
+        lambda: synthetic_assignments(args.assignments, args.details),
+        lambda inputs: server.build_assignments_report(*inputs)
+    ))
+    cases.append(Case(
+        f"demand_forecast[goods={args.forecast_goods},weeks={args.forecast_weeks}]",
+        lambda: synthetic_demand_history(args.forecast_goods, args.forecast_weeks),
+        lambda inputs: server.build_restock_forecast(*inputs, args.forecast_weeks, 8)
+    ))
+    return cases
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Cases whose throughput dropped, or whose memory or PDF size grew, beyond tolerance"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        if current["ops_per_s"] < previous["ops_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: {current['ops_per_s']:.1f} ops/s vs {previous['ops_per_s']:.1f}")
+        if current["peak_kb"] > previous["peak_kb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak {current['peak_kb']:.0f} KB vs {previous['peak_kb']:.0f} KB")
+        if "bytes_per_pdf" in previous and current.get("bytes_per_pdf", 0) > previous["bytes_per_pdf"] * (1 + tolerance):
+            regressions.append(f"{name}: {current['bytes_per_pdf']:.0f} B/pdf vs {previous['bytes_per_pdf']:.0f} B/pdf")
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"\n   {'case':<40} {'min ms':>9} {'median ms':>10} {'stddev':>8} {'ops/s':>9} {'peak KB':>9} {'B/pdf':>8}")
+    for name, r in results.items():
+        size = f"{r['bytes_per_pdf']:8.0f}" if "bytes_per_pdf" in r else f"{'-':>8}"
+        print(f"   {name:<40} {r['min_ms']:9.2f} {r['median_ms']:10.2f} {r['stddev_ms']:8.2f} "
+              f"{r['ops_per_s']:9.1f} {r['peak_kb']:9.0f} {size}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark acta rendering and report assembly")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 50, 200], help="Goods lines per acta")
+    parser.add_argument("--batch", type=int, default=50, help="Actas in the print run case")
+    parser.add_argument("--goods", type=int, default=10000, help="Goods in the inventory report case")
+    parser.add_argument("--assignments", type=int, default=5000, help="Assignments in the assignments report case")
+    parser.add_argument("--details", type=int, default=4, help="Details per assignment")
+    parser.add_argument("--forecast-goods", type=int, default=2000, help="Goods in the demand forecast case")
+    parser.add_argument("--forecast-weeks", type=int, default=260, help="Weeks of daily demand history in the forecast case")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    parser.add_argument("--save-baseline", help="Write the results as a new baseline")
+    parser.add_argument("--baseline", help="Compare against a baseline and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    resources = server.build_acta_resources(synthetic_logo())
+    cases = [c for c in build_cases(args, resources) if args.filter in c.name]
+
+    print(f"⏱️  Running {len(cases)} cases, {args.rounds} rounds each (python {sys.version.split()[0]})")
+    results = {}
+    for case in cases:
+        results[case.name] = measure(case, args.rounds, args.warmup)
+        print(f"   {case.name:<40} done")
+    print_table(results)
+
+    if args.save_baseline:
+        report = {"python": sys.version.split()[0], "rounds": args.rounds, "results": results}
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2))
+        print(f"\n💾 Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print(f"\n❌ Regressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for acta downloads
+Runs concurrent full and ranged downloads of one acta against a running backend
+and reports MB/s and latency percentiles
+
+Usage:
+    python benchmarks/download_benchmark.py --base-url http://localhost:8001 \
+        --acta-id <acta id> --concurrency 16 --requests 200
+    python benchmarks/download_benchmark.py ... --signed <assignment id>
+    python benchmarks/download_benchmark.py ... --range-size 1048576
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import requests
+
+
+class DownloadBenchmark:
+    def __init__(self, base_url: str, email: str, password: str):
+        self.base_url = base_url.rstrip("/")
+        self.email = email
+        self.password = password
+        self.token = None
+
+    def login(self):
+        response = requests.post(
+            f"{self.base_url}/api/auth/login",
+            json={"email": self.email, "password": self.password},
+            timeout=30
+        )
+        response.raise_for_status()
+        self.token = response.json()["token"]
+
+    def download(self, session: requests.Session, url: str, range_size: Optional[int]) -> tuple:
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if range_size:
+            # Suffix range, like a client resuming an interrupted download
+            headers["Range"] = f"bytes=-{range_size}"
+
+        start = time.perf_counter()
+        received = 0
+        with session.get(url, headers=headers, stream=True, timeout=120) as response:
+            if response.status_code not in (200, 206):
+                raise RuntimeError(f"Unexpected status {response.status_code} for {url}")
+            for chunk in response.iter_content(chunk_size=256 * 1024):
+                received += len(chunk)
+        return time.perf_counter() - start, received
+
+    def run(self, url: str, concurrency: int, total_requests: int, range_size: Optional[int]) -> dict:
+        sessions = [requests.Session() for _ in range(concurrency)]
+
+        def worker(index: int):
+            return self.download(sessions[index % concurrency], url, range_size)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(worker, range(total_requests)))
+        elapsed = time.perf_counter() - started
+
+        for session in sessions:
+            session.close()
+
+        latencies = sorted(r[0] for r in results)
+        total_bytes = sum(r[1] for r in results)
+        return {
+            "requests": total_requests,
+            "concurrency": concurrency,
+            "elapsed_s": elapsed,
+            "total_mb": total_bytes / (1024 * 1024),
+            "throughput_mb_s": total_bytes / (1024 * 1024) / elapsed,
+            "requests_per_s": total_requests / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "mean_ms": statistics.mean(latencies) * 1000,
+        }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent acta downloads")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--email", default="admin@academia.com")
+    parser.add_argument("--password", default="admin123")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--acta-id", help="Acta id for /api/actas/{id}/download")
+    target.add_argument("--signed", metavar="ASSIGNMENT_ID", help="Assignment id for /api/actas/{id}/download-signed")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--range-size", type=int, default=0, help="Request byte ranges of this size instead of full files")
+    args = parser.parse_args()
+
+    benchmark = DownloadBenchmark(args.base_url, args.email, args.password)
+    benchmark.login()
+
+    if args.acta_id:
+        url = f"{benchmark.base_url}/api/actas/{args.acta_id}/download"
+    else:
+        url = f"{benchmark.base_url}/api/actas/{args.signed}/download-signed"
+
+    print(f"📥 Benchmarking {url}")
+    print(f"   concurrency={args.concurrency} requests={args.requests} range_size={args.range_size or 'full'}")
+
+    # Warm-up so connection setup and first reads do not skew the numbers
+    benchmark.run(url, min(args.concurrency, 2), min(args.requests, 4), args.range_size or None)
+    result = benchmark.run(url, args.concurrency, args.requests, args.range_size or None)
+
+    print(f"   transferred: {result['total_mb']:.1f} MB in {result['elapsed_s']:.2f} s")
+    print(f"   throughput:  {result['throughput_mb_s']:.1f} MB/s, {result['requests_per_s']:.1f} req/s")
+    print(f"   latency:     p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Self-contained load benchmark for the backend API
+Starts the FastAPI app in-process, seeds a synthetic dataset and drives
+concurrent traffic (login bursts, assignment creation, reports, dashboard),
+then reports throughput and p50/p95/p99 latency per endpoint
+
+By default the app runs against mongomock-motor, an in-memory stand-in for
+Motor. Pass --mongo-url to use a real mongod instead; a throwaway database is
+created and dropped afterwards.
+
+Usage:
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/load_benchmark.py --goods 2000 --assignments 1000
+    python benchmarks/load_benchmark.py --mongo-url mongodb://localhost:27017 \
+        --goods 100000 --assignments 50000 --save-baseline benchmarks/baseline.json
+    python benchmarks/load_benchmark.py --baseline benchmarks/baseline.json --tolerance 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+
+SEED_BATCH = 5000
+SEED_PASSWORD = "bench123"
+
+
+class LoadBenchmark:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.client = None
+        self.db = None
+        self.good_ids = []
+        self.instructor_names = []
+        self.discipline_names = []
+        self.instructor_ids = []
+        self.sport_ids = []
+        self.login_emails = []
+        self.latencies = {}
+        self.errors = {}
+
+    # ------------------------------------------------------------------
+    # Setup
+    # ------------------------------------------------------------------
+    def connect(self):
+        if self.args.mongo_url:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            self.client = AsyncIOMotorClient(self.args.mongo_url)
+            self.db = self.client[f"inventario_bench_{uuid.uuid4().hex[:8]}"]
+        else:
+            try:
+                from mongomock_motor import AsyncMongoMockClient
+            except ImportError:
+                sys.exit("mongomock-motor is required without --mongo-url: pip install -r benchmarks/requirements.txt")
+            self.client = AsyncMongoMockClient()
+            self.db = self.client["inventario_bench"]
+
+        server.client = self.client
+        server.db = self.db
+        server.acta_storage = server.LocalActaStorage(Path(tempfile.mkdtemp(prefix="actas-bench-")))
+        # No network access for the acta logo during benchmarks
+        server._acta_resources = server.build_acta_resources(None)
+
+    async def insert_batches(self, collection, documents):
+        for start in range(0, len(documents), SEED_BATCH):
+            await collection.insert_many(documents[start:start + SEED_BATCH])
+
+    async def seed(self):
+        args = self.args
+        now = datetime.now(timezone.utc)
+        password_hash = server.get_password_hash(SEED_PASSWORD)
+
+        categories = [{"id": str(uuid.uuid4()), "name": f"Categoría {i}", "description": "", "created_at": now.isoformat()}
+                      for i in range(args.categories)]
+        sports = [{"id": str(uuid.uuid4()), "name": f"Disciplina {i}", "description": "", "active": True, "created_at": now.isoformat()}
+                  for i in range(args.disciplines)]
+        instructors = [{
+            "id": str(uuid.uuid4()), "name": f"Instructor {i}", "email": f"instructor{i}@bench-academia.com",
+            "phone": "555-0000", "specialization": sports[i % len(sports)]["name"], "active": True,
+            "has_login": True, "password_hash": password_hash, "created_at": now.isoformat()
+        } for i in range(args.instructors)]
+        users = [{
+            "id": str(uuid.uuid4()), "name": f"Usuario {i}", "email": f"user{i}@bench-academia.com",
+            "password_hash": password_hash, "role": "admin" if i == 0 else "control", "active": True,
+            "created_at": now.isoformat()
+        } for i in range(args.users)]
+        goods = [{
+            "id": str(uuid.uuid4()), "name": f"Bien {i}", "category_id": categories[i % len(categories)]["id"],
+            "description": f"Descripción del bien {i}", "status": "Bueno", "quantity": 1_000_000,
+            "available_quantity": 1_000_000, "location": "Bodega", "responsible": "Bench",
+            "created_at": now.isoformat()
+        } for i in range(args.goods)]
+
+        category_names = {c["id"]: c["name"] for c in categories}
+        sport_ids = {s["name"]: s["id"] for s in sports}
+        assignments = []
+        details = []
+        for i in range(args.assignments):
+            assignment_id = str(uuid.uuid4())
+            created_at = (now - timedelta(minutes=i)).isoformat()
+            instructor = instructors[i % len(instructors)]
+            assignments.append({
+                "id": assignment_id, "instructor_id": instructor["id"], "instructor_name": instructor["name"],
+                "sport_id": sport_ids[instructor["specialization"]], "discipline": instructor["specialization"],
+                "created_by": users[0]["email"],
+                "created_at": created_at, "status": self.rng.choice(["Pendiente", "Entregado"]),
+                "notes": "", "signed_acta_uploaded": False
+            })
+            for _ in range(self.rng.randint(1, 3)):
+                good = self.rng.choice(goods)
+                details.append({
+                    "id": str(uuid.uuid4()), "assignment_id": assignment_id,
+                    "good_id": good["id"], "quantity_assigned": self.rng.randint(1, 5),
+                    "created_at": created_at, **server.good_snapshot(good, category_names)
+                })
+
+        started = time.perf_counter()
+        await self.insert_batches(self.db.categories, categories)
+        await self.insert_batches(self.db.sports, sports)
+        await self.insert_batches(self.db.instructors, instructors)
+        await self.insert_batches(self.db.users, users)
+        await self.insert_batches(self.db.goods, goods)
+        await self.insert_batches(self.db.assignments, assignments)
+        await self.insert_batches(self.db.assignment_details, details)
+        print(f"🌱 Seeded {len(goods)} goods, {len(assignments)} assignments, {len(details)} details "
+              f"in {time.perf_counter() - started:.1f} s")
+
+        self.good_ids = [g["id"] for g in goods]
+        self.instructor_names = [i["name"] for i in instructors]
+        self.discipline_names = [s["name"] for s in sports]
+        self.instructor_ids = [i["id"] for i in instructors]
+        self.sport_ids = [s["id"] for s in sports]
+        self.login_emails = [u["email"] for u in users] + [i["email"] for i in instructors]
+
+    # ------------------------------------------------------------------
+    # Traffic
+    # ------------------------------------------------------------------
+    async def timed(self, http, name, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await http.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+            response = None
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+    async def run_scenario(self, http, name, requests, make_request):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def one(index):
+            async with semaphore:
+                await make_request(index)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - started
+
+    async def run(self):
+        args = self.args
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as http:
+            login = await http.post("/api/auth/login", json={"email": "user0@bench-academia.com", "password": SEED_PASSWORD})
+            login.raise_for_status()
+            headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+            async def login_burst(i):
+                email = self.login_emails[i % len(self.login_emails)]
+                await self.timed(http, "POST /api/auth/login", "POST", "/api/auth/login",
+                                 json={"email": email, "password": SEED_PASSWORD})
+
+            async def create_assignment(i):
+                lines = self.rng.randint(1, args.max_lines)
+                payload = {
+                    "instructor_id": self.rng.choice(self.instructor_ids),
+                    "sport_id": self.rng.choice(self.sport_ids),
+                    "details": [{"good_id": g, "quantity_assigned": 1} for g in self.rng.sample(self.good_ids, lines)],
+                    "notes": ""
+                }
+                await self.timed(http, "POST /api/assignments", "POST", "/api/assignments", json=payload, headers=headers)
+
+            async def assignments_report(i):
+                params = {"report_type": "assignments", "instructor_name": self.rng.choice(self.instructor_names)}
+                await self.timed(http, "GET /api/reports?assignments", "GET", "/api/reports", params=params, headers=headers)
+
+            async def inventory_report(i):
+                await self.timed(http, "GET /api/reports?inventory", "GET", "/api/reports",
+                                 params={"report_type": "inventory"}, headers=headers)
+
+            async def dashboard(i):
+                await self.timed(http, "GET /api/dashboard/stats", "GET", "/api/dashboard/stats", headers=headers)
+
+            async def goods(i):
+                await self.timed(http, "GET /api/goods", "GET", "/api/goods", headers=headers)
+
+            scenarios = [
+                ("POST /api/auth/login", args.logins, login_burst),
+                ("POST /api/assignments", args.creates, create_assignment),
+                ("GET /api/reports?assignments", args.reports, assignments_report),
+                ("GET /api/reports?inventory", args.inventory_reports, inventory_report),
+                ("GET /api/dashboard/stats", args.dashboards, dashboard),
+                ("GET /api/goods", args.dashboards, goods),
+            ]
+            elapsed = {}
+            for name, requests, fn in scenarios:
+                if requests > 0:
+                    elapsed[name] = await self.run_scenario(http, name, requests, fn)
+                    print(f"   {name:<32} done in {elapsed[name]:.2f} s")
+        return elapsed
+
+    def results(self, elapsed: dict) -> dict:
+        results = {}
+        for name, samples in self.latencies.items():
+            ordered = sorted(samples)
+            results[name] = {
+                "requests": len(samples),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(samples) / elapsed[name], 2),
+                "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+                "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+            }
+        return results
+
+    async def cleanup(self):
+        if self.args.mongo_url:
+            await self.client.drop_database(self.db.name)
+        self.client.close()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Endpoints whose p95 grew or throughput dropped by more than tolerance"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"\n   {'endpoint':<32} {'req':>6} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"   {name:<32} {r['requests']:>6} {r['errors']:>5} {r['throughput_rps']:>9.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+
+async def main_async(args) -> int:
+    benchmark = LoadBenchmark(args)
+    benchmark.connect()
+    try:
+        for handler in server.app.router.on_startup:
+            await handler()
+        await benchmark.seed()
+        print(f"🚀 Driving traffic with concurrency {args.concurrency}")
+        elapsed = await benchmark.run()
+    finally:
+        await benchmark.cleanup()
+
+    results = benchmark.results(elapsed)
+    print_table(results)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "backend": "mongod" if args.mongo_url else "mongomock",
+        "dataset": {"goods": args.goods, "assignments": args.assignments},
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2))
+        print(f"\n💾 Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print(f"\n❌ Regressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process load benchmark for the backend API")
+    parser.add_argument("--mongo-url", help="Use a real mongod instead of the in-memory stand-in")
+    parser.add_argument("--goods", type=int, default=2000)
+    parser.add_argument("--assignments", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--disciplines", type=int, default=8)
+    parser.add_argument("--instructors", type=int, default=50)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--creates", type=int, default=100)
+    parser.add_argument("--max-lines", type=int, default=3, help="Max goods lines per created assignment")
+    parser.add_argument("--reports", type=int, default=50)
+    parser.add_argument("--inventory-reports", type=int, default=5)
+    parser.add_argument("--dashboards", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--save-baseline", help="Write the results as a new baseline")
+    parser.add_argument("--baseline", help="Compare against a baseline and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
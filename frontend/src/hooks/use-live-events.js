@@ -0,0 +1,67 @@
+import { useEffect, useRef } from 'react';
+import { api } from '../utils/api';
+
+const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+const RECONNECT_DELAY_MS = 3000;
+
+// Subscribes to the backend live event stream while the component is mounted.
+// handlers maps an event type (e.g. 'good.upserted') to a callback receiving its data.
+// The stream is opened with a short-lived ticket, never the session token, so the
+// token stays out of URLs. EventSource reconnects by itself and resends
+// Last-Event-ID; once the ticket has expired the server refuses it, so a new
+// ticket is fetched and the stream resumes from the last event seen (missed
+// events are replayed or a 'resync' event arrives).
+export const useLiveEvents = (handlers) => {
+  const handlersRef = useRef(handlers);
+  handlersRef.current = handlers;
+
+  useEffect(() => {
+    if (!localStorage.getItem('token') || typeof EventSource === 'undefined') return undefined;
+
+    let source = null;
+    let lastEventId = null;
+    let stopped = false;
+    let retryTimer = null;
+
+    const retry = () => {
+      if (!stopped) retryTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+    };
+
+    const connect = async () => {
+      let ticket;
+      try {
+        ({ data: { ticket } } = await api.createEventsTicket());
+      } catch (error) {
+        retry();
+        return;
+      }
+      if (stopped) return;
+
+      const params = new URLSearchParams({ ticket });
+      if (lastEventId) params.set('last_event_id', lastEventId);
+      source = new EventSource(`${API}/events/stream?${params}`);
+      Object.keys(handlersRef.current).forEach((type) => {
+        source.addEventListener(type, (event) => {
+          if (event.lastEventId) lastEventId = event.lastEventId;
+          const handler = handlersRef.current[type];
+          if (handler) handler(JSON.parse(event.data));
+        });
+      });
+      source.onerror = () => {
+        // CLOSED means the browser gave up, e.g. the ticket was refused
+        if (source.readyState === EventSource.CLOSED) {
+          source.close();
+          source = null;
+          retry();
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }, []);
+};
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import { api } from '../utils/api';
+import { api, newIdempotencyKey } from '../utils/api';
 import { toast } from 'sonner';
 import { Plus, ClipboardList } from 'lucide-react';
 import { Button } from '../components/ui/button';
@@ -34,6 +34,7 @@ const Assignments = () => {
     notes: '',
     details: [{ good_id: '', quantity_assigned: 1 }],
   });
+  const [idempotencyKey, setIdempotencyKey] = useState(newIdempotencyKey);
 
   useEffect(() => {
     loadData();
@@ -62,7 +63,7 @@ const Assignments = () => {
     e.preventDefault();
     
     try {
-      await api.createAssignment(formData);
+      await api.createAssignment(formData, idempotencyKey);
       toast.success('Asignación creada exitosamente');
       setIsDialogOpen(false);
       resetForm();
@@ -73,6 +74,7 @@ const Assignments = () => {
   };
 
   const resetForm = () => {
+    setIdempotencyKey(newIdempotencyKey());
     setFormData({
       instructor_name: '',
       discipline: '',
@@ -1,9 +1,20 @@
 import React, { useEffect, useState } from 'react';
 import { api } from '../utils/api';
+import { useLiveEvents } from '../hooks/use-live-events';
 import { toast } from 'sonner';
 import { Package, ClipboardList, FolderOpen, TrendingUp } from 'lucide-react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 
+const applyDashboardDelta = (stats, delta) => {
+  if (!stats) return stats;
+  const next = { ...stats };
+  Object.entries(delta).forEach(([key, value]) => {
+    next[key] = (next[key] || 0) + value;
+  });
+  next.assigned_quantity = next.total_quantity - next.available_quantity;
+  return next;
+};
+
 const Dashboard = () => {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -12,6 +23,23 @@ const Dashboard = () => {
     loadStats();
   }, []);
 
+  useLiveEvents({
+    'dashboard.delta': (delta) => setStats((current) => applyDashboardDelta(current, delta)),
+    'assignment.created': (assignment) =>
+      setStats((current) =>
+        current && { ...current, recent_assignments: [assignment, ...current.recent_assignments].slice(0, 5) }
+      ),
+    'assignment.updated': ({ id, status }) =>
+      setStats((current) =>
+        current && {
+          ...current,
+          recent_assignments: current.recent_assignments.map((a) => (a.id === id ? { ...a, status } : a)),
+        }
+      ),
+    'dashboard.changed': () => loadStats(),
+    resync: () => loadStats(),
+  });
+
   const loadStats = async () => {
     try {
       const response = await api.getDashboardStats();
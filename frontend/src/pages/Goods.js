@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { api } from '../utils/api';
+import { useLiveEvents } from '../hooks/use-live-events';
 import { toast } from 'sonner';
 import { Plus, Edit, Trash2, Search, Package } from 'lucide-react';
 import { Button } from '../components/ui/button';
@@ -42,6 +43,23 @@ const Goods = () => {
     loadData();
   }, []);
 
+  useLiveEvents({
+    'good.upserted': (good) =>
+      setGoods((current) =>
+        current.some((g) => g.id === good.id)
+          ? current.map((g) => (g.id === good.id ? good : g))
+          : [...current, good]
+      ),
+    'good.deleted': ({ id }) => setGoods((current) => current.filter((g) => g.id !== id)),
+    'goods.stock': ({ changes }) => {
+      const deltas = Object.fromEntries(changes.map((c) => [c.id, c.available_delta]));
+      setGoods((current) =>
+        current.map((g) => (deltas[g.id] ? { ...g, available_quantity: g.available_quantity + deltas[g.id] } : g))
+      );
+    },
+    resync: () => loadData(),
+  });
+
   const loadData = async () => {
     try {
       const [goodsRes, categoriesRes] = await Promise.all([
@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { api } from '../utils/api';
 import { toast } from 'sonner';
-import { Download, FileText } from 'lucide-react';
+import { Download, FileText, Clock } from 'lucide-react';
 import { Button } from '../components/ui/button';
 import { Label } from '../components/ui/label';
 import {
@@ -19,6 +19,7 @@ const Reports = () => {
   const [reportType, setReportType] = useState('inventory');
   const [loading, setLoading] = useState(false);
   const [reportData, setReportData] = useState(null);
+  const [jobRunning, setJobRunning] = useState(false);
 
   const generateReport = async () => {
     setLoading(true);
@@ -33,6 +34,40 @@ const Reports = () => {
     }
   };
 
+  // Large reports are built on the server; poll the job and download the file when ready
+  const exportInBackground = async () => {
+    setJobRunning(true);
+    try {
+      const { data: job } = await api.createReportJob({ report_type: reportType, format: 'xlsx' });
+      toast.info('El reporte se está generando, se descargará al terminar');
+
+      let status = job.status;
+      while (status === 'queued' || status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        status = (await api.getReportJob(job.id)).data.status;
+      }
+      if (status !== 'done') {
+        toast.error('Error al generar reporte');
+        return;
+      }
+
+      const response = await api.downloadReportJob(job.id);
+      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = `reporte_${reportType}_${Date.now()}.xlsx`;
+      document.body.appendChild(a);
+      a.click();
+      window.URL.revokeObjectURL(url);
+      document.body.removeChild(a);
+      toast.success('Reporte exportado a Excel');
+    } catch (error) {
+      toast.error(error.response?.data?.detail || 'Error al generar reporte');
+    } finally {
+      setJobRunning(false);
+    }
+  };
+
   const exportToExcel = () => {
     if (!reportData || reportData.length === 0) {
       toast.error('No hay datos para exportar');
@@ -159,6 +194,18 @@ const Reports = () => {
               {loading ? 'Generando...' : 'Generar Reporte'}
             </Button>
           </div>
+          <div className="flex items-end">
+            <Button
+              onClick={exportInBackground}
+              disabled={jobRunning}
+              variant="outline"
+              className="w-full"
+              data-testid="background-export-button"
+            >
+              <Clock className="w-4 h-4 mr-2" />
+              {jobRunning ? 'Generando Excel...' : 'Excel en segundo plano'}
+            </Button>
+          </div>
         </div>
 
         {reportData && reportData.length > 0 && (
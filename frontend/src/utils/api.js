@@ -7,10 +7,20 @@ const getAuthHeader = () => {
   return token ? { Authorization: `Bearer ${token}` } : {};
 };
 
+// One key per form submission: retries of the same submission reuse it and
+// the backend returns the first response instead of creating a duplicate.
+export const newIdempotencyKey = () =>
+  (window.crypto && window.crypto.randomUUID)
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 export const api = {
   // Dashboard
   getDashboardStats: () => axios.get(`${API}/dashboard/stats`, { headers: getAuthHeader() }),
 
+  // Live events
+  createEventsTicket: () => axios.post(`${API}/events/ticket`, {}, { headers: getAuthHeader() }),
+
   // Users
   getUsers: () => axios.get(`${API}/users`, { headers: getAuthHeader() }),
   createUser: (data) => axios.post(`${API}/users`, data, { headers: getAuthHeader() }),
@@ -52,7 +62,9 @@ export const api = {
 
   // Assignments
   getAssignments: () => axios.get(`${API}/assignments`, { headers: getAuthHeader() }),
-  createAssignment: (data) => axios.post(`${API}/assignments`, data, { headers: getAuthHeader() }),
+  createAssignment: (data, idempotencyKey) => axios.post(`${API}/assignments`, data, {
+    headers: { ...getAuthHeader(), 'Idempotency-Key': idempotencyKey },
+  }),
 
   // Actas
   getActas: () => axios.get(`${API}/actas`, { headers: getAuthHeader() }),
@@ -63,6 +75,12 @@ export const api = {
 
   // Reports
   getReports: (params) => axios.get(`${API}/reports`, { params, headers: getAuthHeader() }),
+  createReportJob: (data) => axios.post(`${API}/reports/jobs`, data, { headers: getAuthHeader() }),
+  getReportJob: (id) => axios.get(`${API}/reports/jobs/${id}`, { headers: getAuthHeader() }),
+  downloadReportJob: (id) => axios.get(`${API}/reports/jobs/${id}/download`, {
+    headers: getAuthHeader(),
+    responseType: 'blob'
+  }),
 
   // Audit
   getAuditLogs: () => axios.get(`${API}/audit`, { headers: getAuthHeader() }),
@@ -0,0 +1,160 @@
+"""
+Shared pytest fixtures for the backend
+Tests that use `client` or `db` need a real MongoDB, at TEST_MONGO_URL
+(default mongodb://localhost:27017); each test gets a throwaway database that
+is dropped afterwards, and the tests are skipped when no server answers.
+
+With TEST_MONGO_URL=mongomock:// they run against mongomock-motor instead
+(pip install -r tests/requirements.txt), so the suite needs no server at all.
+Command monitoring does not fire on that stand-in, so tests that use
+query_budget are skipped there, as are tests that use the mongod fixture
+because they need aggregation operators mongomock lacks.
+"""
+
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017")
+USE_MONGOMOCK = TEST_MONGO_URL.startswith("mongomock://")
+# server.py builds its (lazy) module client from MONGO_URL at import time
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017" if USE_MONGOMOCK else TEST_MONGO_URL)
+os.environ.setdefault("DB_NAME", "inventario_test")
+
+ADMIN_EMAIL = "admin@academia.com"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def mongomock_find_and_modify(find_and_modify):
+    """Wrap mongomock's find_one_and_update so AFTER documents are read back by _id.
+
+    mongomock re-reads them with the original filter when the projection
+    drops _id, so it returns None once the update moved the document out of
+    that filter (claiming a queued report job, for one).
+    """
+    from pymongo import ReturnDocument
+
+    def wrapper(self, query, projection=None, update=None, upsert=False, sort=None,
+                return_document=ReturnDocument.BEFORE, session=None, **kwargs):
+        after = return_document is ReturnDocument.AFTER or kwargs.get("new")
+        document = find_and_modify(
+            self, query, None if after else projection, update, upsert, sort,
+            return_document, session, **kwargs
+        )
+        if document is None or not after or projection is None:
+            return document
+        return self.find_one({"_id": document["_id"]}, projection)
+
+    return wrapper
+
+
+@pytest.fixture
+async def db(monkeypatch):
+    """A fresh database with the server's indexes, patched into server.db"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo.errors import PyMongoError
+
+    import server
+
+    if USE_MONGOMOCK:
+        mongomock_motor = pytest.importorskip("mongomock_motor")
+        from mongomock.collection import Collection
+
+        monkeypatch.setattr(
+            Collection, "_find_and_modify", mongomock_find_and_modify(Collection._find_and_modify)
+        )
+        mongo = mongomock_motor.AsyncMongoMockClient()
+    else:
+        mongo = AsyncIOMotorClient(
+            os.environ["MONGO_URL"],
+            event_listeners=[server.QueryCounterListener()],
+            serverSelectionTimeoutMS=2000
+        )
+        try:
+            await mongo.admin.command("ping")
+        except PyMongoError:
+            mongo.close()
+            pytest.skip(f"MongoDB not reachable at {os.environ['MONGO_URL']}")
+
+    database = mongo[f"inventario_test_{uuid.uuid4().hex[:12]}"]
+    monkeypatch.setattr(server, "client", mongo)
+    monkeypatch.setattr(server, "db", database)
+    # Per-process caches would otherwise carry data over from earlier tests
+    monkeypatch.setattr(server, "report_cache", server.ReportCache(server.REPORT_CACHE_MAX_BYTES))
+    monkeypatch.setattr(server, "_data_versions", {})
+    monkeypatch.setattr(server, "_data_versions_loaded_at", 0.0)
+    # Profiling stays off and its settings are not re-read mid-test
+    monkeypatch.setattr(server, "_profiling_settings", server.ProfilingSettings())
+    monkeypatch.setattr(server, "_profiling_settings_loaded_at", float("inf"))
+    await server.ensure_indexes()
+    try:
+        yield database
+    finally:
+        await mongo.drop_database(database.name)
+        mongo.close()
+
+
+@pytest.fixture
+def mongod(db):
+    """The db fixture, on a real MongoDB only"""
+    if USE_MONGOMOCK:
+        pytest.skip("needs a real MongoDB")
+    return db
+
+
+@pytest.fixture
+async def client(db):
+    """httpx client over the ASGI app, authenticated as the default admin.
+
+    ASGITransport does not run the startup event, so background loops stay
+    off; the fixtures above create what the endpoints need.
+    """
+    import server
+
+    await server.seed_default_admin()
+    token = server.create_access_token({"sub": ADMIN_EMAIL})
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url="http://testserver",
+        headers={"Authorization": f"Bearer {token}"}
+    ) as http:
+        yield http
+
+
+@pytest.fixture
+def query_budget(monkeypatch):
+    """Assert that a response stayed within a MongoDB command budget.
+
+    Turns on QUERY_DEBUG for the test so every response carries the
+    X-DB-Query-Count and X-DB-Time-Ms headers:
+
+        async def test_reports_budget(client, query_budget):
+            response = await client.get("/api/reports", params={"report_type": "inventory"})
+            query_budget(response, 3)
+    """
+    import server
+
+    if USE_MONGOMOCK:
+        pytest.skip("query budgets need command monitoring, which mongomock does not emit")
+    monkeypatch.setattr(server, "QUERY_DEBUG", True)
+
+    def check(response, max_queries: int) -> int:
+        count = int(response.headers["x-db-query-count"])
+        request = response.request
+        assert count <= max_queries, (
+            f"{request.method} {request.url.path} sent {count} MongoDB commands "
+            f"({response.headers.get('x-db-time-ms')} ms), budget is {max_queries}"
+        )
+        return count
+
+    return check
@@ -0,0 +1,106 @@
+"""
+Acta downloads
+Single byte ranges resume interrupted downloads, conditional requests get a
+304, and with ACTAS_X_ACCEL_PREFIX the file is handed to nginx.
+"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+PDF = b"%PDF-1.4 " + bytes(range(256)) * 40
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-10", (990, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=0-0", (0, 0)),
+    ("bytes=0-9,20-29", None),
+    ("items=0-9", None),
+    ("bytes=a-9", None),
+    ("bytes=-", None),
+])
+def test_parse_byte_range(header, expected):
+    import server
+
+    assert server.parse_byte_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=500-400", "bytes=-0"])
+def test_unsatisfiable_byte_range(header):
+    import server
+
+    with pytest.raises(ValueError):
+        server.parse_byte_range(header, 1000)
+
+
+@pytest.fixture
+async def acta(db, monkeypatch, tmp_path):
+    import server
+
+    monkeypatch.setattr(server, "acta_storage", server.LocalActaStorage(tmp_path))
+    monkeypatch.setattr(server, "ACTAS_X_ACCEL_PREFIX", "")
+    await server.acta_storage.save("ACTA-0001.pdf", PDF, "application/pdf")
+    await db.actas.insert_one({"id": "acta-1", "assignment_id": "asg-1", "pdf_filename": "ACTA-0001.pdf"})
+    return "/api/actas/acta-1/download"
+
+
+async def test_full_download_carries_cache_headers(client, acta):
+    response = await client.get(acta)
+
+    assert response.status_code == 200
+    assert response.content == PDF
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["cache-control"] == "private, max-age=86400"
+    assert response.headers["etag"] and response.headers["last-modified"]
+
+
+async def test_range_resumes_download(client, acta):
+    response = await client.get(acta, headers={"Range": "bytes=100-"})
+
+    assert response.status_code == 206
+    assert response.content == PDF[100:]
+    assert response.headers["content-range"] == f"bytes 100-{len(PDF) - 1}/{len(PDF)}"
+    assert response.headers["content-length"] == str(len(PDF) - 100)
+
+
+async def test_unsatisfiable_range_is_416(client, acta):
+    response = await client.get(acta, headers={"Range": f"bytes={len(PDF)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(PDF)}"
+
+
+async def test_conditional_requests_get_304(client, acta):
+    first = await client.get(acta)
+
+    by_etag = await client.get(acta, headers={"If-None-Match": first.headers["etag"]})
+    by_date = await client.get(acta, headers={"If-Modified-Since": first.headers["last-modified"]})
+
+    assert by_etag.status_code == 304 and by_etag.content == b""
+    assert by_date.status_code == 304
+
+
+async def test_stale_if_range_gets_the_whole_file(client, acta):
+    current = (await client.get(acta)).headers["etag"]
+
+    fresh = await client.get(acta, headers={"Range": "bytes=0-9", "If-Range": current})
+    stale = await client.get(acta, headers={"Range": "bytes=0-9", "If-Range": '"0-0"'})
+
+    assert fresh.status_code == 206 and fresh.content == PDF[:10]
+    assert stale.status_code == 200 and stale.content == PDF
+
+
+async def test_x_accel_redirect_hands_the_file_to_nginx(client, acta, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "ACTAS_X_ACCEL_PREFIX", "/protected-actas/")
+    response = await client.get(acta)
+
+    assert response.status_code == 200
+    assert response.headers["x-accel-redirect"] == "/protected-actas/ACTA-0001.pdf"
+    assert response.content == b""
@@ -0,0 +1,49 @@
+"""
+Local acta storage
+Files are written atomically and every filesystem call runs off the event loop.
+"""
+
+import threading
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def collect(chunks) -> bytes:
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def test_round_trip_and_ranges(tmp_path):
+    import server
+
+    storage = server.LocalActaStorage(tmp_path)
+    data = bytes(range(256)) * 1000
+    await storage.save("actas/ACTA-1.pdf", data, "application/pdf")
+
+    assert (await storage.stat("actas/ACTA-1.pdf"))["size"] == len(data)
+    assert await collect(storage.iter_chunks("actas/ACTA-1.pdf")) == data
+    assert await collect(storage.iter_chunks("actas/ACTA-1.pdf", 100, 199)) == data[100:200]
+    assert not list((tmp_path / "actas").glob(".upload-*"))
+
+    await storage.delete("actas/ACTA-1.pdf")
+    assert await storage.stat("actas/ACTA-1.pdf") is None
+    await storage.delete("actas/ACTA-1.pdf")
+
+
+async def test_file_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    import server
+
+    loop_thread = threading.current_thread()
+    opened_on = []
+
+    def tracking_open(*args, **kwargs):
+        opened_on.append(threading.current_thread())
+        return open(*args, **kwargs)
+
+    storage = server.LocalActaStorage(tmp_path)
+    await storage.save("ACTA-2.pdf", b"%PDF-1.4", "application/pdf")
+    monkeypatch.setattr(server, "open", tracking_open, raising=False)
+
+    assert await collect(storage.iter_chunks("ACTA-2.pdf")) == b"%PDF-1.4"
+    assert opened_on and loop_thread not in opened_on
@@ -0,0 +1,42 @@
+"""
+Acta ZIP bundles
+Entries are stored with their CRC and sizes in the local header (no data
+descriptors), which every ZIP reader accepts.
+"""
+
+import io
+import struct
+import zipfile
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_bundle_entries_have_sizes_in_local_headers(client, db, monkeypatch, tmp_path):
+    import server
+
+    monkeypatch.setattr(server, "acta_storage", server.LocalActaStorage(tmp_path))
+    pdfs = {"ACTA-0001.pdf": b"%PDF-1.4 " + b"a" * 70000, "ACTA-0002.pdf": b"%PDF-1.4 b"}
+    for filename, data in pdfs.items():
+        await server.acta_storage.save(filename, data, "application/pdf")
+    await db.assignments.insert_many([
+        {"id": f"asg-{i}", "created_at": f"2026-01-0{i}T10:00:00+00:00"} for i in (1, 2)
+    ])
+    await db.actas.insert_many([
+        {"id": f"acta-{i}", "assignment_id": f"asg-{i}", "pdf_filename": f"ACTA-000{i}.pdf",
+         "created_at": f"2026-01-0{i}T10:00:00+00:00"} for i in (1, 2)
+    ])
+
+    response = await client.get("/api/actas/bundle")
+
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    assert {info.filename: archive.read(info) for info in archive.infolist()} == {
+        f"actas/{name}": data for name, data in pdfs.items()
+    }
+    for info in archive.infolist():
+        signature, _, flags = struct.unpack("<IHH", response.content[info.header_offset:info.header_offset + 8])
+        assert signature == 0x04034B50
+        assert not flags & 0x08  # no data descriptor
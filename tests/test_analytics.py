@@ -0,0 +1,149 @@
+"""
+Utilization analytics
+Period boundaries (weeks start on Monday, months on the 1st, in UTC), stored
+buckets for periods that have ended, and the bucketing pipelines themselves.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("day, unit, start", [
+    (date(2026, 1, 4), "week", date(2025, 12, 29)),  # Sunday belongs to the week before
+    (date(2026, 1, 5), "week", date(2026, 1, 5)),
+    (date(2026, 1, 11), "week", date(2026, 1, 5)),
+    (date(2026, 1, 31), "month", date(2026, 1, 1)),
+    (date(2026, 2, 1), "month", date(2026, 2, 1)),
+    (date(2026, 3, 17), "day", date(2026, 3, 17)),
+])
+def test_period_start(day, unit, start):
+    import server
+
+    assert server.analytics_period_start(day, unit) == start
+
+
+@pytest.mark.parametrize("start, unit, following", [
+    (date(2025, 12, 29), "week", date(2026, 1, 5)),
+    (date(2026, 1, 1), "month", date(2026, 2, 1)),
+    (date(2024, 2, 1), "month", date(2024, 3, 1)),
+    (date(2025, 12, 1), "month", date(2026, 1, 1)),
+    (date(2024, 2, 28), "day", date(2024, 2, 29)),
+    (date(2025, 12, 31), "day", date(2026, 1, 1)),
+])
+def test_next_period(start, unit, following):
+    import server
+
+    assert server.analytics_next_period(start, unit) == following
+
+
+@pytest.fixture
+def aggregations(db, monkeypatch):
+    """Replace the pipelines with one unit assigned and a 2 hour confirmation
+    per period, recording which ranges get aggregated"""
+    import server
+
+    calls = []
+
+    async def aggregate(start, end, unit):
+        calls.append((start.isoformat(), end.isoformat()))
+        buckets = {}
+        period = start
+        while period < end:
+            buckets[period.isoformat()] = {
+                "assigned": [{"category": "Balones", "discipline": "Fútbol", "quantity": 1}],
+                "goods": [{"good_id": "good-1", "good_name": "Balón", "quantity": 1, "lines": 1}],
+                "confirmations": 1,
+                "confirm_seconds": 7200
+            }
+            period = server.analytics_next_period(period, unit)
+        return buckets
+
+    monkeypatch.setattr(server, "aggregate_analytics_buckets", aggregate)
+    return calls
+
+
+async def test_range_is_widened_to_whole_periods(client, aggregations):
+    response = await client.get("/api/analytics/utilization", params={
+        "unit": "week", "date_from": "2026-01-07", "date_to": "2026-01-20"
+    })
+
+    body = response.json()
+    assert (body["date_from"], body["date_to"]) == ("2026-01-05", "2026-01-25")
+    assert [p["period"] for p in body["periods"]] == ["2026-01-05", "2026-01-12", "2026-01-19"]
+    assert body["items_assigned"] == 3 and body["avg_confirm_hours"] == 2
+    assert body["top_goods"] == [{"good_id": "good-1", "good_name": "Balón", "quantity": 3, "lines": 3}]
+
+
+async def test_ended_periods_are_aggregated_once(client, db, aggregations):
+    params = {"unit": "month", "date_from": "2025-01-01", "date_to": "2025-03-31"}
+
+    first = await client.get("/api/analytics/utilization", params=params)
+    second = await client.get("/api/analytics/utilization", params=params)
+
+    assert aggregations == [("2025-01-01", "2025-04-01")]
+    assert first.json() == second.json()
+    assert await db.analytics_buckets.count_documents({"unit": "month"}) == 3
+
+
+async def test_current_period_is_aggregated_every_time(client, db, aggregations):
+    import server
+
+    today = datetime.now(timezone.utc).date()
+    current = server.analytics_period_start(today, "week")
+    params = {"unit": "week", "date_from": (current - timedelta(days=7)).isoformat()}
+
+    await client.get("/api/analytics/utilization", params=params)
+    response = await client.get("/api/analytics/utilization", params=params)
+
+    following = server.analytics_next_period(current, "week").isoformat()
+    assert aggregations[1] == (current.isoformat(), following)
+    assert [p["complete"] for p in response.json()["periods"]] == [True, False]
+    assert await db.analytics_buckets.count_documents({"period": current.isoformat()}) == 0
+
+
+async def test_invalid_ranges_are_rejected(client, aggregations, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "ANALYTICS_MAX_PERIODS", 3)
+    for params in (
+        {"unit": "year"},
+        {"date_from": "05/01/2026"},
+        {"date_from": "2026-02-01", "date_to": "2026-01-01"},
+        {"unit": "day", "date_from": "2026-01-01", "date_to": "2026-01-04"},
+    ):
+        response = await client.get("/api/analytics/utilization", params=params)
+        assert response.status_code == 400, params
+    assert aggregations == []
+
+
+async def test_pipelines_bucket_on_utc_boundaries(client, mongod):
+    await mongod.assignments.insert_many([
+        {"id": "asg-sun", "discipline": "Fútbol", "created_at": "2026-01-04T23:59:59.999999+00:00"},
+        {"id": "asg-mon", "discipline": "Fútbol", "created_at": "2026-01-05T00:00:00+00:00",
+         "confirmed_at": "2026-01-05T03:00:00.5+00:00"},
+        {"id": "asg-feb", "discipline": "Natación", "created_at": "2026-02-01T00:00:00+00:00",
+         "confirmed_at": "2026-02-01T01:00:00+00:00"},
+    ])
+    await mongod.assignment_details.insert_many([
+        {"id": f"det-{i}", "assignment_id": assignment_id, "good_id": "good-1", "good_name": "Balón",
+         "category_name": "Balones", "quantity_assigned": quantity}
+        for i, (assignment_id, quantity) in enumerate((("asg-sun", 1), ("asg-mon", 2), ("asg-feb", 4)))
+    ])
+
+    weeks = (await client.get("/api/analytics/utilization", params={
+        "unit": "week", "date_from": "2025-12-29", "date_to": "2026-01-11"
+    })).json()
+    months = (await client.get("/api/analytics/utilization", params={
+        "unit": "month", "date_from": "2026-01-01", "date_to": "2026-02-28"
+    })).json()
+
+    assert [(p["period"], p["items_assigned"]) for p in weeks["periods"]] == [("2025-12-29", 1), ("2026-01-05", 2)]
+    assert weeks["periods"][1]["avg_confirm_hours"] == 3
+    assert [(p["period"], p["items_assigned"], p["confirmations"]) for p in months["periods"]] == [
+        ("2026-01-01", 3, 1), ("2026-02-01", 4, 1)
+    ]
+    assert months["avg_confirm_hours"] == 2
+    assert months["periods"][1]["assigned"] == [{"category": "Balones", "discipline": "Natación", "quantity": 4}]
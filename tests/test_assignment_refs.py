@@ -0,0 +1,90 @@
+"""
+Assignment filters by instructor and sport reference
+The names stored on assignments are display snapshots, so filters match on
+instructor_id/sport_id even after a rename.
+"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def assignments(db):
+    await db.instructors.insert_one({"id": "ins-1", "name": "Ana Pérez", "active": True})
+    await db.sports.insert_one({"id": "sport-1", "name": "Natación", "active": True})
+    await db.assignments.insert_many([{
+        "id": f"asg-{i}",
+        "instructor_id": "ins-1" if i < 3 else "ins-2",
+        # Snapshot taken before the instructor was renamed
+        "instructor_name": "Ana P.",
+        "sport_id": "sport-1",
+        "discipline": "Natación",
+        "status": "Pendiente",
+        "created_at": f"2026-01-0{i + 1}T10:00:00+00:00"
+    } for i in range(5)])
+
+
+@pytest.mark.parametrize("params", [
+    {"instructor_id": "ins-1"},
+    {"instructor_name": "Ana Pérez"},
+    {"instructor_id": "ins-1", "sport_id": "sport-1"},
+])
+async def test_report_filters_on_ids(client, assignments, params):
+    response = await client.get("/api/reports", params={"report_type": "assignments", **params})
+    assert response.status_code == 200
+    assert sorted(a["id"] for a in response.json()) == ["asg-0", "asg-1", "asg-2"]
+
+
+async def test_unknown_name_matches_nothing(client, assignments):
+    response = await client.get("/api/reports", params={"report_type": "assignments", "instructor_name": "Ana P."})
+    assert response.status_code == 200
+    assert response.json() == []
+
+    response = await client.get("/api/actas/bundle", params={"discipline": "Fútbol"})
+    assert response.status_code == 404
+
+
+async def test_cached_report_follows_instructor_rename(client, assignments, db):
+    params = {"report_type": "assignments", "instructor_name": "Ana Pérez"}
+    response = await client.get("/api/reports", params=params)
+    assert len(response.json()) == 3
+
+    # A different instructor takes the name; no assignment changes
+    await db.instructors.update_one({"id": "ins-1"}, {"$set": {"name": "Ana María Pérez"}})
+    await db.instructors.insert_one({"id": "ins-3", "name": "Ana Pérez", "active": True})
+
+    response = await client.get("/api/reports", params=params)
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+async def test_startup_backfill_links_legacy_assignments(db):
+    import server
+
+    await db.instructors.insert_one({"id": "ins-1", "name": "Ana Pérez", "active": True})
+    await db.sports.insert_one({"id": "sport-1", "name": "Natación", "active": True})
+    await db.assignments.insert_many([
+        {"id": "old-1", "instructor_name": "Ana Pérez", "discipline": "Natación", "status": "Pendiente"},
+        {"id": "old-2", "instructor_name": "Luis Gómez", "discipline": "Natación", "status": "Pendiente"},
+    ])
+
+    await server.backfill_assignment_refs_once()
+
+    linked = await db.assignments.find_one({"id": "old-1"})
+    assert (linked["instructor_id"], linked["sport_id"]) == ("ins-1", "sport-1")
+    unmatched = await db.assignments.find_one({"id": "old-2"})
+    assert unmatched["instructor_id"] is None
+    assert await db.app_state.find_one({"id": server.ASSIGNMENT_REFS_MARKER_ID})
+
+
+async def test_delete_guard_counts_assignments_without_id(client, db):
+    await db.instructors.insert_one({"id": "ins-9", "name": "Luis Gómez", "active": True})
+    # Left without an id because the name matched no instructor at backfill time
+    await db.assignments.insert_one(
+        {"id": "old-2", "instructor_id": None, "instructor_name": "Luis Gómez", "sport_id": None, "discipline": "Remo"}
+    )
+
+    response = await client.delete("/api/instructors-management/ins-9")
+    assert response.status_code == 400
+    assert await db.instructors.count_documents({"id": "ins-9"}) == 1
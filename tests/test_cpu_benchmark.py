@@ -0,0 +1,102 @@
+"""
+CPU microbenchmarks
+The I/O-free report builders they exercise, the measurement and baseline
+gate of benchmarks/cpu_benchmark.py, and a tiny end-to-end run.
+"""
+
+import importlib.util
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "benchmarks" / "cpu_benchmark.py"
+
+
+@pytest.fixture(scope="module")
+def cpu_benchmark():
+    spec = importlib.util.spec_from_file_location("cpu_benchmark", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_inventory_report_names_categories():
+    import server
+
+    goods = [{"id": "good-1", "category_id": "cat-1"}, {"id": "good-2", "category_id": "gone"}]
+    report = server.build_inventory_report(goods, [{"id": "cat-1", "name": "Balones"}])
+
+    assert [g["category_name"] for g in report] == ["Balones", "N/A"]
+
+
+def test_assignments_report_groups_details():
+    import server
+
+    assignments = [{"id": "asg-1"}, {"id": "asg-2"}, {"id": "asg-3"}]
+    details = [
+        {"id": "det-1", "assignment_id": "asg-1"},
+        {"id": "det-2", "assignment_id": "asg-3"},
+        {"id": "det-3", "assignment_id": "asg-1"},
+    ]
+    report = server.build_assignments_report(assignments, details)
+
+    assert {a["id"]: [d["id"] for d in a["details"]] for a in report} == {
+        "asg-1": ["det-1", "det-3"], "asg-2": [], "asg-3": ["det-2"]
+    }
+
+
+def test_measure_reports_throughput_memory_and_pdf_size(cpu_benchmark):
+    case = cpu_benchmark.Case("bytes", lambda: 3, lambda n: b"x" * 1000 * n, items=4)
+
+    result = cpu_benchmark.measure(case, rounds=3, warmup=1)
+
+    assert result["rounds"] == 3
+    assert result["min_ms"] <= result["median_ms"]
+    assert result["ops_per_s"] == pytest.approx(4 / (result["median_ms"] / 1000))
+    assert result["peak_kb"] > 0
+    assert result["bytes_per_pdf"] == 750
+
+
+def test_regressions_beyond_tolerance(cpu_benchmark):
+    baseline = {"results": {
+        "acta": {"ops_per_s": 100.0, "peak_kb": 1000.0, "bytes_per_pdf": 4000.0},
+        "report": {"ops_per_s": 10.0, "peak_kb": 500.0},
+    }}
+    results = {
+        "acta": {"ops_per_s": 86.0, "peak_kb": 1140.0, "bytes_per_pdf": 4700.0},
+        "report": {"ops_per_s": 8.0, "peak_kb": 600.0},
+    }
+
+    assert cpu_benchmark.compare_with_baseline(results, baseline, 0.15) == [
+        "acta: 4700 B/pdf vs 4000 B/pdf",
+        "report: 8.0 ops/s vs 10.0",
+        "report: peak 600 KB vs 500 KB",
+    ]
+
+
+def test_tiny_run_saves_and_checks_a_baseline(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    sizes = [
+        "--lines", "1", "5", "--batch", "2", "--goods", "20", "--assignments", "10",
+        "--forecast-goods", "5", "--forecast-weeks", "4", "--rounds", "1", "--warmup", "0"
+    ]
+
+    saved = subprocess.run(
+        [sys.executable, str(SCRIPT), *sizes, "--save-baseline", str(baseline)],
+        capture_output=True, text=True, timeout=120
+    )
+    assert saved.returncode == 0, saved.stderr
+    assert sorted(json.loads(baseline.read_text())["results"]) == [
+        "acta_print_run[actas=2]", "acta_render[lines=1]", "acta_render[lines=5]",
+        "assignments_report[assignments=10]", "demand_forecast[goods=5,weeks=4]",
+        "inventory_report[goods=20]",
+    ]
+
+    checked = subprocess.run(
+        [sys.executable, str(SCRIPT), *sizes, "--baseline", str(baseline), "--tolerance", "100"],
+        capture_output=True, text=True, timeout=120
+    )
+    assert checked.returncode == 0, checked.stdout + checked.stderr
@@ -0,0 +1,73 @@
+"""
+Event stream authentication
+Only short-lived stream tickets are accepted in the URL, and a ticket opens
+nothing but the stream.
+"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_ticket_authenticates_stream_only(client):
+    import server
+
+    response = await client.post("/api/events/ticket")
+    assert response.status_code == 200
+    ticket = response.json()["ticket"]
+
+    user = await server.user_from_events_ticket(ticket)
+    assert user["email"] == "admin@academia.com"
+
+    response = await client.get("/api/goods", headers={"Authorization": f"Bearer {ticket}"})
+    assert response.status_code == 401
+
+
+async def test_stream_rejects_session_token_in_url(client):
+    token = client.headers["Authorization"][7:]
+    client.headers.pop("Authorization")
+
+    response = await client.get("/api/events/stream", params={"ticket": token})
+    assert response.status_code == 401
+    response = await client.get("/api/events/stream", params={"token": token})
+    assert response.status_code == 401
+
+
+async def test_expired_ticket_is_refused(client, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "EVENTS_TICKET_SECONDS", -1)
+    ticket = (await client.post("/api/events/ticket")).json()["ticket"]
+    client.headers.pop("Authorization")
+
+    response = await client.get("/api/events/stream", params={"ticket": ticket})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Ticket expired"
+
+
+async def test_forged_or_foreign_ticket_is_refused(client):
+    from datetime import datetime, timedelta, timezone
+
+    import jwt
+
+    import server
+
+    expires = datetime.now(timezone.utc) + timedelta(seconds=60)
+    forged = jwt.encode({"sub": "admin@academia.com", "type": "stream", "exp": expires}, "other-key", algorithm="HS256")
+    unknown = jwt.encode({"sub": "gone@academia.com", "type": "stream", "exp": expires}, server.SECRET_KEY, algorithm="HS256")
+    client.headers.pop("Authorization")
+
+    response = await client.get("/api/events/stream", params={"ticket": forged})
+    assert (response.status_code, response.json()["detail"]) == (401, "Invalid ticket")
+    response = await client.get("/api/events/stream", params={"ticket": unknown})
+    assert (response.status_code, response.json()["detail"]) == (401, "User not found")
+
+
+async def test_instructors_get_no_ticket(client, db):
+    import server
+
+    await db.instructors.insert_one({"id": "ins-1", "name": "Ana", "email": "ana@academia.com", "active": True})
+    token = server.create_access_token({"sub": "ana@academia.com", "type": "instructor"})
+
+    response = await client.post("/api/events/ticket", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 403
@@ -0,0 +1,130 @@
+"""
+Health and readiness
+MONGO_* variables become driver options, /health always answers, and /ready
+returns 503 naming each failing check.
+"""
+
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def test_mongo_options_come_from_the_environment(monkeypatch):
+    import server
+
+    for name in [*server.MONGO_INT_OPTIONS, *server.MONGO_STR_OPTIONS, "MONGO_WRITE_CONCERN"]:
+        monkeypatch.delenv(name, raising=False)
+    assert server.mongo_client_options() == {}
+
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "50")
+    monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2500")
+    monkeypatch.setenv("MONGO_COMPRESSORS", "zlib")
+    monkeypatch.setenv("MONGO_WRITE_CONCERN", "majority")
+    assert server.mongo_client_options() == {
+        "maxPoolSize": 50, "waitQueueTimeoutMS": 2500, "compressors": "zlib", "w": "majority"
+    }
+
+    monkeypatch.setenv("MONGO_WRITE_CONCERN", "2")
+    assert server.mongo_client_options()["w"] == 2
+
+
+async def test_task_state():
+    import server
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    running = asyncio.create_task(asyncio.sleep(10))
+    failed = asyncio.create_task(fail())
+    cancelled = asyncio.create_task(asyncio.sleep(10))
+    cancelled.cancel()
+    await asyncio.gather(failed, cancelled, return_exceptions=True)
+
+    assert server.task_state(None) == "disabled"
+    assert server.task_state(running) == "running"
+    assert server.task_state(failed) == "failed"
+    assert server.task_state(cancelled) == "stopped"
+    running.cancel()
+
+
+class PingDatabase:
+    """Stands in for server.db in /ready: a ping that can be slow or fail"""
+    def __init__(self):
+        self.delay = 0.0
+        self.error = None
+
+    async def command(self, name):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"ok": 1}
+
+
+@pytest.fixture
+async def readiness(client, monkeypatch, tmp_path):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    import server
+
+    database = PingDatabase()
+    monkeypatch.setattr(server, "db", database)
+    # Only its pool options are read; the client never connects
+    monkeypatch.setattr(server, "client", AsyncIOMotorClient("mongodb://localhost:27017", maxPoolSize=7))
+    monkeypatch.setattr(server, "acta_storage", server.LocalActaStorage(tmp_path))
+    monkeypatch.setattr(server, "READY_MIN_FREE_DISK_MB", 0)
+    return database
+
+
+async def test_health_always_answers(client):
+    response = await client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+
+
+async def test_ready_reports_every_check(client, readiness):
+    response = await client.get("/ready")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready" and body["failing"] == []
+    assert body["checks"]["mongo_pool"]["max_size"] == 7
+    assert set(body["checks"]) == {"mongo", "mongo_pool", "workers", "tasks", "disk"}
+    assert body["checks"]["tasks"] == {"stock_checkpoints": "disabled", "change_stream": "disabled", "report_jobs": "disabled"}
+
+
+async def test_ready_fails_on_slow_or_broken_mongo(client, readiness, monkeypatch):
+    import server
+
+    readiness.delay = 0.02
+    monkeypatch.setattr(server, "READY_MAX_PING_MS", 10)
+    slow = await client.get("/ready")
+
+    readiness.delay = 0
+    readiness.error = ConnectionError("no route to host")
+    broken = await client.get("/ready")
+
+    assert slow.status_code == 503 and slow.json()["failing"] == ["mongo"]
+    assert broken.status_code == 503 and broken.json()["checks"]["mongo"] == {"error": "no route to host"}
+
+
+async def test_ready_fails_when_resources_run_out(client, readiness, monkeypatch):
+    import server
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    failed_task = asyncio.create_task(fail())
+    await asyncio.gather(failed_task, return_exceptions=True)
+    monkeypatch.setattr(server, "_report_worker_task", failed_task)
+    monkeypatch.setattr(server, "READY_MAX_POOL_WAITING", -1)
+    monkeypatch.setattr(server, "THREAD_POOL_SIZE", 0)
+    monkeypatch.setattr(server, "READY_MIN_FREE_DISK_MB", 10 ** 12)
+
+    response = await client.get("/ready")
+
+    assert response.status_code == 503
+    assert response.json()["failing"] == ["mongo_pool", "workers", "tasks", "disk"]
+    assert response.json()["checks"]["tasks"]["report_jobs"] == "failed"
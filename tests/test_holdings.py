@@ -0,0 +1,95 @@
+"""
+Instructor holdings
+Creating, confirming and returning assignments keep instructor_holdings in
+step, and manage.py reconcile-holdings rebuilds it from open assignments.
+"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def catalog(db, monkeypatch, tmp_path):
+    import server
+
+    monkeypatch.setattr(server, "acta_storage", server.LocalActaStorage(tmp_path))
+    monkeypatch.setattr(server, "load_acta_logo", lambda: None)
+    monkeypatch.setattr(server, "_acta_resources", None)
+    await db.instructors.insert_one({"id": "ins-1", "name": "Ana Pérez", "email": "ana@academia.com", "active": True})
+    await db.sports.insert_one({"id": "sport-1", "name": "Natación", "active": True})
+    await db.categories.insert_one({"id": "cat-1", "name": "Flotadores"})
+    await db.goods.insert_many([
+        {"id": good_id, "name": name, "description": "", "category_id": "cat-1", "quantity": 10, "available_quantity": 10}
+        for good_id, name in (("good-a", "Tabla"), ("good-b", "Pullbuoy"))
+    ])
+
+
+async def assign(client, *lines) -> str:
+    response = await client.post("/api/assignments", json={
+        "instructor_id": "ins-1", "sport_id": "sport-1",
+        "details": [{"good_id": good_id, "quantity_assigned": quantity} for good_id, quantity in lines]
+    })
+    assert response.status_code == 200
+    return response.json()["assignment_id"]
+
+
+async def holdings(client) -> dict:
+    response = await client.get("/api/holdings", params={"instructor_id": "ins-1"})
+    return {h["good_id"]: (h["quantity"], h["quantity_confirmed"]) for h in response.json()}
+
+
+async def test_holdings_follow_assignment_lifecycle(client, catalog):
+    import server
+
+    first = await assign(client, ("good-a", 3))
+    second = await assign(client, ("good-a", 2), ("good-b", 1))
+    assert await holdings(client) == {"good-a": (5, 0), "good-b": (1, 0)}
+
+    instructor = {"Authorization": "Bearer " + server.create_access_token({"sub": "ana@academia.com", "type": "instructor"})}
+    response = await client.post(f"/api/instructor/confirm-reception/{first}", headers=instructor)
+    assert response.status_code == 200
+    assert await holdings(client) == {"good-a": (5, 3), "good-b": (1, 0)}
+
+    mine = await client.get("/api/instructor/my-holdings", headers=instructor)
+    assert [(h["good_name"], h["quantity"]) for h in mine.json()] == [("Pullbuoy", 1), ("Tabla", 5)]
+
+    assert (await client.post(f"/api/assignments/{first}/return", json={})).status_code == 200
+    assert await holdings(client) == {"good-a": (2, 0), "good-b": (1, 0)}
+
+    assert (await client.post(f"/api/assignments/{second}/return", json={})).status_code == 200
+    assert await holdings(client) == {}
+
+
+async def test_second_return_changes_nothing(client, db, catalog):
+    assignment_id = await assign(client, ("good-a", 3))
+
+    assert (await client.post(f"/api/assignments/{assignment_id}/return", json={})).status_code == 200
+    assert (await client.post(f"/api/assignments/{assignment_id}/return", json={})).status_code == 400
+
+    good = await db.goods.find_one({"id": "good-a"})
+    assert good["available_quantity"] == 10
+    assert await holdings(client) == {}
+
+
+async def test_reconcile_rebuilds_drifted_holdings(client, db, catalog, monkeypatch):
+    import manage
+
+    monkeypatch.setattr(manage, "db", db)
+    await assign(client, ("good-a", 3), ("good-b", 1))
+    expected = await holdings(client)
+
+    await db.instructor_holdings.update_one({"good_id": "good-a"}, {"$set": {"quantity": 99}})
+    await db.instructor_holdings.delete_one({"good_id": "good-b"})
+    await db.instructor_holdings.insert_one({
+        "instructor_id": "ins-1", "good_id": "good-gone", "quantity": 4, "quantity_confirmed": 0
+    })
+
+    drifted = await holdings(client)
+    assert drifted == {"good-a": (99, 0), "good-gone": (4, 0)}
+
+    assert await manage.reconcile_holdings(True) == 0
+    assert await holdings(client) == drifted
+
+    assert await manage.reconcile_holdings(False) == 0
+    assert await holdings(client) == expected
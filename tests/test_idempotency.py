@@ -0,0 +1,158 @@
+"""
+Idempotency-Key handling
+Retries with the same key run the endpoint once and get the stored response
+back; a retry that overlaps the first request waits for it.
+"""
+
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+ADMIN_EMAIL = "admin@academia.com"
+
+
+@pytest.fixture
+def slow_audit(monkeypatch):
+    """Hold every request at its audit log write, so concurrent retries overlap"""
+    import server
+
+    create_audit_log = server.create_audit_log
+
+    async def delayed(*args, **kwargs):
+        await asyncio.sleep(0.2)
+        await create_audit_log(*args, **kwargs)
+
+    monkeypatch.setattr(server, "create_audit_log", delayed)
+
+
+def stored_key(path: str, client_key: str, method: str = "POST") -> str:
+    return hashlib.sha256(f"{ADMIN_EMAIL}\n{method}\n{path}\n{client_key}".encode()).hexdigest()
+
+
+async def test_concurrent_duplicate_is_replayed(client, db, slow_audit):
+    payload = {"name": "Balones", "description": "Material"}
+    headers = {"Idempotency-Key": "cat-1"}
+
+    first, second = await asyncio.gather(
+        client.post("/api/categories", json=payload, headers=headers),
+        client.post("/api/categories", json=payload, headers=headers),
+    )
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    replayed = [r.headers.get("idempotency-replayed") for r in (first, second)]
+    assert sorted(replayed, key=str) == [None, "true"]
+    assert await db.categories.count_documents({}) == 1
+
+
+async def test_same_key_with_different_body_is_rejected(client, db):
+    headers = {"Idempotency-Key": "cat-2"}
+    response = await client.post("/api/categories", json={"name": "Conos", "description": ""}, headers=headers)
+    assert response.status_code == 200
+
+    response = await client.post("/api/categories", json={"name": "Petos", "description": ""}, headers=headers)
+    assert response.status_code == 422
+    assert await db.categories.count_documents({}) == 1
+
+
+async def test_failed_request_releases_key(client, db):
+    headers = {"Idempotency-Key": "cat-3"}
+    response = await client.post("/api/categories", json={"description": "Sin nombre"}, headers=headers)
+    assert response.status_code == 422
+    assert await db.idempotency_keys.count_documents({}) == 0
+
+    # The corrected request runs under the same key
+    response = await client.post("/api/categories", json={"name": "Conos", "description": ""}, headers=headers)
+    assert response.status_code == 200
+    assert "idempotency-replayed" not in response.headers
+    assert await db.categories.count_documents({}) == 1
+
+
+async def test_lapsed_lock_is_reclaimed(client, db):
+    now = datetime.now(timezone.utc)
+    await db.idempotency_keys.insert_one({
+        "key": stored_key("/api/categories", "cat-4"),
+        "status": "processing",
+        "locked_until": now - timedelta(seconds=1),
+        "expires_at": now + timedelta(hours=1)
+    })
+
+    response = await client.post("/api/categories", json={"name": "Vallas", "description": ""}, headers={"Idempotency-Key": "cat-4"})
+    assert response.status_code == 200
+    assert "idempotency-replayed" not in response.headers
+    record = await db.idempotency_keys.find_one({"key": stored_key("/api/categories", "cat-4")})
+    assert record["status"] == "completed"
+
+
+async def test_live_lock_times_out(client, db, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "IDEMPOTENCY_WAIT_SECONDS", 0.2)
+    now = datetime.now(timezone.utc)
+    await db.idempotency_keys.insert_one({
+        "key": stored_key("/api/categories", "cat-5"),
+        "status": "processing",
+        "locked_until": now + timedelta(minutes=5),
+        "expires_at": now + timedelta(hours=1)
+    })
+
+    response = await client.post("/api/categories", json={"name": "Vallas", "description": ""}, headers={"Idempotency-Key": "cat-5"})
+    assert response.status_code == 409
+    assert await db.categories.count_documents({}) == 0
+
+
+async def test_concurrent_retries_create_one_assignment(client, db, slow_audit, monkeypatch, tmp_path):
+    import server
+
+    monkeypatch.setattr(server, "acta_storage", server.LocalActaStorage(tmp_path))
+    await db.instructors.insert_one({"id": "ins-1", "name": "Ana Pérez", "active": True})
+    await db.sports.insert_one({"id": "sport-1", "name": "Natación", "active": True})
+    await db.categories.insert_one({"id": "cat-1", "name": "Flotadores"})
+    await db.goods.insert_one({
+        "id": "good-1",
+        "name": "Tabla",
+        "description": "Tabla de natación",
+        "category_id": "cat-1",
+        "status": "Bueno",
+        "quantity": 10,
+        "available_quantity": 10,
+        "location": "Bodega",
+        "responsible": "Administrador",
+        "created_at": "2026-01-01T00:00:00+00:00"
+    })
+    payload = {"instructor_id": "ins-1", "sport_id": "sport-1", "details": [{"good_id": "good-1", "quantity_assigned": 3}]}
+
+    responses = await asyncio.gather(*(
+        client.post("/api/assignments", json=payload, headers={"Idempotency-Key": "asg-2"})
+        for _ in range(4)
+    ))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.content for r in responses}) == 1
+    assert sum("idempotency-replayed" not in r.headers for r in responses) == 1
+    assert await db.assignments.count_documents({}) == 1
+    good = await db.goods.find_one({"id": "good-1"})
+    assert good["available_quantity"] == 7
+
+
+async def test_idempotency_errors_carry_cors_headers(client, db):
+    headers = {"Idempotency-Key": "cat-6", "Origin": "http://localhost:3000"}
+    await client.post("/api/categories", json={"name": "Conos", "description": ""}, headers=headers)
+
+    response = await client.post("/api/categories", json={"name": "Petos", "description": ""}, headers=headers)
+    assert response.status_code == 422
+    assert "access-control-allow-origin" in response.headers
+
+
+async def test_preflight_skips_idempotency(client, db):
+    response = await client.options("/api/categories", headers={
+        "Origin": "http://localhost:3000",
+        "Access-Control-Request-Method": "POST",
+        "Idempotency-Key": "cat-7"
+    })
+    assert response.status_code == 200
+    assert await db.idempotency_keys.count_documents({}) == 0
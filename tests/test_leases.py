@@ -0,0 +1,46 @@
+"""
+Named leases that keep background work to a single worker
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_lease_is_exclusive_until_it_expires(db, monkeypatch):
+    monkeypatch.setattr(server, "WORKER_ID", "worker-a")
+    assert await server.acquire_lease("stock_checkpoints", 60)
+    assert await server.acquire_lease("stock_checkpoints", 60)  # renewal by the holder
+
+    monkeypatch.setattr(server, "WORKER_ID", "worker-b")
+    assert not await server.acquire_lease("stock_checkpoints", 60)
+
+    expired = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    await db.leases.update_one({"id": "stock_checkpoints"}, {"$set": {"expires_at": expired}})
+    assert await server.acquire_lease("stock_checkpoints", 60)
+    lease = await db.leases.find_one({"id": "stock_checkpoints"})
+    assert lease["holder"] == "worker-b"
+
+
+async def test_only_the_lease_holder_takes_checkpoints(db, monkeypatch):
+    taken = []
+
+    async def fake_checkpoint():
+        taken.append(server.WORKER_ID)
+        return {"taken_at": datetime.now(timezone.utc).isoformat(), "replayed_movements": 0}
+
+    async def stop_after_one_pass(seconds):
+        raise StopAsyncIteration
+
+    monkeypatch.setattr(server, "create_stock_checkpoint", fake_checkpoint)
+    monkeypatch.setattr(server.asyncio, "sleep", stop_after_one_pass)
+    for worker in ("worker-a", "worker-b"):
+        monkeypatch.setattr(server, "WORKER_ID", worker)
+        with pytest.raises(StopAsyncIteration):
+            await server.stock_checkpoint_loop()
+
+    assert taken == ["worker-a"]
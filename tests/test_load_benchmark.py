@@ -0,0 +1,74 @@
+"""
+Load benchmark
+Percentiles and the baseline regression gate, plus a tiny end-to-end run of
+benchmarks/load_benchmark.py against the in-memory stand-in.
+"""
+
+import importlib.util
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "benchmarks" / "load_benchmark.py"
+
+
+@pytest.fixture(scope="module")
+def load_benchmark():
+    spec = importlib.util.spec_from_file_location("load_benchmark", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_percentile(load_benchmark):
+    values = [float(v) for v in range(1, 101)]
+
+    assert load_benchmark.percentile(values, 50) == 50
+    assert load_benchmark.percentile(values, 95) == 95
+    assert load_benchmark.percentile(values, 99) == 99
+    assert load_benchmark.percentile([7.0], 99) == 7
+    assert load_benchmark.percentile([], 95) == 0
+
+
+def test_regressions_beyond_tolerance(load_benchmark):
+    baseline = {"results": {
+        "GET /api/goods": {"p95_ms": 10.0, "throughput_rps": 100.0},
+        "GET /api/reports": {"p95_ms": 50.0, "throughput_rps": 20.0},
+    }}
+    results = {
+        "GET /api/goods": {"p95_ms": 11.9, "throughput_rps": 80.1},
+        "GET /api/reports": {"p95_ms": 60.1, "throughput_rps": 15.9},
+        "GET /api/new": {"p95_ms": 999.0, "throughput_rps": 1.0},
+    }
+
+    assert load_benchmark.compare_with_baseline(results, baseline, 0.2) == [
+        "GET /api/reports: p95 50.0 ms -> 60.1 ms",
+        "GET /api/reports: throughput 20.0 -> 15.9 req/s",
+    ]
+
+
+def test_tiny_run_against_mongomock(tmp_path):
+    pytest.importorskip("mongomock_motor")
+    output = tmp_path / "results.json"
+    sizes = [
+        "--goods", "20", "--assignments", "10", "--categories", "2", "--disciplines", "2",
+        "--instructors", "3", "--users", "2", "--concurrency", "2", "--logins", "2",
+        "--creates", "2", "--reports", "2", "--inventory-reports", "1", "--dashboards", "2"
+    ]
+
+    run = subprocess.run(
+        [sys.executable, str(SCRIPT), *sizes, "--output", str(output)],
+        capture_output=True, text=True, timeout=120
+    )
+    assert run.returncode == 0, run.stderr
+
+    report = json.loads(output.read_text())
+    assert report["backend"] == "mongomock"
+    assert set(report["results"]) == {
+        "POST /api/auth/login", "POST /api/assignments", "GET /api/reports?assignments",
+        "GET /api/reports?inventory", "GET /api/dashboard/stats", "GET /api/goods"
+    }
+    assert all(result["errors"] == 0 for result in report["results"].values())
@@ -0,0 +1,99 @@
+"""
+Metrics
+Histograms render cumulative buckets in the Prometheus text format, and the
+middleware labels requests by route template rather than by raw path.
+"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Metrics created by a test register here instead of in the app's registry"""
+    import server
+
+    metrics = []
+    monkeypatch.setattr(server, "METRICS_REGISTRY", metrics)
+    return metrics
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    import server
+
+    latency = server.Histogram("test_latency_seconds", "Test latency", ("route",), buckets=(0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.3, 0.7, 3.0):
+        latency.observe(value, route="/api/goods")
+
+    assert registry == [latency]
+    assert latency.render().splitlines() == [
+        "# HELP test_latency_seconds Test latency",
+        "# TYPE test_latency_seconds histogram",
+        'test_latency_seconds_bucket{route="/api/goods",le="0.1"} 2',
+        'test_latency_seconds_bucket{route="/api/goods",le="0.5"} 3',
+        'test_latency_seconds_bucket{route="/api/goods",le="1.0"} 4',
+        'test_latency_seconds_bucket{route="/api/goods",le="+Inf"} 5',
+        'test_latency_seconds_sum{route="/api/goods"} 4.15',
+        'test_latency_seconds_count{route="/api/goods"} 5',
+    ]
+
+
+def test_label_values_are_escaped(registry):
+    import server
+
+    counter = server.Counter("test_total", "Test counter", ("name",))
+    counter.inc(name='say "hi"\\\n')
+
+    assert counter.samples() == ['test_total{name="say \\"hi\\"\\\\\\n"} 1']
+
+
+def test_gauge_tracks_work_in_progress(registry):
+    import server
+
+    gauge = server.Gauge("test_in_flight", "Test gauge", ("kind",))
+    with gauge.track(kind="pdf"):
+        with gauge.track(kind="pdf"):
+            assert gauge.value(kind="pdf") == 2
+    assert gauge.value(kind="pdf") == 0
+
+    with pytest.raises(RuntimeError):
+        with gauge.track(kind="email"):
+            raise RuntimeError
+    assert gauge.value(kind="email") == 0
+
+
+def requests_served(route: str, status: str) -> float:
+    import server
+
+    prefix = f'http_requests_total{{method="GET",route="{route}",status="{status}"}} '
+    samples = [line for line in server.HTTP_REQUESTS.samples() if line.startswith(prefix)]
+    return float(samples[0][len(prefix):]) if samples else 0
+
+
+async def test_requests_are_counted_per_route_template(client):
+    import server
+
+    route = "/api/actas/{acta_id}/download"
+    before = requests_served(route, "404")
+    unmatched = requests_served("unmatched", "404")
+
+    await client.get("/api/actas/missing-1/download")
+    await client.get("/api/actas/missing-2/download")
+    await client.get("/no/such/path")
+
+    assert requests_served(route, "404") == before + 2
+    assert requests_served("unmatched", "404") == unmatched + 1
+    assert server.HTTP_IN_FLIGHT.value(method="GET", route=route) == 0
+    assert f'http_request_duration_seconds_count{{method="GET",route="{route}"}}' in server.render_metrics()
+
+
+async def test_metrics_endpoint_honours_the_token(client, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "METRICS_TOKEN", "secret")
+
+    assert (await client.get("/metrics")).status_code == 401
+    response = await client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "# TYPE http_requests_total counter" in response.text
@@ -0,0 +1,100 @@
+"""
+Acta print runs
+Many actas render into one PDF, one page each, with the shared style sheet
+and logo built once per process.
+"""
+
+import re
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+PAGE = re.compile(rb"/Type /Page\b(?!s)")
+
+
+def acta(code: str, lines: int = 3) -> dict:
+    return {
+        "code": code,
+        "instructor_name": "Ana",
+        "discipline": "Natación",
+        "date": "01/01/2026 10:00",
+        "delivered_by": "Admin (admin@academia.com)",
+        "notes": "",
+        "lines": [(f"Bien {i}", "", i + 1) for i in range(lines)]
+    }
+
+
+@pytest.fixture
+def acta_resources(monkeypatch):
+    """Shared render resources without the network fetch for the logo"""
+    import server
+
+    loads = []
+
+    def load_acta_logo():
+        loads.append(1)
+        return None
+
+    monkeypatch.setattr(server, "load_acta_logo", load_acta_logo)
+    monkeypatch.setattr(server, "_acta_resources", None)
+    return loads
+
+
+def test_render_puts_each_acta_on_its_own_page(acta_resources):
+    import server
+
+    pdf = server.render_actas_pdf([acta("ACTA-1"), acta("ACTA-2"), acta("ACTA-3", lines=10)])
+
+    assert pdf.startswith(b"%PDF")
+    assert len(PAGE.findall(pdf)) == 3
+
+
+def test_resources_are_built_once(acta_resources):
+    import server
+
+    server.render_actas_pdf([acta("ACTA-1")])
+    server.render_actas_pdf([acta("ACTA-2")])
+
+    assert server.get_acta_resources() is server.get_acta_resources()
+    assert acta_resources == [1]
+
+
+@pytest.fixture
+async def assignments(db, acta_resources):
+    await db.assignments.insert_many([{
+        "id": f"asg-{i}",
+        "instructor_id": "ins-1",
+        "instructor_name": "Ana",
+        "discipline": "Natación",
+        "created_by": "admin@academia.com",
+        "created_at": f"2026-01-0{i}T10:00:00+00:00"
+    } for i in (1, 2, 3)])
+    await db.assignment_details.insert_many([{
+        "id": f"det-{i}",
+        "assignment_id": f"asg-{i}",
+        "good_name": "Balón",
+        "good_description": "",
+        "quantity_assigned": i
+    } for i in (1, 2, 3)])
+
+
+async def test_print_run_renders_matching_actas(client, assignments):
+    response = await client.post("/api/actas/print-run", json={"instructor_id": "ins-1"})
+    selected = await client.post("/api/actas/print-run", json={"assignment_ids": ["asg-1", "asg-3"]})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert len(PAGE.findall(response.content)) == 3
+    assert len(PAGE.findall(selected.content)) == 2
+
+
+async def test_print_run_needs_a_filter_and_stays_under_the_cap(client, assignments, monkeypatch):
+    import server
+
+    assert (await client.post("/api/actas/print-run", json={})).status_code == 400
+    assert (await client.post("/api/actas/print-run", json={"assignment_ids": ["missing"]})).status_code == 404
+
+    monkeypatch.setattr(server, "PRINT_RUN_MAX_ACTAS", 2)
+    response = await client.post("/api/actas/print-run", json={"instructor_id": "ins-1"})
+    assert response.status_code == 400
@@ -0,0 +1,147 @@
+"""
+On-demand profiling
+Which requests get sampled (admin X-Profile header, route prefixes, sample
+rate), the PROFILE_MAX_CONCURRENT cap, and the profiles kept on disk.
+"""
+
+import threading
+import time
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def scope(path: str, headers: dict = None) -> dict:
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": [(name.encode(), value.encode()) for name, value in (headers or {}).items()]
+    }
+
+
+@pytest.fixture
+def profiling(monkeypatch, tmp_path):
+    """Set the profiling settings without reading them from the database"""
+    import server
+
+    monkeypatch.setattr(server, "PROFILES_DIR", tmp_path)
+    monkeypatch.setattr(server, "_profiling_settings_loaded_at", float("inf"))
+
+    def configure(**settings):
+        monkeypatch.setattr(server, "_profiling_settings", server.ProfilingSettings(**settings))
+
+    return configure
+
+
+@pytest.mark.parametrize("draw, expected", [(0.0, True), (0.099, True), (0.1, False), (0.9, False)])
+async def test_sample_rate_decides_per_request(profiling, monkeypatch, draw, expected):
+    import server
+
+    profiling(enabled=True, sample_rate=0.1)
+    monkeypatch.setattr(server.random, "random", lambda: draw)
+
+    assert await server.ProfilingMiddleware(None).should_profile(scope("/api/goods")) is expected
+
+
+async def test_sampling_is_limited_to_route_prefixes(profiling, monkeypatch):
+    import server
+
+    profiling(enabled=True, sample_rate=1, routes=["/api/reports", "/api/dashboard"])
+    monkeypatch.setattr(server.random, "random", lambda: 0.5)
+    middleware = server.ProfilingMiddleware(None)
+
+    assert await middleware.should_profile(scope("/api/reports"))
+    assert await middleware.should_profile(scope("/api/dashboard/stats"))
+    assert not await middleware.should_profile(scope("/api/goods"))
+
+
+async def test_disabled_or_zero_rate_never_samples(profiling, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server.random, "random", lambda: 0.0)
+    middleware = server.ProfilingMiddleware(None)
+
+    profiling(enabled=False, sample_rate=1)
+    assert not await middleware.should_profile(scope("/api/goods"))
+    profiling(enabled=True, sample_rate=0)
+    assert not await middleware.should_profile(scope("/api/goods"))
+
+
+async def test_profile_header_needs_an_admin_token(client, db, profiling):
+    import server
+
+    await db.users.insert_one({"email": "ana@academia.com", "role": "instructor", "active": True})
+    admin = client.headers["Authorization"]
+    instructor = "Bearer " + server.create_access_token({"sub": "ana@academia.com"})
+    middleware = server.ProfilingMiddleware(None)
+
+    assert await middleware.should_profile(scope("/api/goods", {"x-profile": "1", "authorization": admin}))
+    assert not await middleware.should_profile(scope("/api/goods", {"x-profile": "1", "authorization": instructor}))
+    assert not await middleware.should_profile(scope("/api/goods", {"x-profile": "1", "authorization": "Bearer x"}))
+
+
+async def test_profiled_request_can_be_listed_and_downloaded(client, profiling, tmp_path):
+    response = await client.get("/api/goods", headers={"X-Profile": "1"})
+    profile_id = response.headers["x-profile-id"]
+
+    profiles = (await client.get("/api/admin/profiles")).json()
+    download = await client.get(f"/api/admin/profiles/{profile_id}")
+
+    assert [p["id"] for p in profiles] == [profile_id]
+    assert profiles[0]["path"] == "/api/goods" and profiles[0]["status"] == 200
+    assert download.status_code == 200
+    assert (await client.get("/api/admin/profiles/..%2Fserver")).status_code == 404
+
+
+async def test_requests_over_the_concurrency_cap_are_not_profiled(client, profiling, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "PROFILE_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(server, "_active_profiles", 1)
+    busy = await client.get("/api/goods", headers={"X-Profile": "1"})
+
+    monkeypatch.setattr(server, "_active_profiles", 0)
+    free = await client.get("/api/goods", headers={"X-Profile": "1"})
+
+    assert "x-profile-id" not in busy.headers
+    assert "x-profile-id" in free.headers
+    assert server._active_profiles == 0
+
+
+def test_sampler_records_busy_threads():
+    import server
+
+    stop = threading.Event()
+
+    def spin_in_worker():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=spin_in_worker, name="busy-worker")
+    profiler = server.SamplingProfiler(0.001)
+    worker.start()
+    profiler.start()
+    time.sleep(0.1)
+    profiler.stop()
+    stop.set()
+    worker.join()
+
+    assert profiler.samples > 0
+    assert any(stack.startswith("busy-worker;") and "spin_in_worker" in stack for stack in profiler.stacks)
+    assert not any(stack.startswith(server.PROFILER_THREAD_PREFIX) for stack in profiler.stacks)
+
+
+def test_only_the_latest_profiles_are_kept(profiling, monkeypatch, tmp_path):
+    import server
+
+    monkeypatch.setattr(server, "PROFILE_MAX_FILES", 2)
+    profiler = server.SamplingProfiler(0.001)
+    for profile_id in ("20260101T000000-00000001", "20260101T000001-00000002", "20260101T000002-00000003"):
+        server.write_profile(profile_id, profiler, {"id": profile_id})
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "20260101T000001-00000002.collapsed", "20260101T000001-00000002.json",
+        "20260101T000002-00000003.collapsed", "20260101T000002-00000003.json",
+    ]
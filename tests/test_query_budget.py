@@ -0,0 +1,106 @@
+"""
+MongoDB command budgets for the hot read endpoints
+Each endpoint is called over a dataset with more rows than its budget, so a
+query inside a loop fails the test. The budgets include the user lookup done
+by authentication.
+"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+ROWS = 25
+
+
+@pytest.fixture
+async def dataset(db):
+    categories = [{"id": f"cat-{i}", "name": f"Categoría {i}"} for i in range(3)]
+    goods = [{
+        "id": f"good-{i}",
+        "name": f"Bien {i}",
+        "description": "Material deportivo",
+        "category_id": f"cat-{i % 3}",
+        "status": "Bueno",
+        "quantity": 10,
+        "available_quantity": 8,
+        "location": "Bodega",
+        "responsible": "Administrador",
+        "created_at": "2026-01-01T00:00:00+00:00"
+    } for i in range(ROWS)]
+    assignments = [{
+        "id": f"asg-{i}",
+        "instructor_id": "ins-1",
+        "instructor_name": "Instructor",
+        "sport_id": "sport-1",
+        "discipline": "Fútbol",
+        "status": "Pendiente",
+        "created_at": f"2026-01-{i % 28 + 1:02d}T10:00:00+00:00"
+    } for i in range(ROWS)]
+    details = [{
+        "id": f"det-{i}-{j}",
+        "assignment_id": f"asg-{i}",
+        "good_id": f"good-{(i + j) % ROWS}",
+        "good_name": f"Bien {(i + j) % ROWS}",
+        "good_description": "Material deportivo",
+        "category_name": "Categoría 0",
+        "quantity_assigned": 1
+    } for i in range(ROWS) for j in range(2)]
+    actas = [{
+        "id": f"acta-{i}",
+        "code": f"ACTA-{i:08d}",
+        "assignment_id": f"asg-{i}",
+        "created_at": f"2026-01-{i % 28 + 1:02d}T10:00:00+00:00"
+    } for i in range(ROWS)]
+    await db.categories.insert_many(categories)
+    await db.goods.insert_many(goods)
+    await db.assignments.insert_many(assignments)
+    await db.assignment_details.insert_many(details)
+    await db.actas.insert_many(actas)
+
+
+async def test_goods_budget(client, dataset, query_budget):
+    response = await client.get("/api/goods")
+    assert response.status_code == 200
+    assert len(response.json()) == ROWS
+    query_budget(response, 2)
+
+
+async def test_dashboard_stats_budget(client, dataset, query_budget):
+    response = await client.get("/api/dashboard/stats")
+    assert response.status_code == 200
+    assert response.json()["total_goods"] == ROWS
+    query_budget(response, 5)
+
+
+async def test_assignments_budget(client, dataset, query_budget):
+    response = await client.get("/api/assignments")
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body) == ROWS
+    assert all(len(a["details"]) == 2 for a in body)
+    query_budget(response, 3)
+
+
+async def test_actas_budget(client, dataset, query_budget):
+    response = await client.get("/api/actas")
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body) == ROWS
+    assert all(acta["assignment"]["id"] == acta["assignment_id"] for acta in body)
+    query_budget(response, 3)
+
+
+@pytest.mark.parametrize("report_type", ["inventory", "assignments"])
+async def test_reports_budget(client, dataset, query_budget, report_type):
+    response = await client.get("/api/reports", params={"report_type": report_type})
+    assert response.status_code == 200
+    assert len(response.json()) == ROWS
+    query_budget(response, 4)
+
+
+async def test_cached_report_budget(client, dataset, query_budget):
+    await client.get("/api/reports", params={"report_type": "inventory"})
+    response = await client.get("/api/reports", params={"report_type": "inventory"})
+    assert response.status_code == 200
+    # Only the user lookup; the body and the data versions come from memory
+    query_budget(response, 1)
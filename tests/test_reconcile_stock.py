@@ -0,0 +1,86 @@
+"""
+Stock reconciliation against concurrent assignment writes
+"""
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def drifted_goods(db):
+    await db.goods.insert_many([
+        {"id": "good-a", "name": "Balón", "quantity": 10, "available_quantity": 10},
+        {"id": "good-b", "name": "Cono", "quantity": 10, "available_quantity": 9},  # one unit drifted
+    ])
+    await db.assignments.insert_one({"id": "asg-1", "status": "Pendiente"})
+    await db.assignment_details.insert_one({"id": "det-1", "assignment_id": "asg-1", "good_id": "good-a", "quantity_assigned": 3})
+    await db.goods.update_one({"id": "good-a"}, {"$inc": {"available_quantity": -3}})
+
+
+async def test_reconcile_fixes_drift(db, drifted_goods):
+    result = await server.reconcile_stock(True, "test")
+
+    assert [d["good_id"] for d in result["differences"]] == ["good-b"]
+    assert result["fixed"] == 1 and result["skipped"] == 0
+    good = await db.goods.find_one({"id": "good-b"})
+    assert good["available_quantity"] == 10
+
+
+async def test_write_between_reads_is_not_corrected(db, drifted_goods, monkeypatch):
+    """An assignment that lands after the goods read but before the outstanding
+    read looks like drift; the conditional fix must leave it alone"""
+    outstanding_by_good = server.outstanding_by_good
+
+    async def assignment_lands_in_between(good_ids):
+        await db.assignments.insert_one({"id": "asg-2", "status": "Pendiente"})
+        await db.assignment_details.insert_one({"id": "det-2", "assignment_id": "asg-2", "good_id": "good-a", "quantity_assigned": 2})
+        await db.goods.update_one({"id": "good-a"}, {"$inc": {"available_quantity": -2}})
+        return await outstanding_by_good(good_ids)
+
+    monkeypatch.setattr(server, "outstanding_by_good", assignment_lands_in_between)
+    result = await server.reconcile_stock(True, "test")
+
+    assert {d["good_id"] for d in result["differences"]} == {"good-a", "good-b"}
+    assert result["fixed"] == 1 and result["skipped"] == 1
+    good = await db.goods.find_one({"id": "good-a"})
+    assert good["available_quantity"] == 5  # 10 minus the 3 and 2 units assigned
+    movements = await db.stock_movements.find({"type": "conciliacion"}).to_list(None)
+    assert [m["good_id"] for m in movements] == ["good-b"]
+
+
+async def test_reconcile_during_create_assignment(client, db, monkeypatch, tmp_path):
+    """create_assignment takes the units from the good before it writes the
+    detail; a check that runs in between must not give them back"""
+    monkeypatch.setattr(server, "acta_storage", server.LocalActaStorage(tmp_path))
+    await db.instructors.insert_one({"id": "ins-1", "name": "Ana Pérez", "active": True})
+    await db.sports.insert_one({"id": "sport-1", "name": "Natación", "active": True})
+    await db.categories.insert_one({"id": "cat-1", "name": "Flotadores"})
+    await db.goods.insert_one({
+        "id": "good-c", "name": "Tabla", "description": "", "category_id": "cat-1",
+        "quantity": 10, "available_quantity": 10
+    })
+
+    collection_class = type(db.assignment_details)
+    insert_one = collection_class.insert_one
+    results = []
+
+    async def reconcile_before_detail(self, document, *args, **kwargs):
+        if self.name == "assignment_details" and not results:
+            results.append(await server.reconcile_stock(True, "test"))
+        return await insert_one(self, document, *args, **kwargs)
+
+    monkeypatch.setattr(collection_class, "insert_one", reconcile_before_detail)
+    response = await client.post("/api/assignments", json={
+        "instructor_id": "ins-1", "sport_id": "sport-1",
+        "details": [{"good_id": "good-c", "quantity_assigned": 3}]
+    })
+
+    assert response.status_code == 200
+    [difference] = results[0]["differences"]
+    assert difference["in_flight"] and not difference["fixed"]
+    assert results[0]["skipped"] == 1
+    good = await db.goods.find_one({"id": "good-c"})
+    assert good["available_quantity"] == 7
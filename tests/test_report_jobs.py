@@ -0,0 +1,83 @@
+"""
+Report job locking and report loading
+A running job keeps its lock alive, and a run that lost the lock to another
+worker does not record its result.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def queued_job(db, monkeypatch, tmp_path):
+    import server
+
+    monkeypatch.setattr(server, "acta_storage", server.LocalActaStorage(tmp_path))
+    await db.report_jobs.insert_one({
+        "id": "job-1",
+        "status": "queued",
+        "format": "json",
+        "params": {"report_type": "assignments"},
+        "created_by": "admin@academia.com",
+        "created_at": "2026-01-01T00:00:00+00:00"
+    })
+    return tmp_path
+
+
+async def test_heartbeat_keeps_running_job_locked(db, queued_job, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "REPORT_JOB_HEARTBEAT_SECONDS", 0.05)
+    job = await server.claim_report_job()
+    load_report = server.load_report
+
+    async def slow_load_report(**params):
+        # Let the lock lapse; the heartbeat must renew it before another claim
+        past = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+        await db.report_jobs.update_one({"id": "job-1"}, {"$set": {"locked_until": past}})
+        await asyncio.sleep(0.2)
+        assert await server.claim_report_job() is None
+        return await load_report(**params)
+
+    monkeypatch.setattr(server, "load_report", slow_load_report)
+    await server.run_report_job(job)
+
+    stored = await db.report_jobs.find_one({"id": "job-1"})
+    assert stored["status"] == "done"
+    assert (queued_job / stored["file_key"]).exists()
+
+
+async def test_taken_over_run_discards_its_result(db, queued_job):
+    import server
+
+    job = await server.claim_report_job()
+    await db.report_jobs.update_one({"id": "job-1"}, {"$set": {"lock_id": "other-run"}})
+
+    await server.run_report_job(job)
+
+    stored = await db.report_jobs.find_one({"id": "job-1"})
+    assert stored["status"] == "running"
+    assert not list((queued_job / "reports").glob("*"))
+
+
+async def test_assignments_report_loads_details_per_batch(db, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "REPORT_DETAILS_BATCH", 2)
+    await db.assignments.insert_many([
+        {"id": f"asg-{i}", "instructor_id": "ins-1", "created_at": f"2026-01-0{i + 1}T10:00:00+00:00"}
+        for i in range(5)
+    ])
+    await db.assignment_details.insert_many([
+        {"id": f"det-{i}", "assignment_id": f"asg-{i}", "good_id": "good-1", "quantity_assigned": 1}
+        for i in range(5)
+    ])
+
+    report = await server.load_report("assignments")
+
+    assert sorted(a["id"] for a in report) == [f"asg-{i}" for i in range(5)]
+    assert all([d["id"] for d in a["details"]] == [f"det-{a['id'][4:]}"] for a in report)
@@ -0,0 +1,168 @@
+"""
+Demand forecast and restock recommendations
+build_restock_forecast is checked on small histories with known answers:
+the weighted rate, safety stock, recent goods, seasonal peaks and ordering.
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+TODAY = date(2026, 11, 30)
+
+
+def good(good_id: str, available: int) -> dict:
+    return {"id": good_id, "name": good_id.title(), "category_id": "cat-1", "available_quantity": available}
+
+
+def history(demand: dict) -> dict:
+    """load_demand_history columns from {good_id: [(day, quantity), ...]}"""
+    import numpy as np
+
+    rows = [(good_id, day, quantity) for good_id, days in demand.items() for day, quantity in days]
+    return {
+        "good_ids": list(demand),
+        "lengths": np.array([len(days) for days in demand.values()], dtype=np.int64),
+        "days": np.array([day.isoformat() for _, day, _ in rows], dtype="datetime64[D]"),
+        "quantities": np.array([quantity for _, _, quantity in rows], dtype=np.float64)
+    }
+
+
+def daily(quantity, days: int, end: date = TODAY) -> list:
+    return [(end - timedelta(days=offset), quantity(end - timedelta(days=offset)) if callable(quantity) else quantity)
+            for offset in range(days)]
+
+
+def forecast(goods, demand, history_weeks, horizon_weeks, today=TODAY) -> dict:
+    import server
+
+    records = server.build_restock_forecast(
+        goods, [{"id": "cat-1", "name": "Balones"}], history(demand), today, history_weeks, horizon_weeks
+    )
+    return {record["good_id"]: record for record in records}
+
+
+def test_steady_demand(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "RESTOCK_SAFETY_Z", 1.65)
+    result = forecast([good("good-1", 10)], {"good-1": daily(1, 140)}, history_weeks=20, horizon_weeks=4)["good-1"]
+
+    assert result["weekly_demand"] == 7
+    assert result["weekly_deviation"] == 0
+    assert result["projected_demand"] == 28
+    assert result["safety_stock"] == 0
+    assert (result["shortfall"], result["recommended_restock"]) == (18, 18)
+    assert result["weeks_of_cover"] == 1.4
+    assert result["history_weeks"] == 20
+    assert result["category_name"] == "Balones"
+    assert result["peak_month"] is None
+
+
+def test_recent_weeks_weigh_more_and_variability_adds_safety_stock(monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "DEMAND_HALF_LIFE_WEEKS", 1)
+    monkeypatch.setattr(server, "RESTOCK_SAFETY_Z", 2)
+    # 3 units in the older week, 6 in the last one: weights 0.5 and 1
+    demand = {"good-1": [(TODAY - timedelta(days=10), 3), (TODAY - timedelta(days=2), 6)]}
+
+    result = forecast([good("good-1", 0)], demand, history_weeks=2, horizon_weeks=1)["good-1"]
+
+    assert result["weekly_demand"] == 5  # (0.5 * 3 + 6) / 1.5
+    assert result["weekly_deviation"] == 2.12  # sqrt(4.5)
+    assert result["safety_stock"] == 4.2  # 2 * sqrt(4.5)
+    assert (result["shortfall"], result["recommended_restock"]) == (9.2, 10)
+
+
+def test_new_goods_are_not_diluted_and_idle_goods_are_left_out():
+    goods = [good("good-new", 100), good("good-idle", 5)]
+    demand = {
+        "good-new": daily(1, 28),
+        "deleted-good": daily(5, 28),
+        "good-idle": [(TODAY - timedelta(weeks=30), 4)],  # before the window
+    }
+
+    result = forecast(goods, demand, history_weeks=20, horizon_weeks=4)
+
+    assert list(result) == ["good-new"]
+    assert result["good-new"]["history_weeks"] == 4
+    assert result["good-new"]["weekly_demand"] == 7
+    assert result["good-new"]["recommended_restock"] == 0
+
+
+def test_seasonal_peak_raises_the_projection_for_the_peak_month():
+    # Two years of 1 unit a day, 3 a day in December. The window holds 728
+    # days, 60 of them in December: 848 units, so December runs at
+    # 3 / (848 / 728) times the average daily demand
+    demand = {"good-1": daily(lambda day: 3 if day.month == 12 else 1, 728)}
+
+    result = forecast([good("good-1", 0)], demand, history_weeks=104, horizon_weeks=4)["good-1"]
+
+    assert result["peak_month"] == 12
+    assert result["peak_factor"] == round(3 * 728 / 848, 2)
+    assert result["horizon_factor"] == round(3 * 728 / 848, 2)  # the 4 weeks ahead are all December
+    assert result["weekly_demand"] == pytest.approx(7 * 848 / 728, rel=0.02)  # deseasonalized
+    assert result["projected_demand"] == pytest.approx(
+        result["weekly_demand"] * 4 * result["horizon_factor"], abs=0.5
+    )
+
+
+def test_no_seasonality_under_a_year_of_history():
+    demand = {"good-1": daily(lambda day: 3 if day.month == 11 else 1, 300)}
+
+    result = forecast([good("good-1", 0)], demand, history_weeks=43, horizon_weeks=4)["good-1"]
+
+    assert result["peak_month"] is None and result["horizon_factor"] == 1
+
+
+def test_recommendations_are_ordered_by_restock_then_cover():
+    goods = [good("good-ok", 500), good("good-short", 0), good("good-shorter", 0), good("good-tight", 30)]
+    demand = {
+        "good-ok": daily(1, 56),
+        "good-short": daily(1, 56),
+        "good-shorter": daily(2, 56),
+        "good-tight": daily(1, 56),
+    }
+
+    result = forecast(goods, demand, history_weeks=8, horizon_weeks=4)
+
+    assert list(result) == ["good-shorter", "good-short", "good-tight", "good-ok"]
+    assert [r["recommended_restock"] for r in result.values()] == [56, 28, 0, 0]
+
+
+def test_empty_inventory():
+    import server
+
+    assert server.build_restock_forecast([], [], history({}), TODAY, 8, 4) == []
+
+
+async def test_restock_endpoint_validates_windows(client):
+    for params in ({"horizon_weeks": 0}, {"horizon_weeks": 53}, {"history_weeks": 3}, {"history_weeks": 521}):
+        response = await client.get("/api/analytics/restock", params=params)
+        assert response.status_code == 400, params
+
+
+async def test_restock_endpoint_loads_history(client, mongod):
+    from datetime import datetime, timezone
+
+    today = datetime.now(timezone.utc).date()
+    await mongod.goods.insert_many([good("good-1", 3), good("good-2", 1000)])
+    await mongod.assignments.insert_many([
+        {"id": f"asg-{week}", "created_at": f"{today - timedelta(weeks=week)}T10:00:00+00:00"} for week in range(8)
+    ])
+    await mongod.assignment_details.insert_many([
+        {"id": f"det-{week}-{good_id}", "assignment_id": f"asg-{week}", "good_id": good_id, "quantity_assigned": 7}
+        for week in range(8) for good_id in ("good-1", "good-2")
+    ])
+
+    response = await client.get("/api/analytics/restock", params={"history_weeks": 8, "horizon_weeks": 4})
+
+    body = response.json()
+    assert body["goods_with_demand"] == 2 and body["goods_short"] == 1
+    [recommendation] = body["recommendations"]
+    assert recommendation["good_id"] == "good-1"
+    assert recommendation["weekly_demand"] == 7
+    assert recommendation["recommended_restock"] == 25
@@ -0,0 +1,52 @@
+"""
+Default data seeding and the unique email index
+Several workers may start at the same time on a fresh database; the seed
+lease lets only one of them insert the defaults.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_seed_creates_defaults_once(db):
+    import server
+
+    await asyncio.gather(*(server.seed_default_data() for _ in range(3)))
+
+    assert await db.users.count_documents({"email": "admin@academia.com"}) == 1
+    assert await db.instructors.count_documents({}) == len(server.DEFAULT_INSTRUCTORS)
+    assert await db.sports.count_documents({}) == len(server.DEFAULT_SPORTS)
+
+
+async def test_seed_skips_while_another_worker_holds_the_lease(db):
+    import server
+
+    await db.leases.insert_one({
+        "id": "seed",
+        "holder": "other-worker",
+        "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=1)).isoformat()
+    })
+
+    assert await server.seed_default_data() is False
+    assert await db.instructors.count_documents({}) == 0
+
+
+async def test_duplicate_emails_do_not_stop_startup(db):
+    import server
+
+    await db.users.drop_indexes()
+    await db.users.insert_many([{"id": "u-1", "email": "a@academia.com"}, {"id": "u-2", "email": "a@academia.com"}])
+
+    await server.ensure_indexes()
+
+    assert "email_1" in await db.users.index_information()
+
+
+async def test_instructors_may_share_a_name(client):
+    for email in ("ana1@academia.com", "ana2@academia.com"):
+        response = await client.post("/api/instructors-management", json={"name": "Ana Pérez", "email": email, "phone": "555-0100", "specialization": "Natación"})
+        assert response.status_code == 200
@@ -0,0 +1,98 @@
+"""
+Signed acta uploads
+The format comes from the file content, the SHA-256 and size are recorded,
+and files over SIGNED_ACTA_MAX_BYTES are refused without leaving anything
+behind.
+"""
+
+import hashlib
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def assignment(db, monkeypatch, tmp_path):
+    import server
+
+    monkeypatch.setattr(server, "acta_storage", server.LocalActaStorage(tmp_path))
+    await db.assignments.insert_one({
+        "id": "abcd1234-0000",
+        "instructor_name": "Ana",
+        "signed_acta_uploaded": False,
+        "created_at": "2026-01-01T10:00:00+00:00"
+    })
+    return tmp_path
+
+
+def signed_files(root) -> list:
+    folder = root / "signed"
+    return sorted(path.name for path in folder.iterdir()) if folder.exists() else []
+
+
+async def upload(client, data: bytes, filename: str = "scan.jpg"):
+    return await client.post(
+        "/api/actas/abcd1234-0000/upload-signed",
+        files={"file": (filename, data, "image/jpeg")}
+    )
+
+
+async def test_upload_detects_format_and_records_hash(client, db, assignment):
+    data = b"%PDF-1.4 " + b"x" * 3_000_000
+
+    response = await upload(client, data)
+
+    assert response.status_code == 200
+    assert response.json()["filename"] == "SIGNED_ABCD1234.pdf"
+    assert (assignment / "signed" / "SIGNED_ABCD1234.pdf").read_bytes() == data
+    stored = await db.assignments.find_one({"id": "abcd1234-0000"})
+    assert stored["signed_acta_uploaded"] is True
+    assert stored["signed_acta_content_type"] == "application/pdf"
+    assert stored["signed_acta_size"] == len(data)
+    assert stored["signed_acta_sha256"] == hashlib.sha256(data).hexdigest()
+
+
+async def test_reupload_in_another_format_replaces_the_file(client, assignment):
+    await upload(client, b"%PDF-1.4 first")
+    response = await upload(client, b"\x89PNG\r\n\x1a\n second", "scan.png")
+
+    assert response.status_code == 200
+    assert signed_files(assignment) == ["SIGNED_ABCD1234.png"]
+
+
+async def test_unknown_format_is_rejected(client, db, assignment):
+    response = await upload(client, b"MZ not a document")
+
+    assert response.status_code == 415
+    assert signed_files(assignment) == []
+    stored = await db.assignments.find_one({"id": "abcd1234-0000"})
+    assert stored["signed_acta_uploaded"] is False
+
+
+async def test_file_over_the_limit_is_refused_while_streaming(client, db, assignment, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "SIGNED_ACTA_MAX_BYTES", 2 * server.UPLOAD_CHUNK_SIZE)
+    response = await upload(client, b"%PDF-1.4 " + b"x" * (3 * server.UPLOAD_CHUNK_SIZE))
+
+    assert response.status_code == 413
+    assert signed_files(assignment) == []
+    stored = await db.assignments.find_one({"id": "abcd1234-0000"})
+    assert stored["signed_acta_uploaded"] is False
+
+
+async def test_content_length_over_the_limit_is_refused_before_reading(client, assignment, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "SIGNED_ACTA_MAX_BYTES", 1024)
+    monkeypatch.setattr(server, "SIGNED_ACTA_FORM_OVERHEAD", 0)
+
+    async def fail_on_read(request, field_name):
+        raise AssertionError("the body should not be read")
+        yield
+
+    monkeypatch.setattr(server, "multipart_file_chunks", fail_on_read)
+    response = await upload(client, b"%PDF-1.4 " + b"x" * 2048)
+
+    assert response.status_code == 413
@@ -0,0 +1,122 @@
+"""
+Request coalescing
+Concurrent calls with the same key share one computation, its result and its
+errors; a caller that goes away does not cancel it for the others.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def singleflight_calls(route: str) -> dict:
+    import server
+
+    prefix = f'singleflight_requests_total{{route="{route}",outcome="'
+    calls = {}
+    for line in server.SINGLEFLIGHT_REQUESTS.samples():
+        if line.startswith(prefix):
+            outcome, _, value = line[len(prefix):].partition('"} ')
+            calls[outcome] = float(value)
+    return calls
+
+
+@pytest.fixture
+def route():
+    """A route label of its own, so the global counters start at zero"""
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+async def test_concurrent_callers_share_one_computation(route):
+    import server
+
+    flight = server.SingleFlight()
+    runs = []
+
+    async def compute():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"total": 42}
+
+    results = await asyncio.gather(*[flight.do(route, ("admin",), compute) for _ in range(5)])
+
+    assert runs == [1]
+    assert all(result is results[0] for result in results)
+    assert singleflight_calls(route) == {"executed": 1, "shared": 4}
+
+
+async def test_calls_are_coalesced_only_while_in_flight(route):
+    import server
+
+    flight = server.SingleFlight()
+    runs = []
+
+    async def compute():
+        runs.append(1)
+        return len(runs)
+
+    assert await flight.do(route, ("admin",), compute) == 1
+    assert await flight.do(route, ("admin",), compute) == 2
+
+
+async def test_different_keys_run_separately(route):
+    import server
+
+    flight = server.SingleFlight()
+
+    async def compute_for(role):
+        await asyncio.sleep(0.01)
+        return role
+
+    admin, staff = await asyncio.gather(
+        flight.do(route, ("admin",), lambda: compute_for("admin")),
+        flight.do(route, ("staff",), lambda: compute_for("staff")),
+    )
+
+    assert (admin, staff) == ("admin", "staff")
+    assert singleflight_calls(route) == {"executed": 2}
+
+
+async def test_errors_reach_every_waiter_and_release_the_key(route):
+    import server
+
+    flight = server.SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*[flight.do(route, (), fail) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight._calls == {}
+
+    async def succeed():
+        return "ok"
+
+    assert await flight.do(route, (), succeed) == "ok"
+
+
+async def test_a_cancelled_caller_does_not_cancel_the_others(route):
+    import server
+
+    flight = server.SingleFlight()
+    finished = asyncio.Event()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        finished.set()
+        return "report"
+
+    leaving = asyncio.create_task(flight.do(route, (), compute))
+    staying = asyncio.create_task(flight.do(route, (), compute))
+    await asyncio.sleep(0.01)
+    leaving.cancel()
+
+    assert await staying == "report"
+    assert finished.is_set()
+    with pytest.raises(asyncio.CancelledError):
+        await leaving
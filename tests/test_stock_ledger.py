@@ -0,0 +1,60 @@
+"""
+Opening entries written by manage.py seed-stock-ledger
+Goods that existed before the ledger can already have movements by the time
+the command runs; the opening covers the stock from before them.
+"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def manage(db, monkeypatch):
+    import manage
+
+    monkeypatch.setattr(manage, "db", db)
+    return manage
+
+
+async def test_opening_accounts_for_earlier_movements(db, manage):
+    import server
+
+    await db.goods.insert_many([
+        {"id": "good-old", "name": "Balón", "quantity": 10, "available_quantity": 7,
+         "created_at": "2026-01-01T00:00:00+00:00"},
+        {"id": "good-new", "name": "Cono", "quantity": 4, "available_quantity": 4,
+         "created_at": "2026-02-05T00:00:00+00:00"},
+    ])
+    await db.stock_movements.insert_many([
+        # Assigned after the ledger was deployed, before the command ran
+        {"id": "m-1", "good_id": "good-old", "good_name": "Balón", "type": "asignacion",
+         "quantity_delta": 0, "available_delta": -3, "created_at": "2026-02-01T00:00:00+00:00"},
+        {"id": "m-2", "good_id": "good-new", "good_name": "Cono", "type": "alta",
+         "quantity_delta": 4, "available_delta": 4, "created_at": "2026-02-05T00:00:00+00:00"},
+    ])
+
+    assert await manage.seed_stock_ledger(False) == 0
+
+    openings = await db.stock_movements.find({"type": "apertura"}, {"_id": 0}).to_list(None)
+    assert [(m["good_id"], m["quantity_delta"], m["available_delta"]) for m in openings] == [("good-old", 10, 10)]
+    assert openings[0]["created_at"] == "2026-01-01T00:00:00+00:00"
+
+    before = await server.stock_as_of("2026-01-15T00:00:00+00:00", "good-old")
+    assert [(g["quantity"], g["available_quantity"]) for g in before["goods"]] == [(10, 10)]
+    after = await server.stock_as_of("2026-02-02T00:00:00+00:00", "good-old")
+    assert [(g["quantity"], g["available_quantity"]) for g in after["goods"]] == [(10, 7)]
+
+
+async def test_opening_without_created_at_precedes_first_movement(db, manage):
+    await db.goods.insert_one({"id": "good-x", "name": "Red", "quantity": 2, "available_quantity": 1})
+    await db.stock_movements.insert_one(
+        {"id": "m-1", "good_id": "good-x", "good_name": "Red", "type": "asignacion",
+         "quantity_delta": 0, "available_delta": -1, "created_at": "2026-03-01T10:00:00+00:00"}
+    )
+
+    await manage.seed_stock_ledger(False)
+
+    opening = await db.stock_movements.find_one({"type": "apertura"}, {"_id": 0})
+    assert (opening["quantity_delta"], opening["available_delta"]) == (2, 2)
+    assert opening["created_at"] == "2026-03-01T09:59:59.999000+00:00"
@@ -0,0 +1,84 @@
+"""
+Warehouse capacity on transfers and placed stock against a good's quantity
+"""
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def stocked(db):
+    await db.warehouses.insert_many([
+        {"id": "wh-a", "name": "Bodega A", "location": "Sede", "capacity": 100, "responsible": "Ana", "active": True},
+        {"id": "wh-b", "name": "Bodega B", "location": "Sede", "capacity": 10, "responsible": "Ana", "active": True},
+    ])
+    await db.goods.insert_one({
+        "id": "good-1", "name": "Balón", "category_id": "cat-1", "description": "", "status": "Bueno",
+        "quantity": 20, "available_quantity": 20, "location": "Bodega A", "responsible": "Ana",
+        "created_at": "2026-01-01T00:00:00+00:00"
+    })
+    await db.warehouse_stock.insert_many([
+        {"warehouse_id": "wh-a", "good_id": "good-1", "quantity": 15},
+        {"warehouse_id": "wh-b", "good_id": "good-1", "quantity": 4},
+    ])
+
+
+def transfer(quantity: int) -> dict:
+    return {"from_warehouse_id": "wh-a", "to_warehouse_id": "wh-b", "lines": [{"good_id": "good-1", "quantity": quantity}]}
+
+
+async def test_transfer_within_capacity(client, stocked, db):
+    response = await client.post("/api/warehouses/transfers", json=transfer(6))
+    assert response.status_code == 200
+    row = await db.warehouse_stock.find_one({"warehouse_id": "wh-b", "good_id": "good-1"})
+    assert row["quantity"] == 10
+
+
+async def test_transfer_over_destination_capacity(client, stocked, db):
+    response = await client.post("/api/warehouses/transfers", json=transfer(7))
+    assert response.status_code == 400
+    assert "Libre: 6" in response.json()["detail"]
+    row = await db.warehouse_stock.find_one({"warehouse_id": "wh-a", "good_id": "good-1"})
+    assert row["quantity"] == 15
+
+
+async def test_lowering_quantity_below_placed_stock(client, stocked, db):
+    response = await client.put("/api/goods/good-1", json={"quantity": 18})
+    assert response.status_code == 400
+    assert (await db.goods.find_one({"id": "good-1"}))["quantity"] == 20
+
+    response = await client.put("/api/goods/good-1", json={"quantity": 19})
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 19
+
+
+async def test_set_stock_over_capacity(client, stocked, db):
+    await db.goods.insert_one({
+        "id": "good-2", "name": "Cono", "category_id": "cat-1", "description": "", "status": "Bueno",
+        "quantity": 10, "available_quantity": 10, "location": "Bodega B", "responsible": "Ana",
+        "created_at": "2026-01-01T00:00:00+00:00"
+    })
+    await db.warehouse_stock.insert_one({"warehouse_id": "wh-b", "good_id": "good-2", "quantity": 5})
+
+    # wh-b holds 9 of its 10 units; the 5 cones being replaced are freed
+    response = await client.put("/api/warehouses/wh-b/stock/good-2", json={"quantity": 7})
+    assert response.status_code == 400
+    assert "Libre: 6" in response.json()["detail"]
+
+    response = await client.put("/api/warehouses/wh-b/stock/good-2", json={"quantity": 6})
+    assert response.status_code == 200
+
+
+async def test_create_good_over_capacity(client, stocked, db):
+    good = {
+        "name": "Cono", "category_id": "cat-1", "description": "", "status": "Bueno",
+        "quantity": 7, "location": "Bodega B", "responsible": "Ana", "warehouse_id": "wh-b"
+    }
+    response = await client.post("/api/goods", json=good)
+    assert response.status_code == 400
+    assert "Libre: 6" in response.json()["detail"]
+    assert await db.goods.count_documents({"name": "Cono"}) == 0
+
+    response = await client.post("/api/goods", json={**good, "quantity": 6})
+    assert response.status_code == 200